@@ -1,11 +1,17 @@
-from typing import Optional
+import os
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+
+@lru_cache(maxsize=None)
+def allowed_users() -> FrozenSet[str]:
+    """ALLOWED_SLACK_USERS, parsed once on first use (after load_dotenv)"""
+    return frozenset(os.getenv("ALLOWED_SLACK_USERS", "").split(","))
+
 
 def get_user_from_request(user_id: Optional[str] = None) -> Optional[str]:
     """Extract and validate user from request"""
     # The allowed users logic is still needed for filtering
-    import os
-    allowed_users = os.getenv("ALLOWED_SLACK_USERS", "").split(",")
-    if user_id:
-        if user_id in allowed_users or len(allowed_users) == 0:
-            return user_id
-    return None
\ No newline at end of file
+    if user_id and user_id in allowed_users():
+        return user_id
+    return None
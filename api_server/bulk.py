@@ -0,0 +1,224 @@
+"""
+Streaming CSV/NDJSON import and export of invoices.
+
+Imports parse the upload as it arrives, validate it into InvoiceImport rows
+one batch at a time and insert each batch before reading further, so memory
+is bounded by the batch size rather than the file size. Rows that fail
+validation are skipped and reported by line (CSV) or record (NDJSON)
+number; the rest are imported, except rows whose invoice_id is already in
+the table (invoice_id is unique, migrations/008), which are counted as
+`duplicates` and left as they are. Files use the invoices columns as headers or
+keys; `id` and `last_updated` are ignored (the database assigns them), and
+in CSV `line_items` is a JSON array in one cell.
+
+Exports walk the matching rows in id-ordered keyset pages and yield one
+encoded chunk per page, so a response streams without holding the result
+set. An export imported into the database it came from changes nothing
+(every row is a duplicate); into another one it copies the invoices.
+
+Settings:
+    IMPORT_BATCH_SIZE   rows validated and inserted per batch (default 1000)
+    EXPORT_PAGE_SIZE    rows per keyset page and output chunk (default 1000)
+"""
+
+import codecs
+import csv
+import io
+import os
+import time
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
+from .metrics import metrics
+from .models import InvoiceImport
+from .storage import INVOICE_COLUMNS
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 1000))
+# Rejected rows listed in an import report; the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+IMPORT_ADAPTER = TypeAdapter(List[InvoiceImport])
+
+Record = Tuple[int, Any]
+
+
+def detect_format(content_type: Optional[str], requested: Optional[str] = None) -> str:
+    if requested:
+        return requested
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+def sync_chunks(stream: AsyncIterator[bytes]) -> Iterator[bytes]:
+    """Read an async body stream from a worker thread started by anyio"""
+    from anyio import from_thread
+
+    async def next_chunk():
+        return await stream.__anext__()
+
+    while True:
+        try:
+            yield from_thread.run(next_chunk)
+        except StopAsyncIteration:
+            return
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Text lines, newline included, from UTF-8 chunks split anywhere"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        parts = (pending + decoder.decode(chunk)).split("\n")
+        pending = parts.pop()
+        for part in parts:
+            yield part + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def csv_records(lines: Iterable[str]) -> Iterator[Record]:
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # Empty cells fall back to the model's defaults (or fail if required)
+        yield reader.line_num, {k: v for k, v in row.items() if k and v not in ("", None)}
+
+
+def ndjson_records(lines: Iterable[str]) -> Iterator[Record]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, ValueError(f"invalid JSON: {e}")
+
+
+def read_records(chunks: Iterable[bytes], fmt: str) -> Iterator[Record]:
+    lines = iter_lines(chunks)
+    return ndjson_records(lines) if fmt == "ndjson" else csv_records(lines)
+
+
+def validate_batch(batch: List[Record]) -> Tuple[List[Dict[str, Any]], List[Tuple[int, str]]]:
+    """(rows ready to insert, (number, reason) for each rejected record)"""
+    rejected: Dict[int, str] = {}
+    for i, (number, value) in enumerate(batch):
+        if isinstance(value, Exception):
+            rejected[i] = str(value)
+    values = [value for i, (_, value) in enumerate(batch) if i not in rejected]
+    kept = [i for i in range(len(batch)) if i not in rejected]
+    try:
+        models = IMPORT_ADAPTER.validate_python(values)
+    except ValidationError as e:
+        bad = {}
+        for error in e.errors(include_url=False):
+            field = ".".join(str(part) for part in error["loc"][1:])
+            bad.setdefault(error["loc"][0], f"{field}: {error['msg']}" if field else error["msg"])
+        for position, reason in bad.items():
+            rejected[kept[position]] = reason
+        kept = [i for i in kept if i not in rejected]
+        models = IMPORT_ADAPTER.validate_python([batch[i][1] for i in kept])
+    rows = IMPORT_ADAPTER.dump_python(models, mode="json")
+    return rows, sorted((batch[i][0], reason) for i, reason in rejected.items())
+
+
+def import_records(db, records: Iterable[Record], batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Validate and insert records a batch at a time; returns the import report"""
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    report: Dict[str, Any] = {"imported": 0, "duplicates": 0, "rejected": 0, "errors": []}
+    start = time.perf_counter()
+    batch: List[Record] = []
+
+    def flush():
+        rows, rejected = validate_batch(batch)
+        if rows:
+            stored = db.insert_invoices(rows)
+            report["imported"] += stored
+            report["duplicates"] += len(rows) - stored
+        report["rejected"] += len(rejected)
+        room = MAX_REPORTED_ERRORS - len(report["errors"])
+        report["errors"].extend({"line": n, "error": reason} for n, reason in rejected[:room])
+        batch.clear()
+
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except Exception as e:
+        # Earlier batches are already committed; say how far the import got
+        print(f"Error importing invoices after {report['imported']} rows: {e}")
+        report["error"] = str(e)
+    elapsed = time.perf_counter() - start
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["imported"] / elapsed, 1) if elapsed else None
+    metrics.incr("bulk.imported_rows", report["imported"])
+    metrics.incr("bulk.rejected_rows", report["rejected"])
+    metrics.incr("bulk.duplicate_rows", report["duplicates"])
+    return report
+
+
+def _json_default(value: Any) -> Any:
+    # psycopg returns NUMERIC as Decimal
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def _line_items_json(value: Any) -> str:
+    if value is None:
+        return "[]"
+    if isinstance(value, str):
+        return value
+    return orjson.dumps(value).decode()
+
+
+def _csv_value(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]], fmt: str, chunk_rows: Optional[int] = None) -> Iterator[bytes]:
+    """CSV (with a header) or NDJSON bytes, one chunk per `chunk_rows` rows"""
+    chunk_rows = chunk_rows or EXPORT_PAGE_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    parts: List[bytes] = []
+    if fmt == "csv":
+        writer.writerow(INVOICE_COLUMNS)
+    count = 0
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow([
+                _line_items_json(row.get(c)) if c == "line_items" else _csv_value(row.get(c))
+                for c in INVOICE_COLUMNS
+            ])
+        else:
+            record = {c: row.get(c) for c in INVOICE_COLUMNS}
+            if isinstance(record["line_items"], str):
+                record["line_items"] = orjson.loads(record["line_items"])
+            parts.append(orjson.dumps(record, default=_json_default))
+            parts.append(b"\n")
+        count += 1
+        if count % chunk_rows == 0:
+            yield _drain(buffer, parts)
+    tail = _drain(buffer, parts)
+    if tail:
+        yield tail
+    metrics.incr("bulk.exported_rows", count)
+
+
+def _drain(buffer: io.StringIO, parts: List[bytes]) -> bytes:
+    data = buffer.getvalue().encode() + b"".join(parts)
+    buffer.seek(0)
+    buffer.truncate()
+    parts.clear()
+    return data
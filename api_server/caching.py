@@ -0,0 +1,44 @@
+"""
+ETag helpers for conditional GETs on the invoice routes.
+
+Single invoices are tagged from their own `last_updated`. Summaries and
+searches are tagged from the query plus DatabaseClient.data_version, which
+every write through this process bumps. The version is per process, so
+writes made elsewhere (another worker, the Supabase dashboard) are only
+picked up when the current time bucket rolls over; ETAG_MAX_AGE_SECONDS
+bounds how long such a tag can stay valid.
+"""
+
+import hashlib
+import os
+import time
+from typing import Any
+
+from fastapi import Request, Response
+
+ETAG_MAX_AGE_SECONDS = int(os.getenv("ETAG_MAX_AGE_SECONDS", 60))
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def query_etag(request: Request, data_version: int) -> str:
+    """ETag for a read whose result depends only on its query and the data version"""
+    bucket = int(time.time() // ETAG_MAX_AGE_SECONDS)
+    return make_etag(request.url.path, sorted(request.query_params.multi_items()), data_version, bucket)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,75 @@
+"""
+In-process trigram index over distinct customer names.
+
+Used by the SQLite backend in place of Postgres' pg_trgm. Names are split
+into words and padded the same way pg_trgm does ("  acme "), so a short query
+like "acme" scores 1.0 against "ACME Corp." and small typos still score well.
+"""
+
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CustomerIndex:
+    def __init__(self, names: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._names: List[str] = []
+        self._normalized: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, name: str) -> None:
+        if not name or name in self._ids:
+            return
+        with self._lock:
+            if name in self._ids:
+                return
+            name_id = len(self._names)
+            self._names.append(name)
+            self._normalized.append(normalize(name))
+            self._ids[name] = name_id
+            for gram in trigrams(name):
+                self._postings.setdefault(gram, []).append(name_id)
+
+    def search(self, query: str, limit: int = 20, min_score: float = 0.5) -> List[Tuple[str, float]]:
+        """Names ranked by the share of the query's trigrams they contain.
+
+        A name that contains the normalized query as a substring always
+        scores 1.0, matching ILIKE '%query%' semantics.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        needle = normalize(query)
+        hits: Counter = Counter()
+        for gram in query_grams:
+            hits.update(self._postings.get(gram, ()))
+        total = len(query_grams)
+        scored = []
+        for name_id, count in hits.items():
+            score = 1.0 if needle in self._normalized[name_id] else count / total
+            if score >= min_score:
+                scored.append((self._names[name_id], round(score, 3)))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
@@ -1,125 +1,317 @@
+import asyncio
 import os
-from supabase import create_client, Client
-from typing import List, Optional, Dict, Any
+import time
+from typing import List, Optional, Dict, Any, Iterator, Sequence, Tuple, TYPE_CHECKING
 from datetime import date, datetime
-import json
-from .models import Invoice, InvoiceStatus, InvoiceType, LineItem, InvoiceSummary
+from pydantic import TypeAdapter
+from .models import Invoice, InvoiceFilter, InvoiceStatus, InvoiceType, InvoiceSummary, CustomerMatch
+from .customer_index import normalize
+from .filters import DEFAULT_SORT, compile_filter, filter_key, merge_filter, parse_sort, uses_only_rollup_fields
+from .fx import FxRates, FxRateTable, money_totals, to_minor
+from .rollups import RollupIndex
+from .singleflight import SingleFlight
+from .storage import Predicate, StorageBackend, SupabaseBackend
+from .storage.changes import changed_rows, new_rows, poll_start
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from .analytics import InvoiceColumns
+
+INVOICE_LIST_ADAPTER = TypeAdapter(List[Invoice])
 
 class DatabaseClient:
-    def __init__(self):
-        url: str = os.getenv("SUPABASE_URL")
-        key: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        self.supabase: Client = create_client(url, key)
+    # Past this many matching names an IN list stops paying off; use ILIKE instead
+    CUSTOMER_MATCH_LIMIT = 50
+    # Longest user-id list sent to the database as an IN filter
+    USER_FILTER_LIMIT = 100
+    # How long loaded analytics columns are reused when nothing was written
+    COLUMNS_TTL_SECONDS = 60
+    # After customer search fails, filter with ILIKE for this long before trying it again
+    CUSTOMER_SEARCH_RETRY_SECONDS = 300
+
+    def __init__(self, supabase: Optional["Client"] = None, backend: Optional[StorageBackend] = None):
+        # The backend is resolved on first use so constructing a DatabaseClient
+        # (or importing the app) never opens a connection.
+        if backend is None and supabase is not None:
+            backend = SupabaseBackend(supabase)
+        self._backend = backend
+        # Bumped on every write so cached summaries/searches can be revalidated
+        self.data_version = 0
+        # Optional in-process rollups that answer summaries without a scan
+        self.rollups: Optional[RollupIndex] = None
+        if os.getenv("INVOICE_ROLLUPS", "").lower() in ("1", "true", "yes"):
+            self.rollups = RollupIndex(
+                max_age_seconds=float(os.getenv("INVOICE_ROLLUPS_MAX_AGE", 600)),
+                max_staleness_seconds=float(os.getenv("INVOICE_ROLLUPS_MAX_STALENESS_SECONDS", 30))
+            )
+        self._columns_cache: Dict[Tuple, Tuple[float, "InvoiceColumns"]] = {}
+        self._customer_search_down_until = 0.0
+        # FX rates for reporting totals in one currency, loaded on first use
+        self.fx = FxRateTable(loader=lambda: self.backend.select_fx_rates())
+        self.reporting_currency = os.getenv("REPORTING_CURRENCY") or None
+        # Identical concurrent reads share one backend query (DB_SINGLE_FLIGHT=0 turns it off)
+        self.flights: Optional[SingleFlight] = None
+        if os.getenv("DB_SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no"):
+            self.flights = SingleFlight("db")
+
+    @property
+    def backend(self) -> StorageBackend:
+        if self._backend is None:
+            from .dependencies import get_storage_backend
+            self._backend = get_storage_backend()
+        return self._backend
     
+    def _flight(self, kind: str, key: Tuple, fn, *args):
+        if self.flights is None:
+            return fn(*args)
+        # The data version is part of the key so reads after a local write don't join an older query
+        return self.flights.do((self.data_version, *key), kind, fn, *args)
+
+    async def _flight_async(self, kind: str, key: Tuple, fn, *args):
+        if self.flights is None:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return await self.flights.do_async((self.data_version, *key), kind, fn, *args)
+
     def get_invoice_by_id(self, invoice_id: str, user_id: Optional[str] = None) -> Optional[Invoice]:
         """Get a single invoice by invoice_id"""
+        return self._flight("invoice", (invoice_id, user_id), self._get_invoice_by_id, invoice_id, user_id)
+
+    async def aget_invoice_by_id(self, invoice_id: str, user_id: Optional[str] = None) -> Optional[Invoice]:
+        """get_invoice_by_id for async callers; the query runs off the event loop"""
+        return await self._flight_async("invoice", (invoice_id, user_id), self._get_invoice_by_id, invoice_id, user_id)
+
+    def _get_invoice_by_id(self, invoice_id: str, user_id: Optional[str] = None) -> Optional[Invoice]:
         try:
-            query = self.supabase.table("invoices").select("*").eq("invoice_id", invoice_id)
+            predicates = [Predicate("invoice_id", "eq", invoice_id)]
             
             # Optional: Filter by user if provided
             if user_id:
-                query = query.eq("created_by_user_id", user_id)
+                predicates.append(Predicate("created_by_user_id", "eq", user_id))
             
-            result = query.execute()
+            rows = self.backend.select_invoices(predicates, limit=1)
             
-            if result.data and len(result.data) > 0:
-                invoice_data = result.data[0]
-                return self._convert_to_invoice(invoice_data)
+            if rows:
+                return self._convert_rows(rows[:1])[0]
             return None
         except Exception as e:
             print(f"Error fetching invoice {invoice_id}: {e}")
             return None
     
+    def get_invoices_by_ids(self, invoice_ids: List[str], user_id: Optional[str] = None) -> Tuple[List[Invoice], List[str]]:
+        """Fetch several invoices with one query.
+
+        Returns the invoices found, in the order requested, and the ids that
+        were not found. Duplicate ids are only looked up and returned once.
+        """
+        wanted = list(dict.fromkeys(invoice_ids))
+        try:
+            predicates = [Predicate("invoice_id", "in", wanted)]
+            if user_id:
+                predicates.append(Predicate("created_by_user_id", "eq", user_id))
+            
+            by_id = {}
+            for invoice in self._convert_rows(self.backend.select_invoices(predicates)):
+                by_id.setdefault(invoice.invoice_id, invoice)
+            
+            found = [by_id[i] for i in wanted if i in by_id]
+            missing = [i for i in wanted if i not in by_id]
+            return found, missing
+        except Exception as e:
+            print(f"Error fetching invoices {wanted}: {e}")
+            return [], wanted
+    
     def update_invoice_status(self, invoice_id: str, status: InvoiceStatus, user_id: Optional[str] = None) -> bool:
         """Update invoice status"""
         try:
-            query = self.supabase.table("invoices").update({"status": status.value}).eq("invoice_id", invoice_id)
+            predicates = [Predicate("invoice_id", "eq", invoice_id)]
             
             # Optional: Filter by user if provided
             if user_id:
-                query = query.eq("created_by_user_id", user_id)
+                predicates.append(Predicate("created_by_user_id", "eq", user_id))
             
-            result = query.execute()
-            return len(result.data) > 0
+            updated = self.backend.update_invoices({"status": status.value}, predicates)
+            self._record_writes(updated)
+            return len(updated) > 0
         except Exception as e:
             print(f"Error updating invoice {invoice_id}: {e}")
             return False
     
+    def mark_overdue(self, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Flip every Sent invoice due before `today` to Overdue in one statement"""
+        today = today or datetime.now().date()
+        updated = self.backend.update_invoices(
+            {"status": InvoiceStatus.OVERDUE.value},
+            [Predicate("status", "eq", InvoiceStatus.SENT.value), Predicate("due_date", "lt", today.isoformat())]
+        )
+        self._record_writes(updated)
+        return updated
+    
+    def insert_invoices(self, rows: List[Dict[str, Any]]) -> int:
+        """Write new invoice rows and fold them into the rollups.
+
+        Rows whose invoice_id already exists are skipped; returns how many
+        were stored.
+        """
+        stored = self.backend.insert_invoices(rows)
+        self._record_writes(stored)
+        return len(stored)
+    
+    def iter_all_rows(self, predicates: Sequence[Predicate] = (), page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Every matching invoice row, fetched in id-ordered keyset pages"""
+        last_id = 0
+        while True:
+            page = self.backend.select_invoices(
+                [Predicate("id", "gt", last_id), *predicates], order_by="id", limit=page_size
+            )
+            yield from page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]["id"]
+    
+    def iter_invoice_rows(self,
+                          status: Optional[InvoiceStatus] = None,
+                          customer_name: Optional[str] = None,
+                          created_by_user_id: Optional[str] = None,
+                          page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Raw rows matching the filters in id order, one keyset page in memory at a time"""
+        predicates = []
+        if status:
+            predicates.append(Predicate("status", "eq", status.value))
+        if customer_name:
+            predicates.append(self._customer_predicate(customer_name))
+        if created_by_user_id:
+            predicates.append(Predicate("created_by_user_id", "eq", created_by_user_id))
+        return self.iter_all_rows(predicates, page_size)
+    
+    def get_invoice_columns(self,
+                            created_by_user_id: Optional[str] = None,
+                            customer_name: Optional[str] = None) -> "InvoiceColumns":
+        """Matching invoices as NumPy columns for the analytics module.
+
+        Reused for COLUMNS_TTL_SECONDS as long as no write went through
+        this client in the meantime.
+        """
+        from .analytics import InvoiceColumns
+        predicates = []
+        if created_by_user_id:
+            predicates.append(Predicate("created_by_user_id", "eq", created_by_user_id))
+        if customer_name:
+            predicates.append(self._customer_predicate(customer_name))
+        key = (repr(predicates), self.data_version)
+        cached = self._columns_cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.COLUMNS_TTL_SECONDS:
+            return cached[1]
+        columns = InvoiceColumns.from_rows(self.iter_all_rows(predicates))
+        if len(self._columns_cache) >= 16:
+            self._columns_cache.clear()
+        self._columns_cache[key] = (time.monotonic(), columns)
+        return columns
+    
+    def _record_writes(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.data_version += 1
+        if self.rollups is not None:
+            for row in rows:
+                self.rollups.upsert(row)
+
+    def sync_rollups(self, overlap_seconds: float = 5, page_size: int = 1000) -> int:
+        """Bring the rollups up to date with the table; returns the rows that changed.
+
+        Rebuilds them when they are missing or older than their max age,
+        otherwise folds in the rows the change feed reports since the last
+        sync. Called from RollupRefresher, never on a request path.
+        """
+        rollups = self.rollups
+        if rollups is None:
+            return 0
+        started = time.monotonic()
+        if rollups.needs_rebuild:
+            changed = rollups.load(self.iter_all_rows(page_size=page_size)) or 0
+        else:
+            since = poll_start(rollups.watermark, overlap_seconds)
+            changed = 0
+            for pages in (new_rows(self.backend, rollups.max_id, page_size),
+                          changed_rows(self.backend, since, page_size)):
+                for page in pages:
+                    changed += sum(rollups.upsert(row) for row in page)
+            rollups.synced_at = started
+        if changed:
+            self.data_version += 1
+        return changed
+    
+    def _rollup_summary(self, filters: InvoiceFilter, reporting_currency: Optional[str]) -> Optional[InvoiceSummary]:
+        """Answer a summary from the rollups, or None if they can't express it"""
+        if not self.rollups.is_fresh:
+            return None
+        customer_names = None
+        if filters.customer_name:
+            predicate = self._customer_predicate(filters.customer_name)
+            if predicate.op == "in":
+                customer_names = predicate.value
+            else:
+                # ILIKE '%name%' against the names the rollups hold
+                customer_names = self.rollups.customers_containing(filters.customer_name)
+        return self.rollups.summary(
+            created_by_user_id=filters.created_by_user_id,
+            customer_names=customer_names,
+            invoice_type=filters.invoice_type.value if filters.invoice_type else None,
+            statuses=[s.value for s in filters.statuses],
+            fx_rates=self.fx.get() if reporting_currency else None,
+            reporting_currency=reporting_currency
+        )
+    
+    def _summary_args(self, filters, status, due_date_before, customer_name, created_by_user_id, invoice_type,
+                      reporting_currency) -> Tuple[Tuple, Tuple]:
+        """(call args, single-flight key) for a summary query"""
+        reporting_currency = (reporting_currency or self.reporting_currency or "").upper() or None
+        filters = merge_filter(filters, status, customer_name, created_by_user_id, invoice_type, due_date_before)
+        return (filters, reporting_currency), (filter_key(filters), reporting_currency)
+
     def get_invoices_summary(self, 
                            status: Optional[InvoiceStatus] = None,
                            due_date_before: Optional[date] = None,
                            customer_name: Optional[str] = None,
                            created_by_user_id: Optional[str] = None,
-                           invoice_type: Optional[InvoiceType] = None) -> InvoiceSummary:
-        """Get invoice summary with filtering"""
+                           invoice_type: Optional[InvoiceType] = None,
+                           reporting_currency: Optional[str] = None,
+                           filters: Optional[InvoiceFilter] = None) -> InvoiceSummary:
+        """Get invoice summary with filtering.
+
+        `filters` takes the full filter set (several statuses, date and
+        amount ranges); the single-field arguments are applied on top of it.
+        Money is totalled per currency; total_outstanding and paid_this_month
+        are converted into `reporting_currency` (or REPORTING_CURRENCY).
+        """
+        args, key = self._summary_args(filters, status, due_date_before, customer_name, created_by_user_id,
+                                       invoice_type, reporting_currency)
+        return self._flight("summary", key, self._get_invoices_summary, *args)
+
+    async def aget_invoices_summary(self,
+                                    status: Optional[InvoiceStatus] = None,
+                                    due_date_before: Optional[date] = None,
+                                    customer_name: Optional[str] = None,
+                                    created_by_user_id: Optional[str] = None,
+                                    invoice_type: Optional[InvoiceType] = None,
+                                    reporting_currency: Optional[str] = None,
+                                    filters: Optional[InvoiceFilter] = None) -> InvoiceSummary:
+        """get_invoices_summary for async callers; the query runs off the event loop"""
+        args, key = self._summary_args(filters, status, due_date_before, customer_name, created_by_user_id,
+                                       invoice_type, reporting_currency)
+        return await self._flight_async("summary", key, self._get_invoices_summary, *args)
+
+    def _get_invoices_summary(self, filters: InvoiceFilter, reporting_currency: Optional[str]) -> InvoiceSummary:
         try:
-            # Base query
-            query = self.supabase.table("invoices").select("*")
-            
-            # Apply filters
-            if status:
-                query = query.eq("status", status.value)
-            if due_date_before:
-                query = query.lte("due_date", due_date_before.isoformat())
-            if customer_name:
-                query = query.ilike("customer_name", f"%{customer_name}%")
-            if created_by_user_id:
-                query = query.eq("created_by_user_id", created_by_user_id)
-            if invoice_type:
-                query = query.eq("type", invoice_type.value)
-            
-            result = query.execute()
-            invoices = result.data
-            
-            # Calculate summary statistics
-            total_outstanding = 0
-            overdue_count = 0
-            due_this_month = []
-            paid_this_month = 0
-            draft_count = 0
+            # Date and amount ranges aren't kept in the rollups; those go to the table
+            if self.rollups is not None and uses_only_rollup_fields(filters):
+                summary = self._rollup_summary(filters, reporting_currency)
+                if summary is not None:
+                    return summary
             
-            today = datetime.now().date()
-            current_month_start = today.replace(day=1)
-            
-            for invoice in invoices:
-                amount = float(invoice['amount'])
-                status_val = invoice['status']
-                due_date = datetime.fromisoformat(invoice['due_date']).date()
-                
-                # Count draft invoices
-                if status_val == 'Draft':
-                    draft_count += 1
-                
-                # Count overdue invoices
-                if status_val == 'Overdue':
-                    overdue_count += 1
-                
-                # Calculate outstanding (not paid or cancelled)
-                if status_val not in ['Paid', 'Cancelled']:
-                    total_outstanding += amount
-                
-                # Track paid this month
-                if status_val == 'Paid' and due_date >= current_month_start:
-                    paid_this_month += amount
-                
-                # Track due this month
-                if due_date.month == today.month and due_date.year == today.year:
-                    due_this_month.append({
-                        "invoice_id": invoice['invoice_id'],
-                        "customer_name": invoice['customer_name'],
-                        "amount": amount,
-                        "due_date": due_date.isoformat(),
-                        "status": status_val
-                    })
-            
-            return InvoiceSummary(
-                total_outstanding=total_outstanding,
-                overdue_count=overdue_count,
-                due_this_month=due_this_month,
-                total_invoices=len(invoices),
-                paid_this_month=paid_this_month,
-                draft_count=draft_count
-            )
+            predicates = compile_filter(filters, self._customer_predicate)
+            invoices = self.backend.select_invoices(predicates) if predicates is not None else []
+            fx_rates = self.fx.get() if reporting_currency else None
+            return self._summarize_rows(invoices, fx_rates, reporting_currency)
         
         except Exception as e:
             print(f"Error getting invoice summary: {e}")
@@ -132,58 +324,159 @@ class DatabaseClient:
                 draft_count=0
             )
     
+    def get_summaries_by_user(self,
+                              user_ids: Optional[List[str]] = None,
+                              reporting_currency: Optional[str] = None) -> Dict[str, InvoiceSummary]:
+        """One InvoiceSummary per creator, from a single pass over the table
+        (or straight from the rollups when they are enabled and in sync).
+
+        `user_ids` limits the result to those users; None means every user
+        that has invoices.
+        """
+        reporting_currency = (reporting_currency or self.reporting_currency or "").upper() or None
+        fx_rates = self.fx.get() if reporting_currency else None
+        ordered = list(dict.fromkeys(user_ids)) if user_ids is not None else None
+        wanted = set(ordered) if ordered is not None else None
+        if self.rollups is not None and self.rollups.is_fresh:
+            users = ordered if ordered is not None else self.rollups.user_ids()
+            return {
+                user: self.rollups.summary(created_by_user_id=user, fx_rates=fx_rates, reporting_currency=reporting_currency)
+                for user in users
+            }
+        predicates = []
+        # Short lists go to the database as an IN filter; long ones would make
+        # an unwieldy query string, so those rows are filtered here instead
+        if wanted is not None and len(wanted) <= self.USER_FILTER_LIMIT:
+            predicates.append(Predicate("created_by_user_id", "in", sorted(wanted)))
+        rows_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.iter_all_rows(predicates):
+            user = row.get("created_by_user_id")
+            if user and (wanted is None or user in wanted):
+                rows_by_user.setdefault(user, []).append(row)
+        users = ordered if ordered is not None else rows_by_user
+        return {user: self._summarize_rows(rows_by_user.get(user, []), fx_rates, reporting_currency) for user in users}
+    
+    def _summarize_rows(self,
+                        invoices: List[Dict[str, Any]],
+                        fx_rates: Optional[FxRates] = None,
+                        reporting_currency: Optional[str] = None) -> InvoiceSummary:
+        """Summary figures from raw invoice rows"""
+        # Calculate summary statistics; money in integer cents per currency
+        outstanding: Dict[str, int] = {}
+        paid_this_month: Dict[str, int] = {}
+        counts: Dict[str, int] = {}
+        overdue_count = 0
+        due_this_month = []
+        draft_count = 0
+
+        today = datetime.now().date()
+        current_month_start = today.replace(day=1)
+
+        for invoice in invoices:
+            amount = float(invoice['amount'])
+            minor = to_minor(invoice['amount'])
+            currency = invoice['currency']
+            status_val = invoice['status']
+            counts[currency] = counts.get(currency, 0) + 1
+            due_date = datetime.fromisoformat(invoice['due_date']).date()
+
+            # Count draft invoices
+            if status_val == 'Draft':
+                draft_count += 1
+
+            # Count overdue invoices
+            if status_val == 'Overdue':
+                overdue_count += 1
+
+            # Calculate outstanding (not paid or cancelled)
+            if status_val not in ['Paid', 'Cancelled']:
+                outstanding[currency] = outstanding.get(currency, 0) + minor
+
+            # Track paid this month
+            if status_val == 'Paid' and due_date >= current_month_start:
+                paid_this_month[currency] = paid_this_month.get(currency, 0) + minor
+
+            # Track due this month
+            if due_date.month == today.month and due_date.year == today.year:
+                due_this_month.append({
+                    "invoice_id": invoice['invoice_id'],
+                    "customer_name": invoice['customer_name'],
+                    "amount": amount,
+                    "currency": currency,
+                    "due_date": due_date.isoformat(),
+                    "status": status_val
+                })
+
+        return InvoiceSummary(
+            overdue_count=overdue_count,
+            due_this_month=due_this_month,
+            total_invoices=len(invoices),
+            draft_count=draft_count,
+            **money_totals(outstanding, paid_this_month, counts, fx_rates, reporting_currency)
+        )
+    
     def search_invoices(self, 
                        customer_name: Optional[str] = None,
                        status: Optional[InvoiceStatus] = None,
                        created_by_user_id: Optional[str] = None,
-                       limit: int = 10) -> List[Invoice]:
-        """Search invoices with various filters"""
+                       limit: int = 10,
+                       filters: Optional[InvoiceFilter] = None,
+                       sort: str = DEFAULT_SORT) -> List[Invoice]:
+        """Search invoices with various filters.
+
+        `filters` takes the full filter set, as for get_invoices_summary;
+        `sort` is a column name, prefixed with `-` for descending order.
+        """
         try:
-            query = self.supabase.table("invoices").select("*")
+            filters = merge_filter(filters, status, customer_name, created_by_user_id)
+            predicates = compile_filter(filters, self._customer_predicate)
+            if predicates is None:
+                return []
+            order_by, desc = parse_sort(sort)
+            rows = self.backend.select_invoices(predicates, order_by=order_by, desc=desc, limit=limit)
             
-            if customer_name:
-                query = query.ilike("customer_name", f"%{customer_name}%")
-            if status:
-                query = query.eq("status", status.value)
-            if created_by_user_id:
-                query = query.eq("created_by_user_id", created_by_user_id)
-            
-            query = query.limit(limit).order("last_updated", desc=True)
-            result = query.execute()
-            
-            return [self._convert_to_invoice(invoice_data) for invoice_data in result.data]
+            return self._convert_rows(rows)
         
         except Exception as e:
             print(f"Error searching invoices: {e}")
             return []
     
-    def _convert_to_invoice(self, invoice_data: Dict[str, Any]) -> Invoice:
-        """Convert database row to Invoice model"""
-        # Parse line_items JSON
-        line_items = []
-        if invoice_data.get('line_items'):
+    def search_customers(self, query: str, limit: int = 20) -> List[CustomerMatch]:
+        """Fuzzy customer-name lookup backed by the trigram index"""
+        try:
+            return [CustomerMatch(**row) for row in self.backend.search_customers(query, limit)]
+        except Exception as e:
+            print(f"Error searching customers for {query}: {e}")
+            return []
+    
+    def _customer_predicate(self, customer_name: str) -> Predicate:
+        """Filter for a partial or misspelled customer name.
+
+        Where ILIKE '%name%' is index-backed (pg_trgm) the database matches it
+        directly. Otherwise the name is resolved through the backend's
+        customer index to the exact names it matches, so the invoice query
+        filters on the customer_name btree index.
+        """
+        if (not self.backend.indexed_customer_ilike and len(normalize(customer_name)) >= 3
+                and time.monotonic() >= self._customer_search_down_until):
             try:
-                line_items_data = invoice_data['line_items']
-                if isinstance(line_items_data, str):
-                    line_items_data = json.loads(line_items_data)
-                line_items = [LineItem(**item) for item in line_items_data]
+                matches = self.backend.search_customers(customer_name, self.CUSTOMER_MATCH_LIMIT)
+                # Names containing the query win outright (ILIKE semantics);
+                # otherwise, e.g. for a typo, take the best-scoring fuzzy matches
+                best = 1.0 if not matches or matches[0]["score"] >= 1.0 else matches[0]["score"]
+                names = [m["customer_name"] for m in matches if m["score"] >= best]
+                if len(names) < self.CUSTOMER_MATCH_LIMIT:
+                    return Predicate("customer_name", "in", names)
             except Exception as e:
-                print(f"Error parsing line_items: {e}")
-                line_items = []
-        
-        return Invoice(
-            id=invoice_data['id'],
-            invoice_id=invoice_data['invoice_id'],
-            customer_name=invoice_data['customer_name'],
-            amount=float(invoice_data['amount']),
-            currency=invoice_data['currency'],
-            status=InvoiceStatus(invoice_data['status']),
-            company_id=invoice_data.get('company_id'),
-            type=InvoiceType(invoice_data['type']),
-            issue_date=datetime.fromisoformat(invoice_data['issue_date']).date(),
-            due_date=datetime.fromisoformat(invoice_data['due_date']).date(),
-            line_items=line_items,
-            notes=invoice_data.get('notes'),
-            created_by_user_id=invoice_data.get('created_by_user_id'),
-            last_updated=datetime.fromisoformat(invoice_data['last_updated'].replace('Z', '+00:00'))
-        )
\ No newline at end of file
+                print(f"Customer index unavailable, using ILIKE for {self.CUSTOMER_SEARCH_RETRY_SECONDS}s: {e}")
+                self._customer_search_down_until = time.monotonic() + self.CUSTOMER_SEARCH_RETRY_SECONDS
+        return Predicate("customer_name", "ilike", f"%{customer_name}%")
+    
+    def _convert_rows(self, rows: List[Dict[str, Any]]) -> List[Invoice]:
+        """Convert a batch of rows in one pydantic-core call.
+
+        ISO dates, 'Z' timestamps, enums, numeric strings and line_items
+        JSON are all parsed in compiled code instead of per-field Python.
+        """
+        return INVOICE_LIST_ADAPTER.validate_python(rows)
+
@@ -0,0 +1,61 @@
+"""
+Lazily-created clients shared by the API server.
+
+Nothing in this module talks to Supabase at import time. Each provider builds
+its client on first call and caches it, so routes can depend on them through
+FastAPI's ``Depends`` and tests can swap them via ``app.dependency_overrides``.
+"""
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from .database import DatabaseClient
+    from .events import EventRecorder
+    from .sessions import SessionIndex
+    from .storage import StorageBackend
+
+
+@lru_cache(maxsize=None)
+def get_supabase_client() -> "Client":
+    """Service-role client used for invoice queries"""
+    from supabase import create_client
+    return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_auth_supabase_client() -> "Client":
+    """Client used by the auth routes to store Slack sessions"""
+    from supabase import create_client
+    key = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_KEY")
+    return create_client(os.environ.get("SUPABASE_URL"), key)
+
+
+@lru_cache(maxsize=None)
+def get_storage_backend() -> "StorageBackend":
+    """Supabase by default, or a direct SQL backend when DATABASE_URL is set"""
+    from .storage import create_backend
+    return create_backend()
+
+
+@lru_cache(maxsize=None)
+def get_db() -> "DatabaseClient":
+    """Shared DatabaseClient; the underlying connection is opened on first query"""
+    from .database import DatabaseClient
+    return DatabaseClient()
+
+
+@lru_cache(maxsize=None)
+def get_session_index() -> "SessionIndex":
+    """In-memory index of Slack login sessions, backed by slack_sessions"""
+    from .sessions import SessionIndex
+    return SessionIndex(get_auth_supabase_client)
+
+
+@lru_cache(maxsize=None)
+def get_event_recorder() -> "EventRecorder":
+    """Buffered writer of audit and query events into app_events"""
+    from .events import EventRecorder
+    return EventRecorder(lambda rows: get_storage_backend().insert_events(rows))
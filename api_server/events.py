@@ -0,0 +1,21 @@
+"""
+Audit entries and query telemetry from the API server.
+
+A thin binding of shared/event_recorder.py to the API server's metrics, with
+events tagged source "api" and spooled to <EVENTS_SPOOL_DIR>/api-events.ndjson.
+See that module for buffering, spooling, backpressure and settings.
+"""
+
+from typing import Any
+
+from shared.event_recorder import AUDIT, FEEDBACK, QUERY, Writer
+from shared.event_recorder import EventRecorder as SharedEventRecorder
+
+from .metrics import metrics
+
+__all__ = ["AUDIT", "FEEDBACK", "QUERY", "EventRecorder"]
+
+
+class EventRecorder(SharedEventRecorder):
+    def __init__(self, writer: Writer, **options: Any):
+        super().__init__(writer, metrics, "api", **options)
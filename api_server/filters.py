@@ -0,0 +1,151 @@
+"""
+Compiles an InvoiceFilter into the Predicates every storage backend runs.
+
+Search and summary both go through `compile_filter`, so they accept the same
+filters: several statuses, creator, type, customer, and inclusive due-date,
+issue-date and amount ranges.
+
+The compiler also shapes the query for the indexes in migrations/:
+
+- One status becomes `status = x` (the partial Sent/due_date index and the
+  replica's status index apply); several become one IN list, and all of
+  them become no filter at all.
+- A range whose bounds can't both hold, or a customer name that resolves to
+  no names, makes the filter empty; callers skip the query.
+- Equal bounds become an equality test.
+- Predicates come out in a fixed order: equality on indexed columns, IN
+  lists, ranges on indexed columns, then unindexed columns. The same filter
+  always yields the same SQL text (one cached SQLite statement, one
+  single-flight key), and the replica tests its cheapest filters first.
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+from .models import InvoiceFilter, InvoiceStatus, InvoiceType
+from .storage import Predicate
+
+# Columns with an index in migrations/ (or in the replica), most selective first
+INDEXED_COLUMNS = ("invoice_id", "created_by_user_id", "customer_name", "status", "due_date", "last_updated")
+_OP_RANK = {"eq": 0, "in": 1, "gt": 2, "gte": 2, "lt": 2, "lte": 2}
+
+SORT_COLUMNS = ("last_updated", "due_date", "issue_date", "amount", "customer_name", "invoice_id", "id")
+# `-column` sorts descending
+SORT_PATTERN = "^-?(" + "|".join(SORT_COLUMNS) + ")$"
+DEFAULT_SORT = "-last_updated"
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[str, bool]:
+    """(order_by column, descending) for a sort key like `-due_date`"""
+    sort = sort or DEFAULT_SORT
+    column = sort.lstrip("-")
+    if column not in SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort key: {sort}")
+    return column, sort.startswith("-")
+
+
+def merge_filter(filters: Optional[InvoiceFilter] = None,
+                 status: Optional[InvoiceStatus] = None,
+                 customer_name: Optional[str] = None,
+                 created_by_user_id: Optional[str] = None,
+                 invoice_type: Optional[InvoiceType] = None,
+                 due_date_before=None) -> InvoiceFilter:
+    """`filters` (or an empty filter) with single-field filters set on top"""
+    update = {
+        "customer_name": customer_name,
+        "created_by_user_id": created_by_user_id,
+        "invoice_type": invoice_type,
+        "due_date_before": due_date_before,
+    }
+    update = {k: v for k, v in update.items() if v is not None}
+    if status:
+        update["statuses"] = [status]
+    if filters is None:
+        return InvoiceFilter(**update)
+    return filters.model_copy(update=update) if update else filters
+
+
+def filter_key(filters: InvoiceFilter) -> Tuple:
+    """Hashable form of a filter; equivalent filters share it"""
+    return (
+        tuple(sorted({s.value for s in filters.statuses})),
+        # Customer filters match case-insensitively
+        filters.customer_name.casefold() if filters.customer_name else None,
+        filters.created_by_user_id,
+        filters.invoice_type.value if filters.invoice_type else None,
+        filters.due_date_after, filters.due_date_before,
+        filters.issue_date_after, filters.issue_date_before,
+        filters.min_amount, filters.max_amount,
+    )
+
+
+def _rank(predicate: Predicate) -> Tuple[int, int, int, str]:
+    indexed = predicate.column in INDEXED_COLUMNS
+    return (
+        0 if indexed else 1,
+        _OP_RANK.get(predicate.op, 3),
+        INDEXED_COLUMNS.index(predicate.column) if indexed else len(INDEXED_COLUMNS),
+        predicate.column,
+    )
+
+
+def _range(column: str, low, high) -> Optional[List[Predicate]]:
+    """Predicates for an inclusive range; None if it is empty"""
+    if low is not None and high is not None:
+        if low > high:
+            return None
+        if low == high:
+            return [Predicate(column, "eq", _value(low))]
+    predicates = []
+    if low is not None:
+        predicates.append(Predicate(column, "gte", _value(low)))
+    if high is not None:
+        predicates.append(Predicate(column, "lte", _value(high)))
+    return predicates
+
+
+def _value(bound):
+    return bound.isoformat() if hasattr(bound, "isoformat") else bound
+
+
+def compile_filter(filters: InvoiceFilter,
+                   customer_predicate: Callable[[str], Predicate]) -> Optional[List[Predicate]]:
+    """Predicates for `filters` in index-friendly order, or None if no row can match.
+
+    `customer_predicate` resolves a partial customer name (it may query the
+    customer index), so it is only called once the rest is known to be
+    satisfiable.
+    """
+    predicates: List[Predicate] = []
+    statuses = sorted({s.value for s in filters.statuses})
+    if len(statuses) == 1:
+        predicates.append(Predicate("status", "eq", statuses[0]))
+    elif 1 < len(statuses) < len(InvoiceStatus):
+        predicates.append(Predicate("status", "in", statuses))
+    if filters.created_by_user_id:
+        predicates.append(Predicate("created_by_user_id", "eq", filters.created_by_user_id))
+    if filters.invoice_type:
+        predicates.append(Predicate("type", "eq", filters.invoice_type.value))
+    for column, low, high in (
+        ("due_date", filters.due_date_after, filters.due_date_before),
+        ("issue_date", filters.issue_date_after, filters.issue_date_before),
+        ("amount", filters.min_amount, filters.max_amount),
+    ):
+        bounds = _range(column, low, high)
+        if bounds is None:
+            return None
+        predicates.extend(bounds)
+    if filters.customer_name:
+        customer = customer_predicate(filters.customer_name)
+        if customer.op == "in" and not customer.value:
+            return None
+        predicates.append(customer)
+    return sorted(predicates, key=_rank)
+
+
+def uses_only_rollup_fields(filters: InvoiceFilter) -> bool:
+    """True if the summary rollups can answer `filters` (they keep no dates or amounts)"""
+    return all(bound is None for bound in (
+        filters.due_date_after, filters.due_date_before,
+        filters.issue_date_after, filters.issue_date_before,
+        filters.min_amount, filters.max_amount,
+    ))
@@ -0,0 +1,152 @@
+"""
+Per-currency money totals and conversion into a reporting currency.
+
+Amounts are summed as integer minor units (cents; the amount column is
+NUMERIC(14, 2)) so totals stay exact however many invoices go into them.
+A total is converted only once, per currency, at the end, using Decimal.
+
+Exchange rates are units of the base currency (FX_BASE_CURRENCY, USD by
+default) per unit of each currency. They come from FX_RATES_FILE (JSON
+`{"EUR": "1.08", ...}` or CSV `currency,rate` lines) or otherwise from the
+fx_rates table, and are reloaded every FX_RATES_REFRESH_SECONDS.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+MINOR_UNITS = 100
+
+
+def to_minor(amount: Any) -> int:
+    """Amount as an exact integer number of cents"""
+    return int((Decimal(str(amount)) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor(minor: int) -> float:
+    return float(Decimal(minor) / MINOR_UNITS)
+
+
+class FxRates:
+    """One immutable snapshot of the rate table"""
+
+    def __init__(self, base: str, rates: Dict[str, Decimal]):
+        self.base = base
+        self.rates = {**rates, base: Decimal(1)}
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[Decimal]:
+        """Units of `to_currency` per unit of `from_currency`, if both are known"""
+        if from_currency == to_currency:
+            return Decimal(1)
+        if from_currency not in self.rates or to_currency not in self.rates:
+            return None
+        return self.rates[from_currency] / self.rates[to_currency]
+
+    def convert_minor(self, totals: Dict[str, int], to_currency: str) -> Optional[int]:
+        """Sum of per-currency cent totals in `to_currency`, rounded once"""
+        converted = Decimal(0)
+        for currency, minor in totals.items():
+            if not minor:
+                continue
+            rate = self.rate(currency, to_currency)
+            if rate is None:
+                return None
+            converted += minor * rate
+        return int(converted.to_integral_value(ROUND_HALF_UP))
+
+
+def _parse_rates(path: str) -> Dict[str, Decimal]:
+    with open(path) as f:
+        if path.endswith(".json"):
+            return {currency.upper(): Decimal(str(rate)) for currency, rate in json.load(f).items()}
+        return {
+            row[0].strip().upper(): Decimal(row[1].strip())
+            for row in csv.reader(f)
+            if len(row) >= 2 and row[0].strip().lower() != "currency"
+        }
+
+
+class FxRateTable:
+    """Lazily loaded, periodically refreshed FX rates.
+
+    If a reload fails, the last good snapshot is kept.
+    """
+
+    def __init__(self,
+                 loader: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+                 path: Optional[str] = None,
+                 base: Optional[str] = None,
+                 refresh_seconds: Optional[float] = None):
+        self.path = path if path is not None else os.getenv("FX_RATES_FILE")
+        self.base = (base or os.getenv("FX_BASE_CURRENCY", "USD")).upper()
+        self.refresh_seconds = float(
+            refresh_seconds if refresh_seconds is not None else os.getenv("FX_RATES_REFRESH_SECONDS", 3600)
+        )
+        self._loader = loader
+        self._rates: Optional[FxRates] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Decimal]:
+        if self.path:
+            return _parse_rates(self.path)
+        if self._loader is not None:
+            return {row["currency"].upper(): Decimal(str(row["rate"])) for row in self._loader()}
+        return {}
+
+    def get(self) -> FxRates:
+        if self._rates is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return self._rates
+        with self._lock:
+            if self._rates is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                try:
+                    self._rates = FxRates(self.base, self._load())
+                except Exception as e:
+                    print(f"Error loading FX rates: {e}")
+                    if self._rates is None:
+                        self._rates = FxRates(self.base, {})
+                self._loaded_at = time.monotonic()
+        return self._rates
+
+
+def money_totals(outstanding: Dict[str, int],
+                 paid: Dict[str, int],
+                 counts: Dict[str, int],
+                 rates: Optional[FxRates] = None,
+                 reporting_currency: Optional[str] = None) -> Dict[str, Any]:
+    """The money fields of an InvoiceSummary from per-currency cent totals.
+
+    With a single currency, or with a reporting currency and a rate for every
+    currency involved, total_outstanding and paid_this_month are in that
+    currency. Otherwise reporting_currency is None and the totals are plain
+    sums across currencies, as before; totals_by_currency is always exact.
+    """
+    currencies: List[str] = sorted(set(outstanding) | set(paid) | set(counts))
+    if reporting_currency is None and len(currencies) == 1:
+        reporting_currency = currencies[0]
+    total_outstanding = total_paid = None
+    if reporting_currency is not None:
+        rates = rates or FxRates(reporting_currency, {})
+        total_outstanding = rates.convert_minor(outstanding, reporting_currency)
+        total_paid = rates.convert_minor(paid, reporting_currency)
+    if total_outstanding is None or total_paid is None:
+        reporting_currency = None
+        total_outstanding = sum(outstanding.values())
+        total_paid = sum(paid.values())
+    return {
+        "total_outstanding": from_minor(total_outstanding),
+        "paid_this_month": from_minor(total_paid),
+        "reporting_currency": reporting_currency,
+        "totals_by_currency": {
+            currency: {
+                "invoice_count": counts.get(currency, 0),
+                "outstanding": from_minor(outstanding.get(currency, 0)),
+                "paid_this_month": from_minor(paid.get(currency, 0)),
+            }
+            for currency in currencies
+        },
+    }
@@ -1,25 +1,59 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse
 from dotenv import load_dotenv
 from .models import APIResponse, ErrorResponse
 from .database import DatabaseClient
+from .dependencies import get_db, get_event_recorder, get_storage_backend
+from .responses import ORJSONResponse
 from .auth import get_user_from_request
 from .routers.invoices import router as invoices_router
 from datetime import date
 from .routers.auth import router as auth_router
+from .routers.profiles import router as profiles_router
+from .profiling import ProfilingMiddleware
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from .metrics import metrics
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Imported here so the schedulers (and their clients) only exist in a running server
+    from .overdue import OverdueScheduler
+    from .rollups import RollupRefresher
+    from .storage.replica import ReplicaBackend
+    rollups = RollupRefresher(get_db())
+    backend = get_storage_backend()
+    replica = backend if isinstance(backend, ReplicaBackend) else None
+    recorder = get_event_recorder()
+    if replica is not None:
+        replica.start()
+    recorder.start()
+    # After the replica, so the first rollup build reads from it; the first
+    # overdue pass waits for that build (they contend for SQLite's table lock)
+    scheduler = OverdueScheduler(get_db(), start_after=rollups.first_sync_done if rollups.start() else None)
+    scheduler.start()
+    yield
+    scheduler.stop()
+    rollups.stop()
+    # Last, so events recorded while shutting down are flushed (or spooled) too
+    recorder.stop()
+    if replica is not None:
+        replica.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Invoice AI API",
     description="Internal API for invoice management with AI integration",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,23 +65,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON bodies; prefer brotli when brotli-asgi is installed
+# (it falls back to gzip for clients that don't accept br)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Outermost, so a profile covers compression and CORS too (see profiling.py)
+app.add_middleware(ProfilingMiddleware)
+
 # Serve static files from 'static' directory
 app.mount("/static", StaticFiles(directory="static", html=True), name="static")
 
-# Initialize database client
-db = DatabaseClient()
-
 app.include_router(invoices_router)
 
 app.include_router(auth_router)
 
+app.include_router(profiles_router)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "Invoice AI API is running", "status": "healthy"}
 
 @app.get("/api/health")
-async def health_check():
+async def health_check(db: DatabaseClient = Depends(get_db)):
     """Detailed health check with database connectivity"""
     try:
         # Test database connection
@@ -65,6 +109,11 @@ async def health_check():
             detail=f"Service unavailable: {str(e)}"
         )
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters and timings from background jobs"""
+    return metrics.snapshot()
+
 @app.get("/auth_callback.html")
 def serve_auth_callback():
     return FileResponse("static/auth_callback.html")
@@ -72,7 +121,7 @@ def serve_auth_callback():
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             success=False,
@@ -83,7 +132,7 @@ async def http_exception_handler(request, exc):
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=ErrorResponse(
             success=False,
@@ -0,0 +1,41 @@
+"""
+Apply the SQL migrations in migrations/ that haven't run yet.
+
+    python -m api_server.migrate [--database-url postgresql://...]
+
+The API server never runs these itself: they create extensions and
+triggers (owner or superuser rights) and take ACCESS EXCLUSIVE locks on
+invoices, so run this once per deploy, not on every process start. Applied
+files are recorded in schema_migrations; every migration is idempotent, so
+a database migrated by hand before this table existed can be run through it
+safely.
+
+Settings:
+    DATABASE_URL  database to migrate (a sqlite:/// URL just gets the schema created)
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from .storage.sql_backend import SQLBackend
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+    backend = SQLBackend(args.database_url, pool_size=1, create_schema=False)
+    try:
+        applied = backend.migrate()
+    finally:
+        backend.close()
+    print(f"Applied {len(applied)} migration(s){': ' + ', '.join(applied) if applied else ''}")
+
+
+if __name__ == "__main__":
+    main()
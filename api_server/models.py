@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import date, datetime
 from enum import Enum
+import json
 
 class InvoiceStatus(str, Enum):
     DRAFT = "Draft"
@@ -30,11 +31,56 @@ class Invoice(BaseModel):
     type: InvoiceType
     issue_date: date
     due_date: date
-    line_items: List[LineItem]
+    line_items: List[LineItem] = Field(default_factory=list)
     notes: Optional[str] = None
     created_by_user_id: Optional[str] = None
     last_updated: datetime
 
+    @field_validator("line_items", mode="wrap")
+    @classmethod
+    def parse_line_items(cls, value, handler):
+        # Rows carry line_items as jsonb or JSON text; a malformed value
+        # becomes an empty list instead of failing the whole invoice
+        try:
+            if isinstance(value, str):
+                value = json.loads(value)
+            return handler(value or [])
+        except ValueError as e:
+            print(f"Error parsing line_items: {e}")
+            return []
+
+class InvoiceImport(BaseModel):
+    """One row of a bulk import; the database assigns `id` and `last_updated`"""
+    invoice_id: str = Field(..., min_length=1)
+    customer_name: str = Field(..., min_length=1)
+    amount: float
+    currency: str = Field("USD", min_length=3, max_length=3)
+    status: InvoiceStatus = InvoiceStatus.DRAFT
+    company_id: Optional[str] = None
+    type: InvoiceType = InvoiceType.RECEIVABLE
+    issue_date: date
+    due_date: date
+    line_items: List[LineItem] = Field(default_factory=list)
+    notes: Optional[str] = None
+    created_by_user_id: Optional[str] = None
+
+    @field_validator("line_items", mode="before")
+    @classmethod
+    def parse_line_items(cls, value):
+        # CSV cells carry line_items as JSON text; unlike Invoice, a malformed
+        # value rejects the row rather than importing it without items
+        if isinstance(value, str):
+            return json.loads(value) if value.strip() else []
+        return value
+
+class InvoiceBatchRequest(BaseModel):
+    invoice_ids: List[str] = Field(..., min_length=1, max_length=100)
+    user_id: Optional[str] = None
+
+class InvoiceBatchResponse(BaseModel):
+    invoices: List[Invoice]
+    missing: List[str]
+
 class InvoiceStatusUpdate(BaseModel):
     status: InvoiceStatus
 
@@ -45,6 +91,27 @@ class InvoiceSummaryQuery(BaseModel):
     created_by_user_id: Optional[str] = None
     type: Optional[InvoiceType] = None
 
+class InvoiceFilter(BaseModel):
+    """Filters shared by invoice search and summary; compiled by filters.compile_filter.
+
+    Date and amount bounds are inclusive; several statuses match any of them.
+    """
+    statuses: List[InvoiceStatus] = Field(default_factory=list)
+    customer_name: Optional[str] = None
+    created_by_user_id: Optional[str] = None
+    invoice_type: Optional[InvoiceType] = None
+    due_date_after: Optional[date] = None
+    due_date_before: Optional[date] = None
+    issue_date_after: Optional[date] = None
+    issue_date_before: Optional[date] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+class CurrencyTotals(BaseModel):
+    invoice_count: int
+    outstanding: float
+    paid_this_month: float
+
 class InvoiceSummary(BaseModel):
     total_outstanding: float
     overdue_count: int
@@ -52,6 +119,44 @@ class InvoiceSummary(BaseModel):
     total_invoices: int
     paid_this_month: float
     draft_count: int
+    # Currency of total_outstanding/paid_this_month; None if they mix currencies
+    reporting_currency: Optional[str] = None
+    totals_by_currency: Dict[str, CurrencyTotals] = Field(default_factory=dict)
+
+class UserSummariesRequest(BaseModel):
+    # None summarizes every user that has invoices
+    user_ids: Optional[List[str]] = Field(None, max_length=50000)
+    reporting_currency: Optional[str] = Field(None, min_length=3, max_length=3)
+
+class UserSummariesResponse(BaseModel):
+    summaries: Dict[str, InvoiceSummary]
+
+class AgingBucket(BaseModel):
+    bucket: str
+    count: int
+    amount_by_currency: Dict[str, float]
+    reporting_amount: Optional[float] = None
+
+class ForecastWeek(BaseModel):
+    week_start: date
+    count: int
+    amount_by_currency: Dict[str, float]
+    reporting_amount: Optional[float] = None
+
+class InvoiceAnalytics(BaseModel):
+    as_of: date
+    invoice_count: int
+    receivable_aging: List[AgingBucket]
+    payable_aging: List[AgingBucket]
+    totals_by_currency: Dict[str, Dict[str, float]]
+    cash_in_forecast: List[ForecastWeek]
+    cash_out_forecast: List[ForecastWeek]
+    # Set when every currency involved could be converted
+    reporting_currency: Optional[str] = None
+
+class CustomerMatch(BaseModel):
+    customer_name: str
+    score: float
 
 class APIResponse(BaseModel):
     success: bool
@@ -0,0 +1,123 @@
+"""
+Background job that marks Sent invoices past their due date as Overdue.
+
+Each run is one bulk UPDATE (status = 'Sent' AND due_date < today) through
+DatabaseClient, so rollups, cached analytics columns and query ETags are
+invalidated the same way as any other write. The update is idempotent, so
+it is harmless if several server processes run the job.
+
+With rollups on, the first run waits for RollupRefresher's initial build:
+on SQLite the two would otherwise contend for the invoices table at
+startup. A run that still hits a lock error is retried a few times before
+it is counted as failed.
+
+Settings:
+    OVERDUE_CHECK_INTERVAL_SECONDS  seconds between runs (default 3600, 0 disables)
+    OVERDUE_SLACK_WEBHOOK_URL       optional incoming webhook for a digest
+"""
+
+import os
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from .database import DatabaseClient
+from .metrics import metrics
+
+DIGEST_MAX_LINES = 20
+LOCK_RETRIES = 3
+LOCK_RETRY_SECONDS = 0.5
+
+
+def format_digest(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"*{len(rows)} invoice{'s' if len(rows) != 1 else ''} marked Overdue*"]
+    for row in sorted(rows, key=lambda r: (str(r["due_date"]), r["invoice_id"]))[:DIGEST_MAX_LINES]:
+        lines.append(
+            f"• {row['invoice_id']} · {row['customer_name']} · {row['amount']} {row['currency']} "
+            f"(due {str(row['due_date'])[:10]})"
+        )
+    if len(rows) > DIGEST_MAX_LINES:
+        lines.append(f"…and {len(rows) - DIGEST_MAX_LINES} more")
+    return "\n".join(lines)
+
+
+def is_lock_error(e: Exception) -> bool:
+    # sqlite3: "database is locked" / "database table is locked: invoices"
+    return "locked" in str(e).lower()
+
+
+class OverdueScheduler:
+    def __init__(self,
+                 db: DatabaseClient,
+                 interval_seconds: Optional[float] = None,
+                 webhook_url: Optional[str] = None,
+                 start_after: Optional[threading.Event] = None):
+        self.db = db
+        self.start_after = start_after
+        self.interval_seconds = float(
+            interval_seconds if interval_seconds is not None else os.getenv("OVERDUE_CHECK_INTERVAL_SECONDS", 3600)
+        )
+        self.webhook_url = webhook_url if webhook_url is not None else os.getenv("OVERDUE_SLACK_WEBHOOK_URL")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Flip overdue invoices and report the run; returns the updated rows"""
+        start = time.perf_counter()
+        try:
+            for attempt in range(LOCK_RETRIES + 1):
+                try:
+                    updated = self.db.mark_overdue(today)
+                    break
+                except Exception as e:
+                    if attempt == LOCK_RETRIES or not is_lock_error(e):
+                        raise
+                metrics.incr("overdue.lock_retries")
+                if self._stop.wait(LOCK_RETRY_SECONDS * 2**attempt):
+                    return []
+        except Exception as e:
+            print(f"Error marking invoices overdue: {e}")
+            metrics.incr("overdue.errors")
+            return []
+        finally:
+            metrics.observe("overdue.run_seconds", time.perf_counter() - start)
+        metrics.incr("overdue.runs")
+        metrics.incr("overdue.rows_updated", len(updated))
+        metrics.gauge("overdue.last_rows_updated", len(updated))
+        metrics.gauge("overdue.last_run_at", time.time())
+        if updated and self.webhook_url:
+            self.post_digest(updated)
+        return updated
+
+    def post_digest(self, rows: List[Dict[str, Any]]) -> None:
+        try:
+            resp = requests.post(self.webhook_url, json={"text": format_digest(rows)}, timeout=10)
+            resp.raise_for_status()
+        except Exception as e:
+            print(f"Error posting overdue digest to Slack: {e}")
+            metrics.incr("overdue.digest_errors")
+
+    def _loop(self) -> None:
+        if self.start_after is not None:
+            while not self.start_after.is_set():
+                if self._stop.wait(0.1):
+                    return
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> bool:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return False
+        self._thread = threading.Thread(target=self._loop, name="overdue-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
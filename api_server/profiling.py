@@ -0,0 +1,259 @@
+"""
+Sampling profiler for slow or flagged API requests.
+
+A request is profiled automatically once it has been running for
+PROFILE_SLOW_MS, or on demand when it carries an `X-Profile: 1` header or a
+`?profile=1` query flag. On-demand profiling samples every thread, so it is
+off unless PROFILE_REQUESTS=1, and even then a flag only counts on a request
+whose X-Profile-Token header matches PROFILE_ADMIN_TOKEN. A flagged response
+carries an X-Profile-Id header naming its profile.
+
+One sampler thread, started on first use and idle while no profiled request
+is in flight, snapshots stacks every PROFILE_INTERVAL_MS. Async handlers and
+the threadpool work they start run on different threads, so every thread is
+sampled and each stack is rooted at its thread name; requests running at the
+same time appear in each other's profiles.
+
+Profiles are collapsed stacks ("root;caller;callee count" per line), the
+input of flamegraph.pl and speedscope, written to PROFILE_DIR. The newest
+PROFILE_KEEP files per process kind are kept. /api/profiles lists them and
+/api/profiles/{name or id} serves one; that includes the bot's profiles when
+it shares PROFILE_DIR. Profiles show code paths and arguments of other
+users' requests, so those routes also need the X-Profile-Token header and
+answer 404 while PROFILE_ADMIN_TOKEN is unset.
+
+With no flag on a request and PROFILE_SLOW_MS at 0 the middleware only looks
+for the flag.
+
+Settings:
+    PROFILE_REQUESTS     honour X-Profile / ?profile=1 (default 0)
+    PROFILE_ADMIN_TOKEN  X-Profile-Token value for flagged requests and /api/profiles (unset: neither)
+    PROFILE_SLOW_MS      profile requests running longer than this (default 0, off)
+    PROFILE_INTERVAL_MS  sampling interval (default 5)
+    PROFILE_DIR          where profiles are written (default ./profiles)
+    PROFILE_KEEP         profiles kept per process kind (default 50)
+"""
+
+import glob
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from .metrics import metrics
+
+PROFILE_SUFFIX = ".folded"
+
+
+def sample_stacks(thread_ids: Optional[set] = None, skip: Optional[int] = None) -> List[str]:
+    """One collapsed stack per thread (or per thread in `thread_ids`)"""
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        if ident == skip or (thread_ids is not None and ident not in thread_ids):
+            continue
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(names.get(ident, f"thread-{ident}"))
+        stacks.append(";".join(reversed(frames)))
+    return stacks
+
+
+class Capture:
+    def __init__(self, label: str, forced: bool, thread_ids: Optional[set] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.forced = forced
+        self.thread_ids = thread_ids
+        self.started = time.monotonic()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class Profiler:
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 interval_ms: Optional[float] = None,
+                 slow_ms: Optional[float] = None,
+                 keep: Optional[int] = None,
+                 on_request: Optional[bool] = None,
+                 admin_token: Optional[str] = None,
+                 kind: str = "api"):
+        self.directory = directory or os.getenv("PROFILE_DIR", "profiles")
+        self.interval = float(interval_ms if interval_ms is not None else os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.getenv("PROFILE_SLOW_MS", 0))
+        self.keep = int(keep if keep is not None else os.getenv("PROFILE_KEEP", 50))
+        self.on_request = on_request if on_request is not None else (
+            os.getenv("PROFILE_REQUESTS", "0").lower() in ("1", "true", "yes")
+        )
+        self.admin_token = admin_token if admin_token is not None else os.getenv("PROFILE_ADMIN_TOKEN") or None
+        if self.on_request and self.admin_token is None:
+            print("PROFILE_REQUESTS is on but PROFILE_ADMIN_TOKEN is unset; profile flags are ignored")
+        self.kind = kind
+        self._active: Dict[str, Capture] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """True if `token` (an X-Profile-Token header) grants access to profiling"""
+        if self.admin_token is None or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def begin(self, label: str, forced: bool = False, thread_ids: Optional[set] = None) -> Optional[Capture]:
+        """Start watching a request; None if it can't end up profiled"""
+        if not forced and self.slow_ms <= 0:
+            return None
+        capture = Capture(label, forced, thread_ids)
+        with self._lock:
+            self._active[capture.id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return capture
+
+    def end(self, capture: Capture, status: Any = None) -> Optional[str]:
+        """Stop sampling `capture`; returns the profile path if one was written"""
+        with self._lock:
+            self._active.pop(capture.id, None)
+        # A flagged request was promised a profile, even if it finished before the first sample
+        if not capture.samples and not capture.forced:
+            return None
+        elapsed_ms = int((time.monotonic() - capture.started) * 1000)
+        try:
+            return self._write(capture, elapsed_ms, status)
+        except OSError as e:
+            print(f"Error writing profile {capture.id}: {e}")
+            return None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+            now = time.monotonic()
+            armed = [c for c in active if c.forced or (now - c.started) * 1000 >= self.slow_ms]
+            if armed:
+                everything = None
+                for capture in armed:
+                    if capture.thread_ids is None and everything is None:
+                        everything = sample_stacks(skip=me)
+                    stacks = everything if capture.thread_ids is None else sample_stacks(capture.thread_ids)
+                    with self._lock:
+                        # end() may have collected it meanwhile
+                        if capture.id in self._active:
+                            capture.stacks.update(stacks)
+                            capture.samples += 1
+            time.sleep(self.interval)
+
+    def _write(self, capture: Capture, elapsed_ms: int, status: Any) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")[:-3]
+        slug = "".join(ch if ch.isalnum() else "_" for ch in capture.label).strip("_")[:60]
+        name = f"{self.kind}-{stamp}-{capture.id}-{elapsed_ms}ms-{status or 'na'}-{slug}{PROFILE_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            for stack, count in capture.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        metrics.incr("profiles.written")
+        metrics.incr("profiles.samples", capture.samples)
+        self._rotate()
+        return path
+
+    def _rotate(self) -> None:
+        paths = sorted(glob.glob(os.path.join(self.directory, f"{self.kind}-*{PROFILE_SUFFIX}")), reverse=True)
+        for path in paths[self.keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Profiles in PROFILE_DIR, newest first"""
+        profiles = []
+        for path in glob.glob(os.path.join(self.directory, f"*{PROFILE_SUFFIX}")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            name = os.path.basename(path)
+            parts = name.split("-", 5)
+            profiles.append({
+                "name": name,
+                "id": parts[2] if len(parts) > 2 else None,
+                "kind": parts[0],
+                "bytes": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+            })
+        return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+    def path_for(self, name_or_id: str) -> Optional[str]:
+        """Path of a profile by file name or capture id, if it exists"""
+        for profile in self.list_profiles():
+            if name_or_id in (profile["name"], profile["id"]):
+                return os.path.join(self.directory, profile["name"])
+        return None
+
+
+def _flagged(scope: Dict[str, Any]) -> bool:
+    for key, value in scope.get("headers", ()):
+        if key == b"x-profile":
+            return value not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and parse_qs(query.decode()).get("profile", ["0"])[0] not in ("", "0", "false")
+
+
+def _token(scope: Dict[str, Any]) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == b"x-profile-token":
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles flagged and slow requests"""
+
+    def __init__(self, app, request_profiler: Optional[Profiler] = None):
+        self.app = app
+        self.profiler = request_profiler or profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = self.profiler.on_request and _flagged(scope) and self.profiler.authorized(_token(scope))
+        capture = self.profiler.begin(f"{scope['method']} {scope['path']}", forced)
+        if capture is None:
+            return await self.app(scope, receive, send)
+        status = None
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if forced:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", capture.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.profiler.end(capture, status)
+
+
+profiler = Profiler()
@@ -0,0 +1,46 @@
+"""
+JSON response classes used by the API server.
+
+ModelResponse is for payloads that are already validated pydantic models.
+Returning a Response from a route bypasses FastAPI's response_model
+processing, which would otherwise re-validate the models and walk them
+through jsonable_encoder before encoding. Routes keep their
+`response_model` so the OpenAPI schema is unchanged.
+
+ORJSONResponse is the app's default for plain dict payloads (health checks,
+sessions, error bodies).
+"""
+
+from functools import lru_cache
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+class ModelResponse(Response):
+    """JSON response serialized directly by pydantic-core"""
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, annotation: Any = None, **kwargs):
+        self.annotation = annotation
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode()
+        return _adapter(self.annotation or type(content)).dump_json(content)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
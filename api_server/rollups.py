@@ -0,0 +1,331 @@
+"""
+In-process invoice rollups for O(1) summaries.
+
+Every invoice row is folded into the aggregates of each
+(created_by_user_id, customer_name, type) group it belongs to, including the
+wildcard groups (None = any), so a summary scoped by any combination of those
+fields is a single dict lookup instead of a scan. Rows are keyed by the
+primary key `id` and `upsert` swaps a row's old snapshot out of the
+aggregates and the new one in.
+
+Amounts are kept per currency in integer cents, so aggregates stay exact
+across any number of upserts and are converted only when a summary is read.
+
+Nothing is built on a request path. `RollupRefresher` runs
+DatabaseClient.sync_rollups from one background thread: a full build at
+start and every INVOICE_ROLLUPS_MAX_AGE seconds (which also drops rows
+deleted elsewhere), and in between the change feed of storage/changes.py
+(new ids and `last_updated` since the last sync), so writes from other
+processes show up within INVOICE_ROLLUPS_POLL_SECONDS. A rebuild scans into
+a new snapshot while the old one keeps answering; writes folded in during
+the scan are replayed onto the new snapshot before it is swapped in.
+Summaries come from the rollups only while the last successful sync is at
+most INVOICE_ROLLUPS_MAX_STALENESS_SECONDS old; otherwise they scan the table.
+
+Settings:
+    INVOICE_ROLLUPS                        set to 1 to answer summaries from rollups
+    INVOICE_ROLLUPS_MAX_AGE                seconds between full rebuilds (default 600)
+    INVOICE_ROLLUPS_POLL_SECONDS           seconds between change polls (default 5)
+    INVOICE_ROLLUPS_MAX_STALENESS_SECONDS  oldest sync summaries may be served from (default 30)
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, DefaultDict, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .fx import FxRates, money_totals, to_minor
+from .metrics import metrics
+from .models import InvoiceSummary
+from .storage.changes import now_micros, to_micros
+
+GroupKey = Tuple[Optional[str], Optional[str], Optional[str]]
+Month = Tuple[int, int]
+# (status, currency) and (due month, currency)
+StatusCurrency = Tuple[str, str]
+MonthCurrency = Tuple[Month, str]
+
+CLOSED_STATUSES = ("Paid", "Cancelled")
+
+
+class RollupRow(NamedTuple):
+    id: int
+    invoice_id: str
+    customer_name: str
+    created_by_user_id: Optional[str]
+    type: str
+    status: str
+    currency: str
+    amount: float
+    amount_minor: int
+    due_date: date
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "RollupRow":
+        return cls(
+            id=int(row["id"]),
+            invoice_id=row["invoice_id"],
+            customer_name=row["customer_name"],
+            created_by_user_id=row.get("created_by_user_id"),
+            type=row["type"],
+            status=row["status"],
+            currency=row["currency"],
+            amount=float(row["amount"]),
+            amount_minor=to_minor(row["amount"]),
+            due_date=date.fromisoformat(str(row["due_date"])[:10]),
+        )
+
+    def group_keys(self) -> List[GroupKey]:
+        return [
+            (user, customer, kind)
+            for user in (self.created_by_user_id, None)
+            for customer in (self.customer_name, None)
+            for kind in (self.type, None)
+        ]
+
+
+@dataclass
+class Rollup:
+    """Aggregates for one group of invoices"""
+    status_counts: DefaultDict[StatusCurrency, int] = field(default_factory=lambda: defaultdict(int))
+    status_amounts: DefaultDict[StatusCurrency, int] = field(default_factory=lambda: defaultdict(int))
+    # Paid cents and open invoices, bucketed by due month
+    paid_by_month: DefaultDict[MonthCurrency, int] = field(default_factory=lambda: defaultdict(int))
+    due_by_month: DefaultDict[Month, Dict[int, RollupRow]] = field(default_factory=lambda: defaultdict(dict))
+
+
+def fold(groups: DefaultDict[GroupKey, Rollup], row: RollupRow, sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) a row in every group it belongs to.
+
+    The per-row keys are built once and shared by all eight groups.
+    """
+    month = (row.due_date.year, row.due_date.month)
+    status_key = (row.status, row.currency)
+    amount = sign * row.amount_minor
+    paid_key = (month, row.currency) if row.status == "Paid" else None
+    for key in row.group_keys():
+        group = groups[key]
+        group.status_counts[status_key] += sign
+        group.status_amounts[status_key] += amount
+        if paid_key is not None:
+            group.paid_by_month[paid_key] += amount
+        if sign > 0:
+            group.due_by_month[month][row.id] = row
+        else:
+            group.due_by_month[month].pop(row.id, None)
+
+
+def replace(rows: Dict[int, RollupRow], groups: DefaultDict[GroupKey, Rollup], row: RollupRow) -> bool:
+    """Swap `row` in for the stored row with its id; False if nothing changed"""
+    previous = rows.get(row.id)
+    if previous == row:
+        return False
+    if previous:
+        fold(groups, previous, -1)
+    rows[row.id] = row
+    fold(groups, row, 1)
+    return True
+
+
+class RollupIndex:
+    def __init__(self, max_age_seconds: float = 600, max_staleness_seconds: float = 30):
+        self.max_age_seconds = max_age_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        # monotonic times the current snapshot was started and last brought up to date
+        self.built_at: Optional[float] = None
+        self.synced_at: Optional[float] = None
+        # Newest last_updated (epoch microseconds) and highest id folded in; the change feed resumes from them
+        self.watermark = 0
+        self.max_id = 0
+        self._rows: Dict[int, RollupRow] = {}
+        self._groups: DefaultDict[GroupKey, Rollup] = defaultdict(Rollup)
+        self._lock = threading.RLock()
+        # One rebuild at a time; rows upserted while it scans, to replay onto its snapshot
+        self._rebuild_lock = threading.Lock()
+        self._pending: Optional[List[RollupRow]] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        if self.built_at is None:
+            return True
+        return bool(self.max_age_seconds) and time.monotonic() - self.built_at > self.max_age_seconds
+
+    @property
+    def is_fresh(self) -> bool:
+        """True while summaries may be answered from the rollups"""
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness_seconds
+
+    def _track(self, raw: Dict[str, Any]) -> None:
+        self.max_id = max(self.max_id, int(raw["id"]))
+        if raw.get("last_updated"):
+            self.watermark = max(self.watermark, to_micros(raw["last_updated"]))
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> Optional[int]:
+        """Rebuild from a full pass over the invoices table; returns the rows
+        loaded, or None if another rebuild is already running.
+
+        The current snapshot keeps answering until the new one is complete.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            return None
+        try:
+            started, started_at = time.monotonic(), now_micros()
+            with self._lock:
+                self._pending = []
+            snapshots: Dict[int, RollupRow] = {}
+            groups: DefaultDict[GroupKey, Rollup] = defaultdict(Rollup)
+            max_id = 0
+            for raw in rows:
+                row = RollupRow.from_row(raw)
+                max_id = max(max_id, row.id)
+                replace(snapshots, groups, row)
+            with self._lock:
+                for row in self._pending:
+                    replace(snapshots, groups, row)
+                self._rows, self._groups = snapshots, groups
+                self.max_id = max(self.max_id, max_id)
+                # Rows updated behind the scan's id cursor are picked up by the next poll
+                self.watermark = started_at
+                self.built_at = self.synced_at = started
+            return len(snapshots)
+        finally:
+            with self._lock:
+                self._pending = None
+            self._rebuild_lock.release()
+
+    def upsert(self, raw: Dict[str, Any]) -> bool:
+        """Fold a written or polled row into the aggregates; False if nothing they keep changed"""
+        if raw.get("id") is None:
+            return False
+        row = RollupRow.from_row(raw)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            self._track(raw)
+            return replace(self._rows, self._groups, row)
+
+    def customers_containing(self, text: str) -> List[str]:
+        """Customer names containing `text`, ignoring case (ILIKE '%text%')"""
+        needle = text.casefold()
+        with self._lock:
+            return [
+                customer for user, customer, kind in self._groups
+                if user is None and kind is None and customer and needle in customer.casefold()
+            ]
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            return [user for user, customer, kind in self._groups if user and customer is None and kind is None]
+
+    def summary(self,
+                created_by_user_id: Optional[str] = None,
+                customer_names: Optional[List[str]] = None,
+                invoice_type: Optional[str] = None,
+                status: Optional[str] = None,
+                today: Optional[date] = None,
+                fx_rates: Optional[FxRates] = None,
+                reporting_currency: Optional[str] = None,
+                statuses: Optional[Sequence[str]] = None) -> InvoiceSummary:
+        """Same figures as DatabaseClient's row-by-row summary, from the aggregates.
+
+        `customer_names` are exact names (already resolved from a partial
+        query); None means any customer. `statuses` matches any of several
+        statuses, in place of `status`.
+        """
+        today = today or datetime.now().date()
+        this_month = (today.year, today.month)
+        with self._lock:
+            if customer_names is None:
+                groups = [self._groups.get((created_by_user_id, None, invoice_type))]
+            else:
+                groups = [self._groups.get((created_by_user_id, name, invoice_type)) for name in set(customer_names)]
+            groups = [g for g in groups if g is not None]
+
+            statuses = set(statuses) if statuses else ({status} if status else None)
+            overdue_count = draft_count = total_invoices = 0
+            outstanding: DefaultDict[str, int] = defaultdict(int)
+            paid: DefaultDict[str, int] = defaultdict(int)
+            counts: DefaultDict[str, int] = defaultdict(int)
+            due_this_month = []
+            for group in groups:
+                for (name, currency), count in group.status_counts.items():
+                    if (statuses and name not in statuses) or not count:
+                        continue
+                    total_invoices += count
+                    counts[currency] += count
+                    if name not in CLOSED_STATUSES:
+                        outstanding[currency] += group.status_amounts[(name, currency)]
+                    if name == "Overdue":
+                        overdue_count += count
+                    if name == "Draft":
+                        draft_count += count
+                if not statuses or "Paid" in statuses:
+                    for (month, currency), minor in group.paid_by_month.items():
+                        if month >= this_month:
+                            paid[currency] += minor
+                for row in group.due_by_month.get(this_month, {}).values():
+                    if not statuses or row.status in statuses:
+                        due_this_month.append(row)
+
+        # Table order, as the row-by-row summary lists them
+        due_this_month.sort(key=lambda r: r.id)
+        return InvoiceSummary(
+            overdue_count=overdue_count,
+            due_this_month=[
+                {
+                    "invoice_id": r.invoice_id,
+                    "customer_name": r.customer_name,
+                    "amount": r.amount,
+                    "currency": r.currency,
+                    "due_date": r.due_date.isoformat(),
+                    "status": r.status
+                }
+                for r in due_this_month
+            ],
+            total_invoices=total_invoices,
+            draft_count=draft_count,
+            **money_totals(outstanding, paid, counts, fx_rates, reporting_currency)
+        )
+
+
+class RollupRefresher:
+    """Keeps a DatabaseClient's rollups current from one background thread"""
+
+    def __init__(self, db, poll_seconds: Optional[float] = None):
+        self.db = db
+        self.poll_seconds = float(
+            poll_seconds if poll_seconds is not None else os.getenv("INVOICE_ROLLUPS_POLL_SECONDS", 5)
+        )
+        # Set once the first sync (the initial build) has finished or failed
+        self.first_sync_done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.db.sync_rollups()
+            except Exception as e:
+                print(f"Error syncing invoice rollups: {e}")
+                metrics.incr("rollups.sync_errors")
+            self.first_sync_done.set()
+            self._stop.wait(self.poll_seconds)
+
+    def start(self) -> bool:
+        if self.db.rollups is None or self._thread is not None:
+            return False
+        self._thread = threading.Thread(target=self._loop, name="invoice-rollups", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
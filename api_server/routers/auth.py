@@ -1,20 +1,24 @@
 # api_server/routers/auth.py
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 import requests
 import os
 import time
-from supabase import create_client, Client
+from ..dependencies import get_session_index
+from ..sessions import SessionIndex
 
 router = APIRouter()
 
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_ANON_KEY = os.environ["SUPABASE_KEY"]
-SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_KEY", SUPABASE_ANON_KEY)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Settings are read per request (not at import) so the app can start, and be
+# imported by tools and tests, without the Supabase environment configured.
+def _supabase_url() -> str:
+    url = os.environ.get("SUPABASE_URL")
+    if not url:
+        raise HTTPException(status_code=503, detail="SUPABASE_URL is not configured")
+    return url
 
 @router.get("/auth/callback")
-async def auth_callback(request: Request):
+async def auth_callback(request: Request, sessions: SessionIndex = Depends(get_session_index)):
     # Check for error in query params
     error = request.query_params.get("error")
     error_description = request.query_params.get("error_description")
@@ -32,8 +36,8 @@ async def auth_callback(request: Request):
     redirect_uri = "https://b8cb-2405-201-6009-a0af-4d52-e4eb-cbe1-c001.ngrok-free.app/auth/callback"
     # Exchange code for session with Supabase
     resp = requests.post(
-        f"{SUPABASE_URL}/auth/v1/token?grant_type=oauth",
-        headers={"apikey": SUPABASE_ANON_KEY, "Content-Type": "application/json"},
+        f"{_supabase_url()}/auth/v1/token?grant_type=oauth",
+        headers={"apikey": os.environ.get("SUPABASE_KEY"), "Content-Type": "application/json"},
         json={"auth_code": code, "redirect_uri": redirect_uri}
     )
     if resp.status_code != 200:
@@ -48,14 +52,14 @@ async def auth_callback(request: Request):
     user = session.get("user", {})
     supabase_user_id = user.get("id")
 
-    # Store in Supabase table
-    supabase.table("slack_sessions").upsert({
+    # Store in Supabase table and the session index
+    sessions.put({
         "slack_user_id": slack_user_id,
         "supabase_user_id": supabase_user_id,
         "access_token": access_token,
         "refresh_token": refresh_token,
         "expires_at": expires_at
-    }).execute()
+    })
 
     # Optionally, notify the user in Slack (using Slack API)
     # Redirect to a "success" page or close the window
@@ -68,26 +72,20 @@ async def auth_slack(user_id: str):
     # Construct Supabase OAuth URL with slack_user_id as a query param in redirect_to
     redirect_uri = f"https://b8cb-2405-201-6009-a0af-4d52-e4eb-cbe1-c001.ngrok-free.app/auth/callback?slack_user_id={user_id}"
     supabase_oauth_url = (
-        f"{SUPABASE_URL}/auth/v1/authorize"
+        f"{_supabase_url()}/auth/v1/authorize"
         f"?provider=slack_oidc"
         f"&redirect_to={redirect_uri}"
     )
     return RedirectResponse(supabase_oauth_url)
 
 @router.get("/api/session/{user_id}")
-async def check_session(user_id: str):
-    result = supabase.table("slack_sessions").select("*").eq("slack_user_id", user_id).execute()
-    sessions = result.data
-    if not sessions or len(sessions) == 0:
-        return {"authenticated": False}
-    session = sessions[0]
-    expires_at = session.get("expires_at")
-    if expires_at and int(expires_at) < int(time.time()):
-        return {"authenticated": False}
-    return {"authenticated": True}
+def check_session(user_id: str, sessions: SessionIndex = Depends(get_session_index)):
+    # Usually answered from the in-memory index with a locally verified token; a
+    # table read or token refresh can block, so this runs in the threadpool
+    return {"authenticated": sessions.is_authenticated(user_id)}
 
 @router.post("/api/save_session")
-async def save_session(request: Request):
+async def save_session(request: Request, sessions: SessionIndex = Depends(get_session_index)):
     import time
     try:
         data = await request.json()
@@ -109,18 +107,13 @@ async def save_session(request: Request):
         else:
             expires_at = None
 
-        # Store in Supabase table
-        result = supabase.table("slack_sessions").upsert({
+        # Store in Supabase table and the session index
+        sessions.put({
             "slack_user_id": slack_user_id,
             "access_token": access_token,
             "refresh_token": refresh_token,
             "expires_at": expires_at
-        }).execute()
-        print("Upsert result:", result)
-
-        # Check for errors in result
-        if hasattr(result, 'error') and result.error:
-            return JSONResponse({"success": False, "error": str(result.error)}, status_code=500)
+        })
 
         return {"success": True}
     except Exception as e:
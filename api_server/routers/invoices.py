@@ -1,34 +1,82 @@
-from fastapi import APIRouter, HTTPException, Query, Path
-from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Optional, List
 from datetime import date
-from ..models import Invoice, InvoiceStatusUpdate, InvoiceSummary, APIResponse, InvoiceStatus, InvoiceType
+import time
+from ..models import (
+    Invoice, InvoiceFilter, InvoiceStatusUpdate, InvoiceSummary, APIResponse, InvoiceStatus, InvoiceType, CustomerMatch,
+    InvoiceBatchRequest, InvoiceBatchResponse, InvoiceAnalytics, UserSummariesRequest, UserSummariesResponse
+)
 from ..database import DatabaseClient
+from ..dependencies import get_db, get_event_recorder
+from ..events import AUDIT, QUERY, EventRecorder
+from ..filters import DEFAULT_SORT, SORT_PATTERN
+from ..responses import ModelResponse
+from ..caching import etag_matches, make_etag, not_modified, query_etag
 from ..auth import get_user_from_request
+from .. import bulk
 
 router = APIRouter(
     prefix="/api/invoices",
     tags=["invoices"]
 )
-db = DatabaseClient()
 
-@router.get("/summary", response_model=InvoiceSummary)
-async def get_invoices_summary(
-    status: Optional[InvoiceStatus] = Query(None, description="Filter by status"),
-    due_date_before: Optional[date] = Query(None, description="Filter by due date before this date"),
+def invoice_filter(
+    status: Optional[List[InvoiceStatus]] = Query(None, description="Filter by status; repeat for any of several"),
     customer_name: Optional[str] = Query(None, description="Filter by customer name (partial match)"),
     created_by_user_id: Optional[str] = Query(None, description="Filter by creator user ID"),
-    invoice_type: Optional[InvoiceType] = Query(None, description="Filter by invoice type (RECEIVABLE/PAYABLE)")
+    invoice_type: Optional[InvoiceType] = Query(None, description="Filter by invoice type (RECEIVABLE/PAYABLE)"),
+    due_date_after: Optional[date] = Query(None, description="Due on or after this date"),
+    due_date_before: Optional[date] = Query(None, description="Due on or before this date"),
+    issue_date_after: Optional[date] = Query(None, description="Issued on or after this date"),
+    issue_date_before: Optional[date] = Query(None, description="Issued on or before this date"),
+    min_amount: Optional[float] = Query(None, description="Amount at least this much"),
+    max_amount: Optional[float] = Query(None, description="Amount at most this much")
+) -> InvoiceFilter:
+    """Query parameters shared by search and summary"""
+    return InvoiceFilter(
+        statuses=status or [],
+        customer_name=customer_name,
+        created_by_user_id=get_user_from_request(created_by_user_id),
+        invoice_type=invoice_type,
+        due_date_after=due_date_after,
+        due_date_before=due_date_before,
+        issue_date_after=issue_date_after,
+        issue_date_before=issue_date_before,
+        min_amount=min_amount,
+        max_amount=max_amount
+    )
+
+def _record_query(recorder: EventRecorder, endpoint: str, filters: InvoiceFilter, started: float,
+                  rows: Optional[int] = None, **options: Any) -> None:
+    """Query telemetry: which filters were used, how many rows came back and how long it took"""
+    recorder.record(QUERY, {
+        "endpoint": endpoint,
+        "filters": filters.model_dump(mode="json", exclude_defaults=True, exclude={"created_by_user_id"}),
+        **options,
+        "rows": rows,
+        "not_modified": rows is None,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }, slack_user_id=filters.created_by_user_id)
+
+@router.get("/summary", response_model=InvoiceSummary)
+async def get_invoices_summary(
+    request: Request,
+    filters: InvoiceFilter = Depends(invoice_filter),
+    reporting_currency: Optional[str] = Query(None, min_length=3, max_length=3, description="Currency to convert totals into (e.g., USD)"),
+    db: DatabaseClient = Depends(get_db),
+    recorder: EventRecorder = Depends(get_event_recorder)
 ):
+    started = time.perf_counter()
     try:
-        validated_user = get_user_from_request(created_by_user_id)
-        summary = db.get_invoices_summary(
-            status=status,
-            due_date_before=due_date_before,
-            customer_name=customer_name,
-            created_by_user_id=validated_user,
-            invoice_type=invoice_type
-        )
-        return summary
+        etag = query_etag(request, db.data_version)
+        if etag_matches(request, etag):
+            _record_query(recorder, "summary", filters, started)
+            return not_modified(etag)
+        summary = await db.aget_invoices_summary(filters=filters, reporting_currency=reporting_currency)
+        _record_query(recorder, "summary", filters, started, summary.total_invoices)
+        return ModelResponse(summary, headers={"ETag": etag})
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -37,40 +85,173 @@ async def get_invoices_summary(
 
 @router.get("/search", response_model=List[Invoice])
 async def search_invoices(
-    customer_name: Optional[str] = Query(None, description="Search by customer name"),
+    request: Request,
+    filters: InvoiceFilter = Depends(invoice_filter),
+    sort: str = Query(DEFAULT_SORT, pattern=SORT_PATTERN, description="Sort column, prefixed with - for descending"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    db: DatabaseClient = Depends(get_db),
+    recorder: EventRecorder = Depends(get_event_recorder)
+):
+    started = time.perf_counter()
+    try:
+        etag = query_etag(request, db.data_version)
+        if etag_matches(request, etag):
+            _record_query(recorder, "search", filters, started, sort=sort, limit=limit)
+            return not_modified(etag)
+        invoices = db.search_invoices(filters=filters, sort=sort, limit=limit)
+        _record_query(recorder, "search", filters, started, len(invoices), sort=sort, limit=limit)
+        return ModelResponse(invoices, List[Invoice], headers={"ETag": etag})
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching invoices: {str(e)}"
+        )
+
+@router.get("/analytics", response_model=InvoiceAnalytics)
+def get_invoice_analytics(
+    created_by_user_id: Optional[str] = Query(None, description="Filter by creator user ID"),
+    customer_name: Optional[str] = Query(None, description="Filter by customer name (partial match)"),
+    as_of: Optional[date] = Query(None, description="Reference date for aging (defaults to today)"),
+    weeks: int = Query(12, ge=1, le=52, description="Number of weeks to forecast"),
+    reporting_currency: Optional[str] = Query(None, min_length=3, max_length=3, description="Currency to convert amounts into (e.g., USD)"),
+    db: DatabaseClient = Depends(get_db)
+):
+    """Aging and cash-flow forecast; a plain def, so the column load and the
+    NumPy work run in the threadpool instead of on the event loop"""
+    # Imported here so NumPy stays out of the server's cold start
+    from ..analytics import compute_analytics
+    try:
+        validated_user = get_user_from_request(created_by_user_id)
+        columns = db.get_invoice_columns(created_by_user_id=validated_user, customer_name=customer_name)
+        reporting_currency = (reporting_currency or db.reporting_currency or "").upper() or None
+        fx_rates = db.fx.get() if reporting_currency else None
+        return ModelResponse(compute_analytics(columns, as_of or date.today(), weeks, fx_rates, reporting_currency))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error computing invoice analytics: {str(e)}"
+        )
+
+@router.get("/customers", response_model=List[CustomerMatch])
+async def search_customers(
+    q: str = Query(..., min_length=1, description="Customer name or fragment; typos are tolerated"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of names"),
+    db: DatabaseClient = Depends(get_db)
+):
+    try:
+        return ModelResponse(db.search_customers(q, limit), List[CustomerMatch])
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error searching customers: {str(e)}"
+        )
+
+@router.post("/batch-get", response_model=InvoiceBatchResponse)
+async def batch_get_invoices(
+    batch: InvoiceBatchRequest,
+    db: DatabaseClient = Depends(get_db)
+):
+    try:
+        validated_user = get_user_from_request(batch.user_id)
+        invoices, missing = db.get_invoices_by_ids(batch.invoice_ids, validated_user)
+        return ModelResponse(InvoiceBatchResponse(invoices=invoices, missing=missing))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving invoices: {str(e)}"
+        )
+
+@router.post("/summaries", response_model=UserSummariesResponse)
+def get_user_summaries(
+    request: UserSummariesRequest,
+    db: DatabaseClient = Depends(get_db)
+):
+    """Per-user summaries in one pass, for scheduled digests (a plain def, so
+    the table pass runs in the threadpool)"""
+    try:
+        user_ids = None
+        if request.user_ids is not None:
+            user_ids = [u for u in (get_user_from_request(u) for u in request.user_ids) if u]
+        summaries = db.get_summaries_by_user(user_ids, request.reporting_currency)
+        return ModelResponse(UserSummariesResponse(summaries=summaries))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error getting user summaries: {str(e)}"
+        )
+
+@router.post("/import", response_model=APIResponse)
+async def import_invoices(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="csv or ndjson (default: from Content-Type)"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="Rows validated and inserted per batch"),
+    db: DatabaseClient = Depends(get_db)
+):
+    """Stream a CSV or NDJSON file of invoices into the table"""
+    fmt = bulk.detect_format(request.headers.get("content-type"), format)
+    # Parsing and inserts are blocking; the body is pulled from the event loop as they go
+    report = await run_in_threadpool(
+        lambda: bulk.import_records(db, bulk.read_records(bulk.sync_chunks(request.stream()), fmt), batch_size)
+    )
+    if "error" in report:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Import stopped after {report['imported']} rows: {report['error']}"
+        )
+    return APIResponse(
+        success=True,
+        message=(f"Imported {report['imported']} invoices, skipped {report['duplicates']} already stored, "
+                 f"rejected {report['rejected']}"),
+        data=report
+    )
+
+@router.get("/export")
+def export_invoices(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="csv or ndjson"),
     status: Optional[InvoiceStatus] = Query(None, description="Filter by status"),
-    created_by_user_id: Optional[str] = Query(None, description="Filter by creator"),
-    limit: int = Query(10, ge=1, le=50, description="Maximum number of results")
+    customer_name: Optional[str] = Query(None, description="Filter by customer name (partial match)"),
+    created_by_user_id: Optional[str] = Query(None, description="Filter by creator user ID"),
+    db: DatabaseClient = Depends(get_db)
 ):
+    """Stream matching invoices as CSV or NDJSON, read in keyset pages"""
     try:
         validated_user = get_user_from_request(created_by_user_id)
-        invoices = db.search_invoices(
-            customer_name=customer_name,
+        rows = db.iter_invoice_rows(
             status=status,
+            customer_name=customer_name,
             created_by_user_id=validated_user,
-            limit=limit
+            page_size=bulk.EXPORT_PAGE_SIZE
+        )
+        return StreamingResponse(
+            bulk.encode_rows(rows, format),
+            media_type=bulk.MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="invoices.{format}"'}
         )
-        return invoices
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error searching invoices: {str(e)}"
+            detail=f"Error exporting invoices: {str(e)}"
         )
 
 @router.get("/{invoice_id}", response_model=Invoice)
 async def get_invoice(
+    request: Request,
     invoice_id: str = Path(..., description="Invoice ID (e.g., INV-2024-001)"),
-    user_id: Optional[str] = Query(None, description="Slack user ID for filtering")
+    user_id: Optional[str] = Query(None, description="Slack user ID for filtering"),
+    db: DatabaseClient = Depends(get_db)
 ):
     try:
         validated_user = get_user_from_request(user_id)
-        invoice = db.get_invoice_by_id(invoice_id, validated_user)
+        invoice = await db.aget_invoice_by_id(invoice_id, validated_user)
         if not invoice:
             raise HTTPException(
                 status_code=404, 
                 detail=f"Invoice {invoice_id} not found"
             )
-        return invoice
+        etag = make_etag(invoice.invoice_id, invoice.last_updated.isoformat())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return ModelResponse(invoice, headers={"ETag": etag})
     except HTTPException:
         raise
     except Exception as e:
@@ -83,7 +264,9 @@ async def get_invoice(
 async def update_invoice_status(
     invoice_id: str = Path(..., description="Invoice ID to update"),
     status_update: InvoiceStatusUpdate = ...,
-    user_id: Optional[str] = Query(None, description="Slack user ID for filtering")
+    user_id: Optional[str] = Query(None, description="Slack user ID for filtering"),
+    db: DatabaseClient = Depends(get_db),
+    recorder: EventRecorder = Depends(get_event_recorder)
 ):
     try:
         validated_user = get_user_from_request(user_id)
@@ -99,6 +282,11 @@ async def update_invoice_status(
                 status_code=400,
                 detail=f"Failed to update invoice {invoice_id} status"
             )
+        recorder.record(AUDIT, {
+            "action": "status_change",
+            "from": existing_invoice.status.value,
+            "to": status_update.status.value,
+        }, slack_user_id=validated_user, subject=invoice_id)
         return APIResponse(
             success=True,
             message=f"Invoice {invoice_id} status updated to {status_update.status.value}",
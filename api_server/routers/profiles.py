@@ -0,0 +1,32 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path
+from fastapi.responses import FileResponse
+from ..profiling import profiler
+
+
+def require_profile_admin(x_profile_token: Optional[str] = Header(None)) -> None:
+    """Profiles are only served to callers holding PROFILE_ADMIN_TOKEN"""
+    if profiler.admin_token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+
+router = APIRouter(
+    prefix="/api/profiles",
+    tags=["profiles"],
+    dependencies=[Depends(require_profile_admin)]
+)
+
+@router.get("")
+def list_profiles():
+    """Recent request profiles (collapsed stacks), newest first"""
+    return {"profiles": profiler.list_profiles()}
+
+@router.get("/{name}")
+def get_profile(name: str = Path(..., description="Profile file name, or the id from X-Profile-Id")):
+    path = profiler.path_for(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    return FileResponse(path, media_type="text/plain", filename=path.rsplit("/", 1)[-1])
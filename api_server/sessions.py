@@ -0,0 +1,263 @@
+"""
+Slack login sessions, checked in memory with locally verified Supabase JWTs.
+
+`SessionIndex` keeps the slack_sessions rows in memory. A user's row is read
+on their first check and re-read once it is SESSION_CACHE_TTL_SECONDS old,
+so logins, refreshes and removals made by other processes are picked up;
+in between, checks are answered from the index. Logins write through the
+index to the table.
+
+The stored access token is verified rather than trusted: its signature,
+expiry and `authenticated` audience are checked with PyJWT. The key is the
+project's JWT secret for HS256 tokens, or the JWKS published by Supabase
+Auth, fetched once and cached, for asymmetric keys. A verified token is
+remembered until its `exp`, so repeat checks skip the crypto too. A token
+that can't be verified because no key is available falls back to the
+stored expires_at, as before.
+
+A check that finds the access token expiring within
+SESSION_REFRESH_MARGIN_SECONDS exchanges the refresh_token for new tokens,
+so active users aren't sent back through the login flow. Supabase rotates
+refresh tokens, so the row is claimed first
+(migrations/010_slack_sessions_refresh_claim.sql): an update conditioned on
+the current refresh_token and an expired claim. Only the process that wins
+it calls Supabase Auth; the others keep the still-valid access token and
+pick up the new one from the table.
+
+Settings:
+    SUPABASE_JWT_SECRET              HS256 signing secret (legacy projects)
+    SUPABASE_JWKS_URL                default {SUPABASE_URL}/auth/v1/.well-known/jwks.json
+    SESSION_CACHE_TTL_SECONDS        how long a cached session is used before re-reading it (default 60)
+    SESSION_MISS_TTL_SECONDS         how long "no session" is cached (default 30)
+    SESSION_REFRESH_MARGIN_SECONDS   refresh tokens expiring within this (default 300, 0 disables)
+    SESSION_REFRESH_CLAIM_SECONDS    how long a refresh claim keeps other processes out (default 30)
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from .metrics import metrics
+
+try:
+    import jwt
+except ImportError:
+    jwt = None
+
+AUDIENCE = "authenticated"
+UNVERIFIABLE = "unverifiable"
+
+
+class TokenVerifier:
+    def __init__(self, secret: Optional[str] = None, jwks_url: Optional[str] = None):
+        self.secret = secret if secret is not None else os.getenv("SUPABASE_JWT_SECRET")
+        supabase_url = os.getenv("SUPABASE_URL", "").rstrip("/")
+        self.jwks_url = jwks_url or os.getenv("SUPABASE_JWKS_URL") or (
+            f"{supabase_url}/auth/v1/.well-known/jwks.json" if supabase_url else None
+        )
+        self._jwks_client = None
+        self._warned = False
+
+    def _key(self, token: str):
+        algorithm = jwt.get_unverified_header(token).get("alg", "")
+        if algorithm.startswith("HS"):
+            return self.secret, algorithm
+        if self.jwks_url is None:
+            return None, algorithm
+        if self._jwks_client is None:
+            # Keys are cached by the client; an unknown kid triggers one refetch
+            self._jwks_client = jwt.PyJWKClient(self.jwks_url, cache_keys=True, lifespan=3600)
+        return self._jwks_client.get_signing_key_from_jwt(token).key, algorithm
+
+    def _unverifiable(self, reason: str):
+        if not self._warned:
+            print(f"Session tokens can't be verified locally ({reason}); falling back to expires_at")
+            self._warned = True
+        metrics.incr("sessions.unverifiable")
+        return UNVERIFIABLE
+
+    def verify(self, token: Optional[str]):
+        """The token's claims, None if it is invalid or expired, or UNVERIFIABLE"""
+        if not token:
+            return None
+        if jwt is None:
+            return self._unverifiable("PyJWT is not installed")
+        try:
+            key, algorithm = self._key(token)
+            if key is None:
+                return self._unverifiable(f"no key configured for {algorithm}")
+            return jwt.decode(token, key, algorithms=[algorithm], audience=AUDIENCE, leeway=30)
+        except jwt.PyJWKClientError as e:
+            return self._unverifiable(str(e))
+        except jwt.InvalidTokenError as e:
+            metrics.incr("sessions.invalid_tokens")
+            print(f"Rejected session token: {e}")
+            return None
+
+
+class SessionIndex:
+    def __init__(self, client_factory: Callable[[], Any], verifier: Optional[TokenVerifier] = None,
+                 miss_ttl_seconds: Optional[float] = None, ttl_seconds: Optional[float] = None,
+                 refresh_margin_seconds: Optional[float] = None):
+        self._client_factory = client_factory
+        self.verifier = verifier or TokenVerifier()
+        self.miss_ttl_seconds = float(
+            miss_ttl_seconds if miss_ttl_seconds is not None else os.getenv("SESSION_MISS_TTL_SECONDS", 30)
+        )
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("SESSION_CACHE_TTL_SECONDS", 60))
+        self.refresh_margin_seconds = float(
+            refresh_margin_seconds if refresh_margin_seconds is not None
+            else os.getenv("SESSION_REFRESH_MARGIN_SECONDS", 300)
+        )
+        self.claim_seconds = int(os.getenv("SESSION_REFRESH_CLAIM_SECONDS", 30))
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # When each indexed session was read from or written to the table (monotonic)
+        self._loaded_at: Dict[str, float] = {}
+        # Users with no stored session, and when that was last checked
+        self._misses: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client_factory()
+
+    def _remember(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Index a row read from or written to the table; the caller holds the lock"""
+        slack_user_id = row["slack_user_id"]
+        previous = self._sessions.get(slack_user_id, {})
+        merged = {**previous, **row}
+        if previous.get("access_token") != merged.get("access_token"):
+            # Verification results belong to the token they were made for
+            merged.pop("verified_until", None)
+            merged.pop("rejected_token", None)
+        self._sessions[slack_user_id] = merged
+        self._loaded_at[slack_user_id] = time.monotonic()
+        self._misses.pop(slack_user_id, None)
+        metrics.gauge("sessions.indexed", len(self._sessions))
+        return merged
+
+    def _mark(self, session: Dict[str, Any], **values: Any) -> None:
+        """Record verification results on an indexed session, unless it was replaced meanwhile"""
+        with self._lock:
+            if self._sessions.get(session["slack_user_id"]) is session:
+                session.update(values)
+
+    def _load(self, slack_user_id: str) -> Optional[Dict[str, Any]]:
+        metrics.incr("sessions.db_lookups")
+        rows = self.client.table("slack_sessions").select("*").eq("slack_user_id", slack_user_id).execute().data
+        with self._lock:
+            if rows:
+                return self._remember(rows[0])
+            self._sessions.pop(slack_user_id, None)
+            self._loaded_at.pop(slack_user_id, None)
+            self._misses[slack_user_id] = time.monotonic()
+            metrics.gauge("sessions.indexed", len(self._sessions))
+        return None
+
+    def get(self, slack_user_id: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(slack_user_id)
+            loaded_at = self._loaded_at.get(slack_user_id, 0.0)
+            missed_at = self._misses.get(slack_user_id)
+        if session is not None and now - loaded_at < self.ttl_seconds:
+            metrics.incr("sessions.index_hits")
+            return session
+        if session is None and missed_at is not None and now - missed_at < self.miss_ttl_seconds:
+            metrics.incr("sessions.index_hits")
+            return None
+        return self._load(slack_user_id)
+
+    def put(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a session in the table and the index"""
+        self.client.table("slack_sessions").upsert(row).execute()
+        with self._lock:
+            return self._remember(row)
+
+    def _needs_refresh(self, session: Dict[str, Any]) -> bool:
+        if self.refresh_margin_seconds <= 0 or not session.get("refresh_token") or not session.get("expires_at"):
+            return False
+        now = time.time()
+        # Another process holds the claim: its new tokens arrive with a later read
+        if int(session.get("refresh_claimed_until") or 0) > now:
+            return False
+        return int(session["expires_at"]) < now + self.refresh_margin_seconds
+
+    def refresh(self, session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Exchange the session's refresh_token for new tokens, if this process
+        wins the claim on it; returns the session as it now stands, or None
+        if it is gone."""
+        slack_user_id, refresh_token = session["slack_user_id"], session["refresh_token"]
+        now = int(time.time())
+        claimed = (
+            self.client.table("slack_sessions")
+            .update({"refresh_claimed_until": now + self.claim_seconds})
+            .eq("slack_user_id", slack_user_id)
+            .eq("refresh_token", refresh_token)
+            .lt("refresh_claimed_until", now)
+            .execute()
+            .data
+        )
+        if not claimed:
+            # Refreshed (or being refreshed) elsewhere: pick up the row as it is now
+            metrics.incr("sessions.refresh_claims_lost")
+            return self._load(slack_user_id)
+        supabase_url = os.getenv("SUPABASE_URL", "").rstrip("/")
+        try:
+            resp = requests.post(
+                f"{supabase_url}/auth/v1/token?grant_type=refresh_token",
+                headers={"apikey": os.environ.get("SUPABASE_KEY") or "", "Content-Type": "application/json"},
+                json={"refresh_token": refresh_token},
+                timeout=10
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except requests.HTTPError as e:
+            print(f"Error refreshing session for {slack_user_id}: {e}")
+            metrics.incr("sessions.refresh_errors")
+            if e.response is not None and e.response.status_code in (400, 401):
+                # Revoked: stop retrying, the user has to log in again
+                self.client.table("slack_sessions").update({"refresh_token": None}).eq(
+                    "slack_user_id", slack_user_id).eq("refresh_token", refresh_token).execute()
+                return self._load(slack_user_id)
+            return session
+        except Exception as e:
+            print(f"Error refreshing session for {slack_user_id}: {e}")
+            metrics.incr("sessions.refresh_errors")
+            return session
+        metrics.incr("sessions.refreshed")
+        return self.put({
+            "slack_user_id": slack_user_id,
+            "access_token": data["access_token"],
+            "refresh_token": data.get("refresh_token", refresh_token),
+            "expires_at": int(data.get("expires_at") or time.time() + int(data.get("expires_in", 3600))),
+            "refresh_claimed_until": 0,
+        })
+
+    def is_authenticated(self, slack_user_id: str) -> bool:
+        session = self.get(slack_user_id)
+        if session is not None and self._needs_refresh(session):
+            session = self.refresh(session)
+        if session is None:
+            return False
+        now = time.time()
+        if session.get("verified_until", 0) > now:
+            return True
+        if session.get("access_token") and session.get("rejected_token") == session["access_token"]:
+            return False
+        claims = self.verifier.verify(session.get("access_token"))
+        if claims == UNVERIFIABLE:
+            expires_at = session.get("expires_at")
+            return not (expires_at and int(expires_at) < int(now))
+        if claims is not None and session.get("supabase_user_id") and claims.get("sub") != session["supabase_user_id"]:
+            metrics.incr("sessions.invalid_tokens")
+            claims = None
+        if claims is None:
+            # Don't re-verify (or re-log) the same bad token until it is replaced
+            self._mark(session, rejected_token=session.get("access_token"))
+            return False
+        self._mark(session, verified_until=claims.get("exp", 0))
+        return True
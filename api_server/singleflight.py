@@ -0,0 +1,67 @@
+"""
+Request coalescing ("single flight") for identical concurrent reads.
+
+The first caller for a key runs the query; callers arriving with the same key
+while it is in flight wait for that result instead of issuing their own. Once
+the call finishes the key is forgotten, so this is not a cache: a caller
+arriving afterwards runs the query again.
+
+Sync callers block on the shared future. Async callers await it, and an
+async leader runs the query in the default executor so the event loop keeps
+serving other requests meanwhile. Both kinds can share one flight.
+
+Results (or exceptions) are shared between callers, so they must be treated
+as read-only.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+from .metrics import metrics
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable, kind: str):
+        """(future, is_leader) for `key`"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                leader = True
+            else:
+                leader = False
+        metrics.incr(f"singleflight.{self.name}.{kind}.{'executed' if leader else 'coalesced'}")
+        return future, leader
+
+    def _run(self, key: Hashable, future: Future, fn: Callable[..., Any], args, kwargs) -> None:
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key: Hashable, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        future, leader = self._join((kind, key), kind)
+        if leader:
+            self._run((kind, key), future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key: Hashable, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        future, leader = self._join((kind, key), kind)
+        if leader:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._run, (kind, key), future, fn, args, kwargs)
+        return await asyncio.wrap_future(future)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,29 @@
+"""
+Storage backends for DatabaseClient.
+
+`SupabaseBackend` talks to PostgREST (the default); `SQLBackend` runs SQL
+directly against SQLite or Postgres. `create_backend` picks one from the
+environment: set DATABASE_URL to use the SQL backend, and INVOICE_REPLICA=1
+to serve invoice reads from an in-process `ReplicaBackend` in front of it.
+"""
+
+import os
+from typing import Optional
+from .base import EVENT_COLUMNS, INVOICE_COLUMNS, Predicate, StorageBackend
+from .supabase_backend import SupabaseBackend
+
+
+def create_backend(database_url: Optional[str] = None) -> StorageBackend:
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if database_url:
+        from .sql_backend import SQLBackend
+        backend: StorageBackend = SQLBackend(database_url, pool_size=int(os.getenv("DATABASE_POOL_SIZE", 5)))
+    else:
+        backend = SupabaseBackend()
+    if os.getenv("INVOICE_REPLICA", "").lower() in ("1", "true", "yes"):
+        from .replica import ReplicaBackend
+        backend = ReplicaBackend(backend)
+    return backend
+
+
+__all__ = ["EVENT_COLUMNS", "INVOICE_COLUMNS", "Predicate", "StorageBackend", "SupabaseBackend", "create_backend"]
@@ -0,0 +1,72 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+# Columns of the invoices table; SQL backends only interpolate names from here
+INVOICE_COLUMNS = (
+    "id", "invoice_id", "customer_name", "amount", "currency", "status",
+    "company_id", "type", "issue_date", "due_date", "line_items", "notes",
+    "created_by_user_id", "last_updated",
+)
+
+# Columns of the app_events table (migrations/007_app_events.sql) the event recorders write
+EVENT_COLUMNS = ("event_id", "kind", "occurred_at", "slack_user_id", "subject", "payload", "source")
+
+# Operators understood by every backend (PostgREST naming)
+OPERATORS = ("eq", "neq", "lt", "lte", "gt", "gte", "ilike", "in")
+
+
+class Predicate(NamedTuple):
+    """A single `column <op> value` filter on the invoices table"""
+    column: str
+    op: str
+    value: Any
+
+
+class StorageBackend(ABC):
+    """Where DatabaseClient reads and writes invoice rows.
+
+    Backends return rows as plain dicts shaped like Supabase's REST output:
+    dates and timestamps as ISO strings, line_items as a list or JSON string.
+    """
+
+    name: str = "base"
+    # True when `customer_name ILIKE '%q%'` is index-backed (pg_trgm, see
+    # migrations/002_customer_search.sql), so partial names can be filtered
+    # on directly instead of being resolved to exact names first
+    indexed_customer_ilike: bool = False
+
+    @abstractmethod
+    def select_invoices(self,
+                        predicates: Sequence[Predicate] = (),
+                        order_by: Optional[str] = None,
+                        desc: bool = False,
+                        limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return rows matching all predicates"""
+
+    @abstractmethod
+    def update_invoices(self, values: Dict[str, Any], predicates: Sequence[Predicate]) -> List[Dict[str, Any]]:
+        """Apply `values` to matching rows and return the updated rows"""
+
+    @abstractmethod
+    def insert_invoices(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert rows and return them as stored (with their ids).
+
+        Rows whose invoice_id is already stored are skipped and left out of
+        the result.
+        """
+
+    @abstractmethod
+    def search_customers(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Distinct customer names fuzzily matching `query`, best first,
+        as `{"customer_name": ..., "score": ...}` dicts"""
+
+    @abstractmethod
+    def select_fx_rates(self) -> List[Dict[str, Any]]:
+        """Rows of the fx_rates table as `{"currency": ..., "rate": ...}` dicts"""
+
+    @abstractmethod
+    def insert_events(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Insert app_events rows, skipping event_ids already stored; returns rows sent"""
+
+    def close(self) -> None:
+        """Release pooled connections, if any"""
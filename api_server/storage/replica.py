@@ -0,0 +1,522 @@
+"""
+In-process replica of the invoices table, kept fresh by polling for changes.
+
+`ReplicaBackend` wraps another backend. It loads the whole table at startup
+in id-ordered pages, then polls the change feed in changes.py (new ids, and
+rows with `last_updated` at or after its watermark minus
+REPLICA_POLL_OVERLAP_SECONDS) and applies them in place. Rows this process
+inserts or updates are applied from what the write returns, without a poll.
+
+Reads are answered from memory while the last successful poll is at most
+REPLICA_MAX_STALENESS_SECONDS old; before the first load, when polling
+fails for longer than that, or for a filter the replica can't evaluate,
+they go to the wrapped backend. Customer search and FX rates always do.
+
+`ReplicaTable` stores rows column-wise in slots: numbers, dates and
+timestamps in `array`s, repetitive strings (status, customer, currency,
+type, ...) as codes into a per-column dictionary, so a row costs a few
+dozen bytes plus its invoice_id, notes and line_items text. Sorted slot
+lists index status, customer, creator and due date; invoice_id has a
+lookup dict. Id lookups and id ranges (keyset pages) are bisected on the id
+column while slots are in id order; once a row arrives out of order (a
+writer's transaction committing late), a sorted id -> slot index takes over.
+
+Deletes are not seen by the polling feed; rows deleted elsewhere stay until
+the process restarts. migrations/006_invoices_last_updated.sql makes every
+UPDATE bump last_updated so writes from other clients are picked up too.
+
+Settings:
+    INVOICE_REPLICA                 set to 1 to serve invoice reads from the replica
+    REPLICA_POLL_SECONDS            seconds between change polls (default 2)
+    REPLICA_MAX_STALENESS_SECONDS   oldest sync reads may be served from (default 10)
+    REPLICA_POLL_OVERLAP_SECONDS    how far behind the watermark polls start (default 5)
+    REPLICA_PAGE_SIZE               rows per page when loading and polling (default 1000)
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from heapq import nlargest, nsmallest
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from ..fx import to_minor
+from ..metrics import metrics
+from .base import Predicate, StorageBackend
+from .changes import changed_rows, from_micros, new_rows, now_micros, poll_start, to_micros
+
+def _ordinal(value: Any) -> int:
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _iso_date(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
+
+
+def _json_text(value: Any) -> str:
+    if value is None:
+        return "[]"
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+# column: (array typecode, stored from row value, row value from stored)
+NUMERIC_COLUMNS = {
+    "id": ("q", int, int),
+    "amount": ("q", to_minor, lambda minor: minor / 100),
+    "issue_date": ("i", _ordinal, _iso_date),
+    "due_date": ("i", _ordinal, _iso_date),
+    "last_updated": ("q", to_micros, from_micros),
+}
+CODED_COLUMNS = ("customer_name", "currency", "status", "company_id", "type", "created_by_user_id")
+TEXT_COLUMNS = ("invoice_id", "notes")
+INDEXED_COLUMNS = ("customer_name", "status", "created_by_user_id")
+
+_COMPARE = {
+    "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+}
+
+
+def _value_test(op: str, value: Any, convert: Callable[[Any], Any] = str) -> Callable[[Any], bool]:
+    """`stored -> bool` for one predicate; None (NULL) never matches"""
+    if op == "in":
+        wanted = {convert(v) for v in value}
+        return lambda v: v is not None and v in wanted
+    if op == "ilike":
+        regex = "".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in str(value))
+        pattern = re.compile(f"^{regex}$", re.IGNORECASE | re.DOTALL)
+        return lambda v: v is not None and pattern.match(v) is not None
+    compare, target = _COMPARE[op], convert(value)
+    return lambda v: v is not None and compare(v, target)
+
+
+class _Dictionary:
+    """Distinct values of one column; code 0 is NULL"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _Postings:
+    """key -> sorted array of slots"""
+
+    def __init__(self):
+        self.slots: Dict[int, array] = {}
+
+    def add(self, key: int, slot: int) -> None:
+        slots = self.slots.get(key)
+        if slots is None:
+            self.slots[key] = array("I", [slot])
+        elif not slots or slots[-1] < slot:
+            slots.append(slot)
+        else:
+            slots.insert(bisect_left(slots, slot), slot)
+
+    def remove(self, key: int, slot: int) -> None:
+        slots = self.slots[key]
+        del slots[bisect_left(slots, slot)]
+
+    def size(self, keys: Iterable[int]) -> int:
+        return sum(len(self.slots.get(k, ())) for k in keys)
+
+    def lookup(self, keys: Iterable[int]) -> Iterable[int]:
+        found = [self.slots[k] for k in keys if self.slots.get(k)]
+        if len(found) == 1:
+            return found[0]
+        return sorted(slot for slots in found for slot in slots)
+
+
+class ReplicaTable:
+    """Invoice rows in compact column storage, with secondary indexes"""
+
+    def __init__(self):
+        self.numbers = {name: array(code) for name, (code, _, _) in NUMERIC_COLUMNS.items()}
+        self.codes = {name: array("I") for name in CODED_COLUMNS}
+        self.dictionaries = {name: _Dictionary() for name in CODED_COLUMNS}
+        self.text: Dict[str, List[Optional[str]]] = {name: [] for name in TEXT_COLUMNS}
+        self.line_items: List[str] = []
+        self.indexes = {name: _Postings() for name in INDEXED_COLUMNS}
+        self.due_index = _Postings()
+        self._due_keys: List[int] = []
+        # invoice_id -> slot, or a tuple of slots if the id is not unique
+        self.by_invoice_id: Dict[str, Any] = {}
+        # Slots are appended in id order during the load, so ids can be bisected;
+        # after an out-of-order insert, ids in sorted order and their slots
+        self.ids_sorted = True
+        self._sorted_ids: Optional[array] = None
+        self._id_slots: Optional[array] = None
+        self.max_id = 0
+        self.watermark = 0
+
+    def __len__(self) -> int:
+        return len(self.numbers["id"])
+
+    def _slot_of(self, row_id: int) -> Optional[int]:
+        ids = self.numbers["id"] if self.ids_sorted else self._sorted_ids
+        i = bisect_left(ids, row_id)
+        if i == len(ids) or ids[i] != row_id:
+            return None
+        return i if self.ids_sorted else self._id_slots[i]
+
+    def _index_id(self, row_id: int, slot: int) -> None:
+        if self.ids_sorted:
+            if row_id > self.max_id:
+                return
+            # First id out of order: slots so far are in id order
+            self._sorted_ids = array("q", self.numbers["id"])
+            self._id_slots = array("I", range(len(self)))
+            self.ids_sorted = False
+        i = bisect_left(self._sorted_ids, row_id)
+        self._sorted_ids.insert(i, row_id)
+        self._id_slots.insert(i, slot)
+
+    def _slots_from_id(self, op: str, value: Any) -> Sequence[int]:
+        """Slots with id > (or >=) `value`, in id order"""
+        find = bisect_right if op == "gt" else bisect_left
+        if self.ids_sorted:
+            return range(find(self.numbers["id"], int(value)), len(self))
+        return self._id_slots[find(self._sorted_ids, int(value)):]
+
+    def _slots_in_id_order(self) -> Sequence[int]:
+        return range(len(self)) if self.ids_sorted else self._id_slots
+
+    def _link_invoice_id(self, invoice_id: str, slot: int) -> None:
+        current = self.by_invoice_id.get(invoice_id)
+        if current is None:
+            self.by_invoice_id[invoice_id] = slot
+        else:
+            self.by_invoice_id[invoice_id] = (current if isinstance(current, tuple) else (current,)) + (slot,)
+
+    def _unlink_invoice_id(self, invoice_id: str, slot: int) -> None:
+        current = self.by_invoice_id.get(invoice_id)
+        if isinstance(current, tuple):
+            rest = tuple(s for s in current if s != slot)
+            self.by_invoice_id[invoice_id] = rest[0] if len(rest) == 1 else rest
+        elif current == slot:
+            del self.by_invoice_id[invoice_id]
+
+    def _add_due(self, ordinal: int, slot: int) -> None:
+        if ordinal not in self.due_index.slots:
+            self._due_keys.insert(bisect_left(self._due_keys, ordinal), ordinal)
+        self.due_index.add(ordinal, slot)
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """Insert `row` or overwrite the stored row with the same id"""
+        row_id = int(row["id"])
+        slot = self._slot_of(row_id)
+        if slot is None:
+            slot = len(self)
+            self._index_id(row_id, slot)
+            self.max_id = max(self.max_id, row_id)
+            for name, (_, encode, _) in NUMERIC_COLUMNS.items():
+                self.numbers[name].append(encode(row[name]))
+            for name in CODED_COLUMNS:
+                self.codes[name].append(self.dictionaries[name].encode(row.get(name)))
+            for name in TEXT_COLUMNS:
+                self.text[name].append(row.get(name))
+            self.line_items.append(_json_text(row.get("line_items")))
+        else:
+            for name in INDEXED_COLUMNS:
+                self.indexes[name].remove(self.codes[name][slot], slot)
+            self.due_index.remove(self.numbers["due_date"][slot], slot)
+            self._unlink_invoice_id(self.text["invoice_id"][slot], slot)
+            for name, (_, encode, _) in NUMERIC_COLUMNS.items():
+                self.numbers[name][slot] = encode(row[name])
+            for name in CODED_COLUMNS:
+                self.codes[name][slot] = self.dictionaries[name].encode(row.get(name))
+            for name in TEXT_COLUMNS:
+                self.text[name][slot] = row.get(name)
+            self.line_items[slot] = _json_text(row.get("line_items"))
+        for name in INDEXED_COLUMNS:
+            self.indexes[name].add(self.codes[name][slot], slot)
+        self._add_due(self.numbers["due_date"][slot], slot)
+        self._link_invoice_id(row["invoice_id"], slot)
+        self.watermark = max(self.watermark, self.numbers["last_updated"][slot])
+
+    def row(self, slot: int) -> Dict[str, Any]:
+        row: Dict[str, Any] = {name: decode(self.numbers[name][slot]) for name, (_, _, decode) in NUMERIC_COLUMNS.items()}
+        for name in CODED_COLUMNS:
+            row[name] = self.dictionaries[name].values[self.codes[name][slot]]
+        for name in TEXT_COLUMNS:
+            row[name] = self.text[name][slot]
+        row["line_items"] = self.line_items[slot]
+        return row
+
+    # --- queries ---
+
+    def _plan(self, predicate: Predicate):
+        """(slot test, candidate slots or None, candidate count) for one predicate,
+        or None if the replica can't evaluate it"""
+        column, op, value = predicate
+        if op not in _COMPARE and op not in ("in", "ilike"):
+            return None
+        if column in CODED_COLUMNS:
+            test = _value_test(op, value)
+            matching = {c for c, v in enumerate(self.dictionaries[column].values) if test(v)}
+            codes = self.codes[column]
+            if column in self.indexes:
+                index = self.indexes[column]
+                return (lambda s: codes[s] in matching), (lambda: index.lookup(matching)), index.size(matching)
+            return (lambda s: codes[s] in matching), None, len(self)
+        if column in NUMERIC_COLUMNS:
+            if op == "ilike":
+                return None
+            stored = self.numbers[column]
+            test = _value_test(op, value, NUMERIC_COLUMNS[column][1])
+            if column == "due_date" and op != "neq":
+                keys = self._candidate_keys(op, value)
+                return (lambda s: test(stored[s])), (lambda: self.due_index.lookup(keys)), self.due_index.size(keys)
+            if column == "id" and op in ("gt", "gte"):
+                slots = self._slots_from_id(op, value)
+                return (lambda s: test(stored[s])), (lambda: slots), len(slots)
+            return (lambda s: test(stored[s])), None, len(self)
+        if column in TEXT_COLUMNS:
+            stored = self.text[column]
+            test = _value_test(op, value)
+            if column == "invoice_id" and op in ("eq", "in"):
+                slots = sorted(self._invoice_slots(value if op == "in" else [value]))
+                return (lambda s: test(stored[s])), (lambda: slots), len(slots)
+            return (lambda s: test(stored[s])), None, len(self)
+        return None
+
+    def _candidate_keys(self, op: str, value: Any) -> List[int]:
+        """Due-date index keys that can satisfy `due_date <op> value`"""
+        keys = self._due_keys
+        if op == "in":
+            wanted = {_ordinal(v) for v in value}
+            return [k for k in wanted if k in self.due_index.slots]
+        target = _ordinal(value)
+        if op == "eq":
+            return [target] if target in self.due_index.slots else []
+        if op == "lt":
+            return keys[:bisect_left(keys, target)]
+        if op == "lte":
+            return keys[:bisect_right(keys, target)]
+        if op == "gt":
+            return keys[bisect_right(keys, target):]
+        return keys[bisect_left(keys, target):]
+
+    def _invoice_slots(self, invoice_ids: Iterable[str]) -> List[int]:
+        slots = []
+        for invoice_id in set(map(str, invoice_ids)):
+            found = self.by_invoice_id.get(invoice_id)
+            if isinstance(found, tuple):
+                slots.extend(found)
+            elif found is not None:
+                slots.append(found)
+        return slots
+
+    def _sort_key(self, column: str):
+        if column in NUMERIC_COLUMNS:
+            return self.numbers[column].__getitem__
+        if column in CODED_COLUMNS:
+            codes, values = self.codes[column], self.dictionaries[column].values
+            return lambda s: (values[codes[s]] is None, values[codes[s]] or "")
+        if column in TEXT_COLUMNS:
+            text = self.text[column]
+            return lambda s: (text[s] is None, text[s] or "")
+        return None
+
+    def select(self,
+               predicates: Sequence[Predicate] = (),
+               order_by: Optional[str] = None,
+               desc: bool = False,
+               limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Matching rows, or None if a filter or the sort column isn't supported"""
+        plans = []
+        id_range = None
+        for predicate in predicates:
+            plan = self._plan(predicate)
+            if plan is None:
+                return None
+            plans.append(plan)
+            if predicate.column == "id" and predicate.op in ("gt", "gte"):
+                id_range = plan
+        key = self._sort_key(order_by) if order_by else None
+        if order_by and key is None:
+            return None
+        # Drive the scan from the most selective indexed filter and test the rest per slot
+        indexed = [p for p in plans if p[1] is not None]
+        due_ranges = [p for p in predicates if p.column == "due_date" and p.op in ("lt", "lte", "gt", "gte")]
+        if len(due_ranges) > 1:
+            # Both ends of a date range: look up only the dates between them
+            keys = set.intersection(*(set(self._candidate_keys(p.op, p.value)) for p in due_ranges))
+            indexed.append((None, lambda: self.due_index.lookup(keys), self.due_index.size(keys)))
+        if indexed:
+            driver = min(indexed, key=lambda p: p[2])
+            candidates = driver[1]()
+            tests = [p[0] for p in plans if p is not driver]
+            # Index lookups come in slot order, which is id order while ids are sorted
+            in_id_order = order_by == "id" and (self.ids_sorted or driver is id_range)
+        else:
+            candidates = self._slots_in_id_order()
+            tests = [p[0] for p in plans]
+            in_id_order = order_by == "id"
+        matched = (s for s in candidates if all(test(s) for test in tests)) if tests else iter(candidates)
+        if in_id_order and not desc:
+            slots = list(islice(matched, limit) if limit else matched)
+        elif in_id_order:
+            slots = list(matched)[::-1][:limit]
+        elif key is None:
+            slots = list(islice(matched, limit) if limit else matched)
+        elif limit:
+            slots = (nlargest if desc else nsmallest)(limit, matched, key=key)
+        else:
+            slots = sorted(matched, key=key, reverse=desc)
+        return [self.row(s) for s in slots]
+
+
+class ReplicaBackend(StorageBackend):
+    """Serves invoice reads from a ReplicaTable, writes through to `source`"""
+
+    name = "replica"
+
+    def __init__(self,
+                 source: StorageBackend,
+                 poll_seconds: Optional[float] = None,
+                 max_staleness_seconds: Optional[float] = None,
+                 overlap_seconds: Optional[float] = None,
+                 page_size: Optional[int] = None):
+        self.source = source
+        self.poll_seconds = float(poll_seconds if poll_seconds is not None else os.getenv("REPLICA_POLL_SECONDS", 2))
+        self.max_staleness_seconds = float(
+            max_staleness_seconds if max_staleness_seconds is not None
+            else os.getenv("REPLICA_MAX_STALENESS_SECONDS", 10)
+        )
+        self.overlap_seconds = float(
+            overlap_seconds if overlap_seconds is not None else os.getenv("REPLICA_POLL_OVERLAP_SECONDS", 5)
+        )
+        self.page_size = int(page_size or os.getenv("REPLICA_PAGE_SIZE", 1000))
+        self.table = ReplicaTable()
+        # monotonic time the last successful load or poll started; None until loaded
+        self.synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def indexed_customer_ilike(self) -> bool:
+        return self.source.indexed_customer_ilike
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness_seconds
+
+    def _apply(self, rows: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        with self._lock:
+            for row in rows:
+                if row.get("id") is not None:
+                    self.table.upsert(row)
+                    count += 1
+        return count
+
+    def load(self) -> int:
+        """Copy the whole table"""
+        started, started_at = time.monotonic(), now_micros()
+        with metrics.timer("replica.load"):
+            total = sum(self._apply(page) for page in new_rows(self.source, 0, self.page_size))
+        with self._lock:
+            # Rows updated behind the copy's id cursor are re-read by the first poll
+            self.table.watermark = min(self.table.watermark, started_at)
+        self.synced_at = started
+        metrics.gauge("replica.rows", len(self.table))
+        return total
+
+    def poll(self) -> int:
+        """Apply rows changed since the watermark; returns how many were applied"""
+        started = time.monotonic()
+        since = poll_start(self.table.watermark, self.overlap_seconds)
+        # New rows by id: inserts may carry a last_updated older than the watermark
+        applied = sum(self._apply(page) for page in new_rows(self.source, self.table.max_id, self.page_size))
+        applied += sum(self._apply(page) for page in changed_rows(self.source, since, self.page_size))
+        self.synced_at = started
+        metrics.incr("replica.changes_applied", applied)
+        metrics.gauge("replica.rows", len(self.table))
+        return applied
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.synced_at is None:
+                    self.load()
+                else:
+                    self.poll()
+            except Exception as e:
+                print(f"Error syncing invoice replica: {e}")
+                metrics.incr("replica.sync_errors")
+            if self.synced_at is not None:
+                metrics.gauge("replica.lag_seconds", round(time.monotonic() - self.synced_at, 3))
+            self._stop.wait(self.poll_seconds)
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return False
+        self._thread = threading.Thread(target=self._loop, name="invoice-replica", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # --- StorageBackend ---
+
+    def select_invoices(self,
+                        predicates: Sequence[Predicate] = (),
+                        order_by: Optional[str] = None,
+                        desc: bool = False,
+                        limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if self.is_fresh:
+            with self._lock:
+                rows = self.table.select(predicates, order_by, desc, limit)
+            if rows is not None:
+                metrics.incr("replica.reads")
+                return rows
+            metrics.incr("replica.unsupported_reads")
+        else:
+            metrics.incr("replica.stale_reads")
+        return self.source.select_invoices(predicates, order_by, desc, limit)
+
+    def update_invoices(self, values: Dict[str, Any], predicates: Sequence[Predicate]) -> List[Dict[str, Any]]:
+        rows = self.source.update_invoices(values, predicates)
+        self._apply(rows)
+        return rows
+
+    def insert_invoices(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        stored = self.source.insert_invoices(rows)
+        # Before the first load the copy will pick these up anyway
+        if self.synced_at is not None:
+            self._apply(stored)
+        return stored
+
+    def insert_events(self, rows: Sequence[Dict[str, Any]]) -> int:
+        return self.source.insert_events(rows)
+
+    def search_customers(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.source.search_customers(query, limit)
+
+    def select_fx_rates(self) -> List[Dict[str, Any]]:
+        return self.source.select_fx_rates()
+
+    def close(self) -> None:
+        self.stop()
+        self.source.close()
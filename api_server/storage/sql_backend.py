@@ -0,0 +1,326 @@
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..customer_index import CustomerIndex
+from .base import EVENT_COLUMNS, INVOICE_COLUMNS, OPERATORS, Predicate, StorageBackend
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "migrations"
+)
+
+# SQLite mirror of migrations/001_invoices.sql (plus the app_events table of 007
+# and the unique invoice_id of 008)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    amount NUMERIC NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD',
+    status TEXT NOT NULL DEFAULT 'Draft',
+    company_id TEXT,
+    type TEXT NOT NULL DEFAULT 'RECEIVABLE',
+    issue_date TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    line_items TEXT NOT NULL DEFAULT '[]',
+    notes TEXT,
+    created_by_user_id TEXT,
+    last_updated TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+CREATE UNIQUE INDEX IF NOT EXISTS invoices_invoice_id_key ON invoices (invoice_id);
+DROP INDEX IF EXISTS invoices_invoice_id_idx;
+CREATE INDEX IF NOT EXISTS invoices_status_idx ON invoices (status);
+CREATE INDEX IF NOT EXISTS invoices_due_date_idx ON invoices (due_date);
+CREATE INDEX IF NOT EXISTS invoices_customer_name_idx ON invoices (customer_name);
+CREATE INDEX IF NOT EXISTS invoices_created_by_user_id_idx ON invoices (created_by_user_id);
+CREATE INDEX IF NOT EXISTS invoices_last_updated_idx ON invoices (last_updated DESC);
+CREATE INDEX IF NOT EXISTS invoices_sent_due_date_idx ON invoices (due_date) WHERE status = 'Sent';
+CREATE TABLE IF NOT EXISTS app_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    occurred_at TEXT NOT NULL,
+    slack_user_id TEXT,
+    subject TEXT,
+    payload TEXT NOT NULL DEFAULT '{}',
+    source TEXT NOT NULL DEFAULT 'api',
+    recorded_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+CREATE INDEX IF NOT EXISTS app_events_kind_occurred_at_idx ON app_events (kind, occurred_at DESC);
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency TEXT PRIMARY KEY,
+    rate TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+"""
+
+_COMPARISONS = {"eq": "=", "neq": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+# Bound parameters per statement; under SQLite's (32766) and Postgres' (65535) limits
+MAX_PARAMS = 32000
+
+
+class _SQLitePool:
+    """Fixed-size pool of SQLite connections.
+
+    Each connection keeps its own compiled-statement cache, and the backend
+    always generates the same SQL text for the same filter shape, so repeated
+    queries skip the parse/plan step.
+    """
+
+    def __init__(self, database: str, size: int):
+        uri = database.startswith("file:")
+        self._connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(database, uri=uri, check_same_thread=False, cached_statements=512)
+            conn.row_factory = sqlite3.Row
+            if not uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._connections.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connections.get()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._connections.put(conn)
+
+    def close(self) -> None:
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class SQLBackend(StorageBackend):
+    """Direct SQL access to the invoices table.
+
+    `dsn` is either `sqlite:///path/to/file.db` (`sqlite://:memory:` for a
+    throwaway database) or a `postgresql://` URL. Postgres support needs
+    `psycopg` and `psycopg_pool`; statements are server-side prepared on
+    first use. A SQLite schema is created on construction; a Postgres one
+    is brought up to date with `python -m api_server.migrate`.
+    """
+
+    def __init__(self, dsn: str, pool_size: int = 5, create_schema: bool = True):
+        if dsn.startswith("sqlite:"):
+            self.name = "sqlite"
+            self._param = "?"
+            self._pool = _SQLitePool(self._sqlite_database(dsn), pool_size)
+        elif dsn.startswith(("postgres://", "postgresql://")):
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+            self.name = "postgres"
+            self._param = "%s"
+            self._pool = ConnectionPool(
+                dsn, min_size=1, max_size=pool_size,
+                kwargs={"row_factory": dict_row, "prepare_threshold": 0}
+            )
+        else:
+            raise ValueError(f"Unsupported database URL: {dsn}")
+        # SQLite has no pg_trgm; customer search uses an in-process index
+        # built on first use and kept current by our own writes.
+        self.indexed_customer_ilike = self.name == "postgres"
+        self._customer_index: Optional[CustomerIndex] = None
+        self._customer_index_lock = threading.Lock()
+        if create_schema:
+            self.ensure_schema()
+
+    def _sqlite_database(self, dsn: str) -> str:
+        # sqlite:///relative.db, sqlite:////absolute.db, sqlite://:memory:
+        path = dsn[len("sqlite://"):]
+        if path.startswith("/"):
+            path = path[1:]
+        if path in ("", ":memory:"):
+            # Shared-cache memory database so every pooled connection sees the same data
+            return f"file:invoices-{id(self)}?mode=memory&cache=shared"
+        return path
+
+    def ensure_schema(self) -> None:
+        """Create the SQLite schema. Postgres is only changed by `migrate()`:
+        the migrations need owner rights and lock the invoices table, so
+        they are not run every time a backend is constructed."""
+        if self.name == "sqlite":
+            with self._pool.connection() as conn:
+                conn.executescript(SQLITE_SCHEMA)
+
+    def migrate(self) -> List[str]:
+        """Apply migrations/*.sql files not yet recorded in schema_migrations.
+
+        Each file runs in its own transaction under an advisory lock, so
+        concurrent runs (e.g. several pods starting a migrate job) apply it
+        once. Returns the names of the files applied.
+        """
+        if self.name == "sqlite":
+            self.ensure_schema()
+            return []
+        applied = []
+        with self._pool.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "name TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            )
+            conn.commit()
+            for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+                name = os.path.basename(path)
+                with conn.transaction():
+                    conn.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+                    if conn.execute("SELECT 1 FROM schema_migrations WHERE name = %s", [name]).fetchone():
+                        continue
+                    with open(path) as f:
+                        conn.execute(f.read(), prepare=False)
+                    conn.execute("INSERT INTO schema_migrations (name) VALUES (%s)", [name])
+                applied.append(name)
+        return applied
+
+    # --- SQL generation ---
+
+    def _adapt(self, value: Any) -> Any:
+        if isinstance(value, (list, dict)):
+            if self.name == "sqlite":
+                return json.dumps(value)
+            from psycopg.types.json import Jsonb
+            return Jsonb(value)
+        if self.name == "sqlite" and isinstance(value, (date, datetime)):
+            return value.isoformat()
+        return value
+
+    def _where(self, predicates: Sequence[Predicate]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        p = self._param
+        for column, op, value in predicates:
+            if column not in INVOICE_COLUMNS or op not in OPERATORS:
+                raise ValueError(f"Unsupported filter: {column} {op}")
+            if op == "in":
+                values = [self._adapt(v) for v in value]
+                if self.name == "postgres":
+                    clauses.append(f"{column} = ANY({p})")
+                    params.append(values)
+                elif values:
+                    clauses.append(f"{column} IN ({', '.join([p] * len(values))})")
+                    params.extend(values)
+                else:
+                    clauses.append("0 = 1")
+            elif op == "ilike":
+                # SQLite's LIKE is already case-insensitive for ASCII
+                clauses.append(f"{column} {'ILIKE' if self.name == 'postgres' else 'LIKE'} {p}")
+                params.append(value)
+            else:
+                clauses.append(f"{column} {_COMPARISONS[op]} {p}")
+                params.append(self._adapt(value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _row(self, row) -> Dict[str, Any]:
+        data = dict(row)
+        if self.name == "sqlite":
+            # SQLite hands dates back as the ISO text they were stored as
+            return data
+        for key, value in data.items():
+            if isinstance(value, (date, datetime)):
+                data[key] = value.isoformat()
+        return data
+
+    # --- StorageBackend ---
+
+    def select_invoices(self,
+                        predicates: Sequence[Predicate] = (),
+                        order_by: Optional[str] = None,
+                        desc: bool = False,
+                        limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        where, params = self._where(predicates)
+        sql = f"SELECT * FROM invoices{where}"
+        if order_by:
+            if order_by not in INVOICE_COLUMNS:
+                raise ValueError(f"Unsupported sort column: {order_by}")
+            sql += f" ORDER BY {order_by} {'DESC' if desc else 'ASC'}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._pool.connection() as conn:
+            return [self._row(r) for r in conn.execute(sql, params).fetchall()]
+
+    def update_invoices(self, values: Dict[str, Any], predicates: Sequence[Predicate]) -> List[Dict[str, Any]]:
+        values = dict(values)
+        values.setdefault("last_updated", datetime.now(timezone.utc))
+        columns = [c for c in values if c in INVOICE_COLUMNS]
+        assignments = ", ".join(f"{c} = {self._param}" for c in columns)
+        where, params = self._where(predicates)
+        sql = f"UPDATE invoices SET {assignments}{where} RETURNING *"
+        with self._pool.connection() as conn:
+            rows = [self._row(r) for r in conn.execute(sql, [self._adapt(values[c]) for c in columns] + params).fetchall()]
+        if "customer_name" in values:
+            self._index_customers(rows)
+        return rows
+
+    def insert_invoices(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        columns = [c for c in INVOICE_COLUMNS if c in rows[0]]
+        values = f"({', '.join([self._param] * len(columns))})"
+        step = max(1, MAX_PARAMS // len(columns))
+        stored = []
+        # Multi-row INSERT ... RETURNING, so callers get ids and defaults without
+        # reading back; rows whose invoice_id exists are skipped and not returned
+        with self._pool.connection() as conn:
+            for start in range(0, len(rows), step):
+                chunk = rows[start:start + step]
+                sql = (f"INSERT INTO invoices ({', '.join(columns)}) "
+                       f"VALUES {', '.join([values] * len(chunk))} "
+                       "ON CONFLICT (invoice_id) DO NOTHING RETURNING *")
+                params = [self._adapt(row.get(c)) for row in chunk for c in columns]
+                stored.extend(self._row(r) for r in conn.execute(sql, params).fetchall())
+        self._index_customers(stored)
+        return stored
+
+    def insert_events(self, rows: Sequence[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        placeholders = ", ".join([self._param] * len(EVENT_COLUMNS))
+        # Same syntax in SQLite and Postgres; replayed events are skipped
+        sql = (f"INSERT INTO app_events ({', '.join(EVENT_COLUMNS)}) VALUES ({placeholders}) "
+               "ON CONFLICT (event_id) DO NOTHING")
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(sql, [[self._adapt(row.get(c)) for c in EVENT_COLUMNS] for row in rows])
+        return len(rows)
+
+    def search_customers(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        if self.name == "postgres":
+            with self._pool.connection() as conn:
+                return [dict(r) for r in conn.execute(
+                    "SELECT customer_name, score FROM search_customers(%s, %s)", [query, limit]
+                ).fetchall()]
+        return [
+            {"customer_name": name, "score": score}
+            for name, score in self._customers().search(query, limit=limit)
+        ]
+
+    def select_fx_rates(self) -> List[Dict[str, Any]]:
+        with self._pool.connection() as conn:
+            return [dict(r) for r in conn.execute("SELECT currency, rate FROM fx_rates").fetchall()]
+
+    def _customers(self) -> CustomerIndex:
+        if self._customer_index is None:
+            with self._customer_index_lock:
+                if self._customer_index is None:
+                    with self._pool.connection() as conn:
+                        names = [r[0] for r in conn.execute("SELECT DISTINCT customer_name FROM invoices")]
+                    self._customer_index = CustomerIndex(names)
+        return self._customer_index
+
+    def _index_customers(self, rows: Sequence[Dict[str, Any]]) -> None:
+        if self._customer_index is not None:
+            for row in rows:
+                self._customer_index.add(row.get("customer_name"))
+
+    def close(self) -> None:
+        self._pool.close()
@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
+from .base import Predicate, StorageBackend
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+class SupabaseBackend(StorageBackend):
+    """Invoice storage through Supabase's PostgREST API"""
+
+    name = "supabase"
+    indexed_customer_ilike = True
+
+    def __init__(self, client: Optional["Client"] = None):
+        self._client = client
+
+    @property
+    def client(self) -> "Client":
+        if self._client is None:
+            from ..dependencies import get_supabase_client
+            self._client = get_supabase_client()
+        return self._client
+
+    def _apply(self, query, predicates: Sequence[Predicate]):
+        for column, op, value in predicates:
+            method = "in_" if op == "in" else op
+            query = getattr(query, method)(column, value)
+        return query
+
+    def select_invoices(self,
+                        predicates: Sequence[Predicate] = (),
+                        order_by: Optional[str] = None,
+                        desc: bool = False,
+                        limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = self._apply(self.client.table("invoices").select("*"), predicates)
+        if order_by:
+            query = query.order(order_by, desc=desc)
+        if limit:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def update_invoices(self, values: Dict[str, Any], predicates: Sequence[Predicate]) -> List[Dict[str, Any]]:
+        # Stamp the change so pollers (e.g. the invoice replica) see it
+        values = {"last_updated": datetime.now(timezone.utc).isoformat(), **values}
+        query = self._apply(self.client.table("invoices").update(values), predicates)
+        return query.execute().data
+
+    def insert_invoices(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        # ON CONFLICT (invoice_id) DO NOTHING; PostgREST returns only the rows inserted
+        return self.client.table("invoices").upsert(
+            list(rows), on_conflict="invoice_id", ignore_duplicates=True
+        ).execute().data
+
+    def insert_events(self, rows: Sequence[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        # A replayed batch may repeat events that already landed
+        self.client.table("app_events").upsert(list(rows), on_conflict="event_id", ignore_duplicates=True).execute()
+        return len(rows)
+
+    def search_customers(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        # Backed by the search_customers() function from migrations/002_customer_search.sql
+        result = self.client.rpc("search_customers", {"query": query, "max_results": limit}).execute()
+        return result.data
+
+    def select_fx_rates(self) -> List[Dict[str, Any]]:
+        return self.client.table("fx_rates").select("currency,rate").execute().data
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Invoice AI API server and Slack bot.
+
+Each module is a standalone script; run them from the repository root, e.g.
+``python -m benchmarks.bench_import_time``.
+"""
@@ -0,0 +1,86 @@
+"""
+Rows per second for bulk invoice import and export.
+
+Writes --rows synthetic invoices to a CSV and an NDJSON file, imports each
+into its own SQLite database through bulk.import_records (reading the file
+in 64 KiB chunks, as an upload arrives), then exports each database back
+out through DatabaseClient.iter_invoice_rows and bulk.encode_rows. Peak RSS
+is reported after every step to show memory stays bounded by the batch
+size rather than the row count.
+
+    python -m benchmarks.bench_bulk --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from api_server import bulk
+from api_server.database import DatabaseClient
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import synthetic_invoices
+
+CHUNK_BYTES = 64 * 1024
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def file_chunks(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-bulk-")
+    report = {"rows": args.rows, "batch_size": args.batch_size, "peak_rss_mb": {"start": peak_rss_mb()}}
+    # Single-flight and rollups are irrelevant here; keep the client plain
+    os.environ["DB_SINGLE_FLIGHT"] = "0"
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for fmt in ("csv", "ndjson"):
+            path = os.path.join(workdir, f"invoices.{fmt}")
+            start = time.perf_counter()
+            with open(path, "wb") as f:
+                for chunk in bulk.encode_rows(synthetic_invoices(args.rows), fmt):
+                    f.write(chunk)
+            report[f"{fmt}_file_mb"] = round(os.path.getsize(path) / 2**20, 1)
+            report[f"{fmt}_write_seconds"] = round(time.perf_counter() - start, 2)
+
+            db = DatabaseClient(backend=SQLBackend(f"sqlite:///{workdir}/{fmt}.db", pool_size=1))
+            result = bulk.import_records(db, bulk.read_records(file_chunks(path), fmt), args.batch_size)
+            report[f"import_{fmt}"] = {k: result[k] for k in ("imported", "duplicates", "rejected", "seconds", "rows_per_second")}
+            report["peak_rss_mb"][f"after_import_{fmt}"] = peak_rss_mb()
+
+            start = time.perf_counter()
+            exported, size = 0, 0
+            for chunk in bulk.encode_rows(db.iter_invoice_rows(page_size=bulk.EXPORT_PAGE_SIZE), fmt):
+                size += len(chunk)
+                exported += chunk.count(b"\n")
+            elapsed = time.perf_counter() - start
+            exported -= 1 if fmt == "csv" else 0
+            report[f"export_{fmt}"] = {"rows": exported, "mb": round(size / 2**20, 1), "seconds": round(elapsed, 2),
+                                       "rows_per_second": round(exported / elapsed, 1)}
+            report["peak_rss_mb"][f"after_export_{fmt}"] = peak_rss_mb()
+            db.backend.close()
+    finally:
+        sys.stdout = sys.__stdout__
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
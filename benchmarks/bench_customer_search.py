@@ -0,0 +1,88 @@
+"""
+Customer-name search: ILIKE '%...%' scan vs trigram-resolved IN lookup.
+
+Seeds a SQLite database with --rows invoices, then fetches every matching
+row (the shape of a summary query) with the old predicate
+(`customer_name ILIKE '%q%'`, a full scan) and with the new path (resolve the
+query through the trigram index, then `customer_name IN (...)` on the btree
+index) for exact, partial and misspelled queries.
+
+    python -m benchmarks.bench_customer_search --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from api_server.database import DatabaseClient
+from api_server.storage import Predicate
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import chunked, customer_names, synthetic_invoices
+
+
+def queries(customers):
+    """"acme" plus an exact, a partial and a misspelled query for real names"""
+    names = customer_names(customers)
+    word = names[len(names) // 3].split()[0]
+    other = names[2 * len(names) // 3]
+    return ["acme", other, word.lower(), word[:2] + word[3:]]
+
+
+def timed(fn, iterations):
+    samples = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLBackend(f"sqlite:///{os.path.join(tmp, 'customers.db')}")
+        for batch in chunked(synthetic_invoices(args.rows, customers=args.customers), 5000):
+            backend.insert_invoices(batch)
+        db = DatabaseClient(backend=backend)
+
+        start = time.perf_counter()
+        backend.search_customers("warmup")
+        report = {
+            "rows": args.rows,
+            "distinct_customers": args.customers,
+            "index_build_ms": round((time.perf_counter() - start) * 1000, 1),
+            "queries": {},
+        }
+
+        for query in queries(args.customers):
+            scan_ms, scan_rows = timed(
+                lambda: backend.select_invoices([Predicate("customer_name", "ilike", f"%{query}%")]),
+                args.iterations
+            )
+            resolve_ms, predicate = timed(lambda: db._customer_predicate(query), args.iterations)
+            lookup_ms, lookup_rows = timed(lambda: backend.select_invoices([predicate]), args.iterations)
+            matches = backend.search_customers(query, limit=3)
+            report["queries"][query] = {
+                "ilike_scan_ms": round(scan_ms, 2),
+                "ilike_rows": len(scan_rows),
+                "index_resolve_ms": round(resolve_ms, 2),
+                "index_lookup_ms": round(lookup_ms, 2),
+                "index_rows": len(lookup_rows),
+                "top_matches": [m["customer_name"] for m in matches],
+            }
+        backend.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
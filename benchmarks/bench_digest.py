@@ -0,0 +1,114 @@
+"""
+Digest run for --recipients users, end to end except the Slack network.
+
+1. Summaries: DatabaseClient.get_summaries_by_user (one pass over the table,
+   and again from rollups) vs one get_invoices_summary per user, the cost of
+   answering "what's due this month?" for each user separately (timed on a
+   sample and extrapolated).
+2. Render: local summary_blocks for every recipient.
+3. Fan-out: post every message to a fake Slack client with --latency-ms per
+   call, through the shared rate limiter at --rate messages/second.
+
+    python -m benchmarks.bench_digest --recipients 10000 --rows 200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import orjson
+
+from api_server.database import DatabaseClient
+from api_server.rollups import RollupIndex
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import chunked, synthetic_invoices
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slack_bot"))
+
+from digest import build_messages, fan_out  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+
+class FakeSlackClient:
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+        self.posted = 0
+
+    def chat_postMessage(self, channel, blocks, text):
+        time.sleep(self.latency_s)
+        self.posted += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sample", type=int, default=200, help="Users timed for the per-user baseline")
+    parser.add_argument("--rate", type=float, default=2000, help="Fan-out messages/second")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    backend = SQLBackend("sqlite://:memory:")
+    for batch in chunked(synthetic_invoices(args.rows, users=args.recipients), 5000):
+        backend.insert_invoices(batch)
+    users = [f"U{i:08d}" for i in range(args.recipients)]
+    db = DatabaseClient(backend=backend)
+
+    start = time.perf_counter()
+    summaries = db.get_summaries_by_user(users)
+    one_pass_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in users[:args.sample]:
+        db.get_invoices_summary(created_by_user_id=user)
+    per_user_s = (time.perf_counter() - start) / args.sample * args.recipients
+
+    db.rollups = RollupIndex()
+    start = time.perf_counter()
+    # What RollupRefresher does in the background before rollups answer anything
+    db.sync_rollups()
+    rollup_build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    db.get_summaries_by_user(users)
+    rollup_cold_s = time.perf_counter() - start
+    start = time.perf_counter()
+    db.get_summaries_by_user(users)
+    rollup_warm_s = time.perf_counter() - start
+
+    # What the bot receives: the JSON body, decoded
+    body = orjson.dumps({"summaries": {u: s.model_dump(mode="json") for u, s in summaries.items()}})
+    decoded = orjson.loads(body)["summaries"]
+
+    start = time.perf_counter()
+    messages = build_messages(decoded, "Your daily invoice digest")
+    render_s = time.perf_counter() - start
+
+    client = FakeSlackClient(args.latency_ms / 1000)
+    start = time.perf_counter()
+    sent = fan_out(client, messages, rate_per_second=args.rate, workers=args.workers)
+    fanout_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "recipients": args.recipients,
+        "rows": args.rows,
+        "summaries_one_pass_s": round(one_pass_s, 2),
+        "rollups_build_s": round(rollup_build_s, 2),
+        "summaries_rollups_cold_s": round(rollup_cold_s, 2),
+        "summaries_rollups_warm_s": round(rollup_warm_s, 2),
+        "summaries_per_user_extrapolated_s": round(per_user_s, 2),
+        "response_bytes": len(body),
+        "render_s": round(render_s, 3),
+        "messages": len(messages),
+        "sent": sent,
+        "fanout_s": round(fanout_s, 2),
+        # The bucket starts full, so the first `rate` messages go out as a burst
+        "fanout_floor_s": round(max(0, len(messages) - args.rate) / args.rate, 2),
+        "metrics": metrics.snapshot(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Handler-side cost of recording events, buffered vs written inline.
+
+Records --events events from --threads threads, as concurrent request
+handlers would, three ways: one INSERT per event on the caller's thread
+(what recording inline would cost), through EventRecorder into a SQLite
+app_events table, and through EventRecorder while every write fails (so
+batches go to the spool and are replayed once writes work again). Reports
+per-call latency and how many rows ended up stored.
+
+    python -m benchmarks.bench_events --events 20000
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from api_server.events import AUDIT, EventRecorder
+from api_server.metrics import metrics
+from api_server.storage.sql_backend import SQLBackend
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+        "max_us": round(samples[-1] * 1e6, 1),
+    }
+
+
+def run(record, events, threads):
+    timings = []
+    lock = threading.Lock()
+
+    def worker(n):
+        local = []
+        for i in range(n):
+            start = time.perf_counter()
+            record(i)
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(events // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return timings, time.perf_counter() - start
+
+
+def stored(path):
+    return sqlite3.connect(path).execute("SELECT count(*) FROM app_events").fetchone()[0]
+
+
+def event(i):
+    return {"action": "status_change", "from": "Sent", "to": "Paid", "i": i}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-events-")
+    report = {"events": args.events, "threads": args.threads}
+    sys.stdout = open(os.devnull, "w")
+    try:
+        path = os.path.join(workdir, "inline.db")
+        backend = SQLBackend(f"sqlite:///{path}", pool_size=args.threads)
+
+        def inline(i):
+            backend.insert_events([{
+                "event_id": uuid.uuid4().hex, "kind": AUDIT, "occurred_at": datetime.now(timezone.utc).isoformat(),
+                "slack_user_id": "U1", "subject": f"INV-{i}", "payload": event(i), "source": "api",
+            }])
+
+        timings, elapsed = run(inline, args.events, args.threads)
+        report["inline_insert"] = {**percentiles(timings), "seconds": round(elapsed, 2), "stored": stored(path)}
+        backend.close()
+
+        path = os.path.join(workdir, "buffered.db")
+        backend = SQLBackend(f"sqlite:///{path}", pool_size=1)
+        recorder = EventRecorder(backend.insert_events, capacity=args.events,
+                                 spool_path=os.path.join(workdir, "buffered.ndjson"))
+        recorder.start()
+        timings, elapsed = run(lambda i: recorder.record(AUDIT, event(i), "U1", f"INV-{i}"), args.events, args.threads)
+        recorder.stop()
+        report["buffered"] = {**percentiles(timings), "seconds": round(elapsed, 2), "stored": stored(path),
+                              "write_seconds": metrics.snapshot()["timings"].get("events.write_seconds")}
+        backend.close()
+
+        path = os.path.join(workdir, "outage.db")
+        backend = SQLBackend(f"sqlite:///{path}", pool_size=1)
+        down = threading.Event()
+        down.set()
+
+        def flaky(rows):
+            if down.is_set():
+                raise ConnectionError("database unavailable")
+            return backend.insert_events(rows)
+
+        recorder = EventRecorder(flaky, capacity=args.events, spool_path=os.path.join(workdir, "outage.ndjson"))
+        recorder.start()
+        timings, elapsed = run(lambda i: recorder.record(AUDIT, event(i), "U1", f"INV-{i}"), args.events, args.threads)
+        time.sleep(recorder.flush_seconds * 2)
+        spooled = metrics.snapshot()["counters"].get("events.spooled", 0)
+        down.clear()
+        recorder.stop()
+        report["during_outage"] = {**percentiles(timings), "seconds": round(elapsed, 2), "spooled": spooled,
+                                   "stored_after_recovery": stored(path)}
+        backend.close()
+    finally:
+        sys.stdout = sys.__stdout__
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Queries, rows fetched and latency for common search/summary filter combinations.
+
+Each case runs two ways against a SQLite table seeded with --rows synthetic
+invoices (add --replica to serve reads from the in-process replica):
+
+- before: what a client had to do when search only took one status,
+  customer and creator and summary also took due_date_before. Each status
+  is queried separately with the filters the API understood, the rest is
+  filtered, sorted and cut to the limit on the client.
+- after: one call with the filter compiled by api_server/filters.py.
+
+The report checks both ways return as many invoices (the same summary
+count) and shows backend queries, rows transferred and p50 latency per
+call.
+
+    python -m benchmarks.bench_filters --rows 100000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from api_server.database import DatabaseClient
+from api_server.filters import parse_sort
+from api_server.models import InvoiceFilter, InvoiceStatus, InvoiceType
+from api_server.storage import Predicate, StorageBackend
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import chunked, synthetic_invoices
+
+
+class CountingBackend(StorageBackend):
+    """Passes calls through to `backend`, counting queries and rows returned"""
+
+    name = "counting"
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.indexed_customer_ilike = backend.indexed_customer_ilike
+        self.queries = 0
+        self.rows = 0
+
+    def select_invoices(self, predicates=(), order_by=None, desc=False, limit=None):
+        rows = self.backend.select_invoices(predicates, order_by, desc, limit)
+        self.queries += 1
+        self.rows += len(rows)
+        return rows
+
+    def update_invoices(self, values, predicates):
+        return self.backend.update_invoices(values, predicates)
+
+    def insert_invoices(self, rows):
+        return self.backend.insert_invoices(rows)
+
+    def insert_events(self, rows):
+        return self.backend.insert_events(rows)
+
+    def search_customers(self, query, limit=20):
+        self.queries += 1
+        return self.backend.search_customers(query, limit)
+
+    def select_fx_rates(self):
+        return self.backend.select_fx_rates()
+
+
+def matches(row: Dict[str, Any], f: InvoiceFilter, customers: Optional[set]) -> bool:
+    due, issued, amount = str(row["due_date"])[:10], str(row["issue_date"])[:10], float(row["amount"])
+    return all((
+        not f.statuses or row["status"] in {s.value for s in f.statuses},
+        customers is None or row["customer_name"] in customers,
+        not f.created_by_user_id or row["created_by_user_id"] == f.created_by_user_id,
+        not f.invoice_type or row["type"] == f.invoice_type.value,
+        not f.due_date_after or due >= f.due_date_after.isoformat(),
+        not f.due_date_before or due <= f.due_date_before.isoformat(),
+        not f.issue_date_after or issued >= f.issue_date_after.isoformat(),
+        not f.issue_date_before or issued <= f.issue_date_before.isoformat(),
+        f.min_amount is None or amount >= f.min_amount,
+        f.max_amount is None or amount <= f.max_amount,
+    ))
+
+
+def before_rows(db: DatabaseClient, f: InvoiceFilter, summary: bool) -> List[Dict[str, Any]]:
+    """Every matching row, fetched with only the filters the old API took"""
+    customers = None
+    common: List[Predicate] = []
+    if f.customer_name:
+        predicate = db._customer_predicate(f.customer_name)
+        customers = set(predicate.value) if predicate.op == "in" else None
+        common.append(predicate)
+    if f.created_by_user_id:
+        common.append(Predicate("created_by_user_id", "eq", f.created_by_user_id))
+    if summary and f.due_date_before:
+        common.append(Predicate("due_date", "lte", f.due_date_before.isoformat()))
+    rows = []
+    for status in f.statuses or [None]:
+        predicates = common + ([Predicate("status", "eq", status.value)] if status else [])
+        rows.extend(db.backend.select_invoices(predicates))
+    return [r for r in rows if matches(r, f, customers)]
+
+
+def before_search(db: DatabaseClient, f: InvoiceFilter, sort: str, limit: int) -> List[str]:
+    rows = before_rows(db, f, summary=False)
+    column, desc = parse_sort(sort)
+    rows.sort(key=lambda r: (r[column] is None, r[column]), reverse=desc)
+    return [r["invoice_id"] for r in rows[:limit]]
+
+
+def cases(today: date, user: str) -> Dict[str, Dict[str, Any]]:
+    return {
+        "sent_due_next_30_days_soonest": {
+            "filters": InvoiceFilter(statuses=[InvoiceStatus.SENT], due_date_after=today,
+                                     due_date_before=today + timedelta(days=30)),
+            "sort": "due_date",
+        },
+        "sent_or_overdue_latest": {
+            "filters": InvoiceFilter(statuses=[InvoiceStatus.SENT, InvoiceStatus.OVERDUE]),
+        },
+        "user_payables_over_2000_largest": {
+            "filters": InvoiceFilter(created_by_user_id=user, invoice_type=InvoiceType.PAYABLE, min_amount=2000),
+            "sort": "-amount",
+        },
+        "customer_issued_last_quarter": {
+            "filters": InvoiceFilter(customer_name="acme", issue_date_after=today - timedelta(days=90)),
+        },
+        "all_statuses": {
+            "filters": InvoiceFilter(statuses=list(InvoiceStatus)),
+        },
+        "empty_amount_range": {
+            "filters": InvoiceFilter(min_amount=5000, max_amount=100),
+        },
+        "summary_sent_or_overdue_due_this_quarter": {
+            "filters": InvoiceFilter(statuses=[InvoiceStatus.SENT, InvoiceStatus.OVERDUE],
+                                     due_date_after=today, due_date_before=today + timedelta(days=90)),
+            "summary": True,
+        },
+        "summary_user_receivables_over_1000": {
+            "filters": InvoiceFilter(created_by_user_id=user, invoice_type=InvoiceType.RECEIVABLE, min_amount=1000),
+            "summary": True,
+        },
+    }
+
+
+def measure(counter: CountingBackend, fn, iterations: int):
+    samples, result = [], None
+    queries, rows = counter.queries, counter.rows
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, {
+        "queries": (counter.queries - queries) // iterations,
+        "rows_fetched": (counter.rows - rows) // iterations,
+        "p50_ms": round(statistics.median(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--replica", action="store_true")
+    args = parser.parse_args()
+    # Measure the queries themselves, not coalescing of repeats
+    os.environ["DB_SINGLE_FLIGHT"] = "0"
+
+    report: Dict[str, Any] = {"rows": args.rows, "limit": args.limit, "replica": args.replica, "cases": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = SQLBackend(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=2)
+        for batch in chunked(synthetic_invoices(args.rows), 1000):
+            source.insert_invoices(batch)
+        backend: StorageBackend = source
+        if args.replica:
+            from api_server.storage.replica import ReplicaBackend
+            backend = ReplicaBackend(source)
+            backend.load()
+        counter = CountingBackend(backend)
+        db = DatabaseClient(backend=counter)
+        user = source.select_invoices(limit=1)[0]["created_by_user_id"]
+
+        sys.stdout = open(os.devnull, "w")
+        try:
+            for name, case in cases(date.today(), user).items():
+                f: InvoiceFilter = case["filters"]
+                sort = case.get("sort", "-last_updated")
+                if case.get("summary"):
+                    old, before = measure(counter, lambda: db._summarize_rows(before_rows(db, f, True)),
+                                          args.iterations)
+                    new, after = measure(counter, lambda: db.get_invoices_summary(filters=f), args.iterations)
+                    agree = old.total_invoices == new.total_invoices
+                else:
+                    old, before = measure(counter, lambda: before_search(db, f, sort, args.limit),
+                                          args.iterations)
+                    new, after = measure(counter,
+                                         lambda: db.search_invoices(filters=f, sort=sort, limit=args.limit),
+                                         args.iterations)
+                    # Rows tied on the sort column may be cut at the limit differently
+                    agree = len(old) == len(new)
+                report["cases"][name] = {"same_result": agree, "before": before, "after": after}
+        finally:
+            sys.stdout = sys.__stdout__
+        backend.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
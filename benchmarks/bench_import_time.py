@@ -0,0 +1,78 @@
+"""
+Cold-start import benchmark.
+
+Imports the API app and the bot helpers in fresh interpreters with the
+Supabase environment removed, so any module-level client creation shows up as
+either a crash or a network wait. Exits non-zero when the median exceeds the
+target.
+
+    python -m benchmarks.bench_import_time --runs 5 --target-ms 1000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "api_server.main": ROOT,
+    "api_server.routers.auth": ROOT,
+    "supabase_helpers": os.path.join(ROOT, "slack_bot"),
+}
+
+SNIPPET = (
+    "import sys, time; sys.path.insert(0, {path!r}); "
+    "t = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _clean_env():
+    env = dict(os.environ)
+    for key in list(env):
+        if key.startswith("SUPABASE_"):
+            del env[key]
+    return env
+
+
+def time_import(module, path, runs):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(path=path, module=module)],
+            cwd=ROOT, env=_clean_env(), capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+        samples.append(float(proc.stdout.strip().splitlines()[-1]) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=1000.0,
+                        help="Fail if any module's median import time exceeds this")
+    args = parser.parse_args()
+
+    results = {}
+    for module, path in TARGETS.items():
+        samples = time_import(module, path, args.runs)
+        results[module] = {
+            "median_ms": round(statistics.median(samples), 1),
+            "max_ms": round(max(samples), 1),
+        }
+    print(json.dumps({"target_ms": args.target_ms, "results": results}, indent=2))
+
+    slow = [m for m, r in results.items() if r["median_ms"] > args.target_ms]
+    if slow:
+        print(f"Over target: {', '.join(slow)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+End-to-end JSON cost for /api/invoices/search?limit=50 and /api/invoices/summary.
+
+Server side: requests through the real app (ModelResponse / ORJSONResponse)
+vs an equivalent app using FastAPI's default response_model + JSONResponse
+path, both over the same seeded SQLite backend. Bot side: `r.json()` +
+`json.dumps` into the format prompt vs orjson decode/encode of the same body.
+
+    python -m benchmarks.bench_json_encoding --rows 5000 --requests 300
+"""
+
+import argparse
+import json
+import time
+from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, Query
+from fastapi.testclient import TestClient
+
+from api_server.database import DatabaseClient
+from api_server.dependencies import get_db
+from api_server.main import app
+from api_server.models import Invoice, InvoiceSummary
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import chunked, synthetic_invoices
+
+ENDPOINTS = ["/api/invoices/search?limit=50", "/api/invoices/summary"]
+
+
+def baseline_app():
+    """The invoice routes as they were: models returned through response_model"""
+    router = APIRouter(prefix="/api/invoices")
+
+    @router.get("/summary", response_model=InvoiceSummary)
+    async def summary(db: DatabaseClient = Depends(get_db)):
+        return db.get_invoices_summary()
+
+    @router.get("/search", response_model=List[Invoice])
+    async def search(limit: int = Query(10), customer_name: Optional[str] = None,
+                     db: DatabaseClient = Depends(get_db)):
+        return db.search_invoices(customer_name=customer_name, limit=limit)
+
+    baseline = FastAPI()
+    baseline.include_router(router)
+    return baseline
+
+
+def time_requests(client, path, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        body = client.get(path).content
+    return (time.perf_counter() - start) / count * 1000, body
+
+
+def time_bot_side(body, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        json.dumps(json.loads(body))
+    stdlib = (time.perf_counter() - start) / count * 1000
+    start = time.perf_counter()
+    for _ in range(count):
+        orjson.dumps(orjson.loads(body)).decode()
+    fast = (time.perf_counter() - start) / count * 1000
+    return stdlib, fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    backend = SQLBackend("sqlite://:memory:")
+    for batch in chunked(synthetic_invoices(args.rows), 1000):
+        backend.insert_invoices(batch)
+    db = DatabaseClient(backend=backend)
+
+    baseline = baseline_app()
+    for target in (app, baseline):
+        target.dependency_overrides[get_db] = lambda: db
+    clients = {"response_model_json": TestClient(baseline), "orjson_model_response": TestClient(app)}
+
+    report = {"rows": args.rows, "endpoints": {}}
+    for path in ENDPOINTS:
+        entry = {}
+        for name, client in clients.items():
+            time_requests(client, path, 10)
+            ms, body = time_requests(client, path, args.requests)
+            entry[f"{name}_ms"] = round(ms, 3)
+        stdlib_ms, orjson_ms = time_bot_side(body, args.requests * 10)
+        entry["bot_json_roundtrip_ms"] = round(stdlib_ms, 4)
+        entry["bot_orjson_roundtrip_ms"] = round(orjson_ms, 4)
+        entry["body_bytes"] = len(body)
+        report["endpoints"][path] = entry
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Tail latency and outage behaviour of the Gemini provider.
+
+Runs intent parsing against benchmarks/mock_gemini.py with injected faults:
+
+- tail:    every call takes --latency-ms, --slow-rate of them --slow-ms more.
+           Compares latency percentiles with hedging off and on, and reports
+           how many calls were hedged and how often the hedge won.
+- outage:  the mock answers 503 for the middle third of the run. Compares no
+           breaker (threshold never reached) with the default breaker: how
+           many Gemini calls the outage costs, how long users wait, how many
+           replies came from the local recognizer and how soon Gemini is
+           used again afterwards.
+
+Also scores the local recognizer against a small labelled set of messages.
+
+    python -m benchmarks.bench_llm_provider --messages 600
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.mock_gemini import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slack_bot"))
+
+import llm  # noqa: E402
+from llm_provider import CircuitBreaker, GeminiProvider  # noqa: E402
+from local_intent import recognize  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+LABELLED = [
+    ("how much is overdue?", {"action": "get_summary", "params": {"status": ["Overdue"]}}),
+    ("what's the total outstanding?", {"action": "get_summary", "params": {}}),
+    ("give me a summary for ACME Corp", {"action": "get_summary", "params": {"customer_name": "ACME Corp"}}),
+    ("show all draft invoices", {"action": "search_invoices", "params": {"status": ["Draft"]}}),
+    ("list unpaid invoices", {"action": "search_invoices", "params": {"status": ["Sent", "Overdue"]}}),
+    ("list invoices from Globex", {"action": "search_invoices", "params": {"customer_name": "Globex"}}),
+    ("which invoices are late?", {"action": "search_invoices", "params": {"status": ["Overdue"]}}),
+    ("status of inv-2024-001", {"action": "get_invoice", "params": {"invoice_id": "INV-2024-001"}}),
+    ("is INV-2024-001 paid?", {"action": "get_invoice", "params": {"invoice_id": "INV-2024-001"}}),
+    ("status of INV-2024-001, INV-2024-007 and INV-2024-019",
+     {"action": "get_invoices", "params": {"invoice_ids": ["INV-2024-001", "INV-2024-007", "INV-2024-019"]}}),
+    ("mark INV-2024-007 as paid", {"action": "update_invoice_status", "params": {"invoice_id": "INV-2024-007", "status": ["Paid"]}}),
+    ("mark it paid", {"action": "update_invoice_status", "params": {"invoice_id": "INV-2024-001", "status": ["Paid"]}}),
+    ("cancel INV-2024-003", {"action": "update_invoice_status", "params": {"invoice_id": "INV-2024-003", "status": ["Cancelled"]}}),
+    ("thanks!", None),
+    ("what's the weather like?", None),
+]
+FOLLOW_UP_CONTEXT = "Conversation so far in this thread:\nLast invoice ids: INV-2024-001"
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def use_provider(**options):
+    llm._provider = GeminiProvider(llm.session, **options)
+    return llm._provider
+
+
+def counters():
+    return metrics.snapshot()["counters"]
+
+
+def delta(before):
+    after = counters()
+    return {k: after.get(k, 0) - before.get(k, 0) for k in after}
+
+
+def run_tail(messages, hedge, latency_ms, slow_rate, slow_ms):
+    server = make_server(latency_ms=latency_ms, slow_rate=slow_rate, slow_ms=slow_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEMINI_API_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta/models/mock:generateContent"
+    use_provider(hedge=hedge, deadline_seconds=10)
+    before = counters()
+    latencies = []
+    for i in range(messages):
+        start = time.perf_counter()
+        llm.parse_intent(f"how much is overdue? #{i}")
+        latencies.append(time.perf_counter() - start)
+    server.shutdown()
+    changed = delta(before)
+    hedges = changed.get("llm.hedges", 0)
+    return {
+        "mode": "hedged" if hedge else "no hedge",
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "mock_slow_requests": server.counts["slow"],
+        "hedges": hedges,
+        "hedge_wins": changed.get("llm.hedge_wins", 0),
+        "extra_requests_pct": round(100 * hedges / messages, 2),
+    }
+
+
+def run_outage(messages, breaker, latency_ms):
+    server = make_server(latency_ms=latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEMINI_API_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta/models/mock:generateContent"
+    threshold = 5 if breaker else 10 ** 9
+    use_provider(hedge=False, deadline_seconds=5,
+                 breaker=CircuitBreaker(failure_threshold=threshold, window_seconds=30, open_seconds=0.5))
+    before = counters()
+    third = messages // 3
+    outage_latencies, outage_requests, recovered_after = [], 0, None
+    for i in range(messages):
+        if i == third:
+            server.faults["error_rate"] = 1.0
+            requests_at_start = sum(server.counts.values())
+        if i == 2 * third:
+            server.faults["error_rate"] = 0.0
+            outage_requests = sum(server.counts.values()) - requests_at_start
+            outage_end, gemini_before = time.perf_counter(), counters().get("gemini.intent.calls", 0)
+        start = time.perf_counter()
+        llm.parse_intent(f"how much is overdue? #{i}")
+        if third <= i < 2 * third:
+            outage_latencies.append(time.perf_counter() - start)
+        if i >= 2 * third and recovered_after is None and counters().get("gemini.intent.calls", 0) > gemini_before:
+            recovered_after = time.perf_counter() - outage_end
+        # Spread messages out so the breaker's open period can elapse
+        time.sleep(0.005)
+    server.shutdown()
+    changed = delta(before)
+    return {
+        "mode": "breaker" if breaker else "no breaker",
+        "outage_messages": third,
+        "gemini_requests_during_outage": outage_requests,
+        "outage_p50_ms": round(percentile(outage_latencies, 0.50) * 1000, 1),
+        "outage_p99_ms": round(percentile(outage_latencies, 0.99) * 1000, 1),
+        "local_fallbacks": changed.get("gemini.intent.local_fallbacks", 0),
+        "short_circuited": changed.get("llm.short_circuited", 0),
+        "breaker_opened": changed.get("llm.breaker_opened", 0),
+        "gemini_again_after_s": round(recovered_after, 3) if recovered_after is not None else None,
+        "breaker_state_at_end": metrics.snapshot()["gauges"].get("llm.breaker_state"),
+    }
+
+
+def score_local():
+    correct = 0
+    misses = []
+    for message, expected in LABELLED:
+        got = recognize(message, FOLLOW_UP_CONTEXT)
+        if got == expected:
+            correct += 1
+        else:
+            misses.append({"message": message, "expected": expected, "got": got})
+    return {"labelled": len(LABELLED), "correct": correct, "misses": misses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    os.environ["GEMINI_STRUCTURED_OUTPUT"] = "1"
+    # Keep the per-call log lines out of the report
+    sys.stdout = open(os.devnull, "w")
+    try:
+        tail = [run_tail(args.messages, hedge, args.latency_ms, args.slow_rate, args.slow_ms) for hedge in (False, True)]
+        outage = [run_outage(args.messages, breaker, args.latency_ms) for breaker in (False, True)]
+    finally:
+        sys.stdout = sys.__stdout__
+    print(json.dumps({
+        "messages": args.messages, "latency_ms": args.latency_ms, "slow_rate": args.slow_rate, "slow_ms": args.slow_ms,
+        "tail": tail, "outage": outage, "local_recognizer": score_local(),
+        "gauges": metrics.snapshot()["gauges"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
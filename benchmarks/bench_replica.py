@@ -0,0 +1,114 @@
+"""
+Memory and read latency of the in-process invoice replica.
+
+Builds a ReplicaTable from --rows synthetic invoices and reports its traced
+memory next to the same rows held as plain dicts (what a list of PostgREST
+results costs), then times the reads the bot makes against it: one invoice
+by id, a 5-id batch, the latest 10 invoices for a status, a customer's
+summary rows, a due-date range, and a full keyset scan in 1000-row pages.
+Finally times applying --changes updated rows, as one change poll would.
+
+    python -m benchmarks.bench_replica --rows 1000000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from api_server.storage.base import Predicate
+from api_server.storage.replica import ReplicaTable
+from benchmarks.fixtures import STATUSES, customer_names, synthetic_invoices
+
+
+def traced(build):
+    """(result, bytes allocated by `build` and still alive)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def build_table(rows):
+    table = ReplicaTable()
+    for row in synthetic_invoices(rows, with_ids=True):
+        table.upsert(row)
+    return table
+
+
+def keyset_scan(table, page_size=1000):
+    last_id, total = 0, 0
+    while True:
+        page = table.select([Predicate("id", "gt", last_id)], order_by="id", limit=page_size)
+        total += len(page)
+        if len(page) < page_size:
+            return total
+        last_id = page[-1]["id"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=1000)
+    parser.add_argument("--skip-dicts", action="store_true", help="don't measure the plain-dict baseline")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    report = {"rows": args.rows, "memory_mb": {}}
+    if not args.skip_dicts:
+        rows, dict_bytes = traced(lambda: list(synthetic_invoices(args.rows, with_ids=True)))
+        del rows
+        report["memory_mb"]["dict_rows"] = round(dict_bytes / 2**20, 1)
+    start = time.perf_counter()
+    table, table_bytes = traced(lambda: build_table(args.rows))
+    report["build_seconds"] = round(time.perf_counter() - start, 2)
+    report["memory_mb"]["replica"] = round(table_bytes / 2**20, 1)
+    report["bytes_per_row"] = round(table_bytes / args.rows, 1)
+
+    ids = [table.text["invoice_id"][rng.randrange(len(table))] for _ in range(args.repeat)]
+    customer = customer_names(500)[0]
+    today = date.today()
+    queries = {
+        "get_invoice": lambda: table.select([Predicate("invoice_id", "eq", rng.choice(ids))], limit=1),
+        "batch_get_5": lambda: table.select([Predicate("invoice_id", "in", rng.sample(ids, 5))]),
+        "latest_10_by_status": lambda: table.select(
+            [Predicate("status", "eq", rng.choice(STATUSES))], order_by="last_updated", desc=True, limit=10
+        ),
+        "customer_summary_rows": lambda: table.select([Predicate("customer_name", "in", [customer])]),
+        "due_next_7_days": lambda: table.select([
+            Predicate("due_date", "gte", today.isoformat()),
+            Predicate("due_date", "lte", (today + timedelta(days=7)).isoformat()),
+            Predicate("status", "eq", "Sent"),
+        ]),
+    }
+    report["queries"] = {name: timed(fn, args.repeat) for name, fn in queries.items()}
+    report["queries"]["keyset_scan_all"] = timed(lambda: keyset_scan(table), 1)
+
+    changed = [table.row(rng.randrange(len(table))) for _ in range(args.changes)]
+    for row in changed:
+        row["status"] = rng.choice(STATUSES)
+    report["apply_changes"] = {"rows": args.changes, **timed(lambda: [table.upsert(r) for r in changed], 3)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Row -> Invoice conversion and response encoding throughput.
+
+Compares the original per-field conversion (kept here as `legacy_convert`)
+with the batched TypeAdapter path used by DatabaseClient, plus an unvalidated
+model_construct variant for reference. Then compares FastAPI's
+response_model encoding with ModelResponse.
+
+    python -m benchmarks.bench_row_conversion --batch 50 --batches 400
+"""
+
+import argparse
+import json
+import time
+from datetime import date, datetime
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from api_server.database import INVOICE_LIST_ADAPTER, DatabaseClient
+from api_server.models import Invoice, InvoiceStatus, InvoiceType, LineItem
+from api_server.responses import ModelResponse
+from benchmarks.fixtures import synthetic_invoices
+
+
+def legacy_convert(invoice_data):
+    """Per-row conversion DatabaseClient did before `_convert_rows`"""
+    line_items = []
+    if invoice_data.get('line_items'):
+        line_items_data = invoice_data['line_items']
+        if isinstance(line_items_data, str):
+            line_items_data = json.loads(line_items_data)
+        line_items = [LineItem(**item) for item in line_items_data]
+    return Invoice(
+        id=invoice_data['id'],
+        invoice_id=invoice_data['invoice_id'],
+        customer_name=invoice_data['customer_name'],
+        amount=float(invoice_data['amount']),
+        currency=invoice_data['currency'],
+        status=InvoiceStatus(invoice_data['status']),
+        company_id=invoice_data.get('company_id'),
+        type=InvoiceType(invoice_data['type']),
+        issue_date=datetime.fromisoformat(invoice_data['issue_date']).date(),
+        due_date=datetime.fromisoformat(invoice_data['due_date']).date(),
+        line_items=line_items,
+        notes=invoice_data.get('notes'),
+        created_by_user_id=invoice_data.get('created_by_user_id'),
+        last_updated=datetime.fromisoformat(invoice_data['last_updated'].replace('Z', '+00:00'))
+    )
+
+
+def construct_convert(row):
+    """model_construct with Python-side parsing, as if rows were trusted"""
+    line_items = row.get('line_items') or []
+    if isinstance(line_items, str):
+        line_items = json.loads(line_items)
+    return Invoice.model_construct(
+        id=row['id'],
+        invoice_id=row['invoice_id'],
+        customer_name=row['customer_name'],
+        amount=float(row['amount']),
+        currency=row['currency'],
+        status=InvoiceStatus(row['status']),
+        company_id=row.get('company_id'),
+        type=InvoiceType(row['type']),
+        issue_date=date.fromisoformat(row['issue_date']),
+        due_date=date.fromisoformat(row['due_date']),
+        line_items=[LineItem.model_construct(**item) for item in line_items],
+        notes=row.get('notes'),
+        created_by_user_id=row.get('created_by_user_id'),
+        last_updated=datetime.fromisoformat(row['last_updated'])
+    )
+
+
+def fastapi_encode(invoices):
+    """What a response_model=List[Invoice] route does with a returned list"""
+    validated = INVOICE_LIST_ADAPTER.validate_python(
+        INVOICE_LIST_ADAPTER.dump_python(invoices, mode="python"))
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def rate(fn, batches, batch):
+    start = time.perf_counter()
+    for rows in batches:
+        fn(rows)
+    elapsed = time.perf_counter() - start
+    return round(len(batches) * batch / elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--batches", type=int, default=400)
+    args = parser.parse_args()
+
+    rows = list(synthetic_invoices(args.batch * args.batches, with_ids=True))
+    for row in rows:
+        # Supabase returns UTC timestamps with a 'Z' suffix
+        row["last_updated"] = row["last_updated"].replace("+00:00", "Z")
+    batches = [rows[i:i + args.batch] for i in range(0, len(rows), args.batch)]
+
+    db = DatabaseClient(backend=object())
+    invoices = [db._convert_rows(b) for b in batches]
+
+    report = {
+        "batch_size": args.batch,
+        "conversion_rows_per_sec": {
+            "legacy_per_row": rate(lambda b: [legacy_convert(r) for r in b], batches, args.batch),
+            "type_adapter_batch": rate(db._convert_rows, batches, args.batch),
+            "model_construct": rate(lambda b: [construct_convert(r) for r in b], batches, args.batch),
+        },
+        "encoding_rows_per_sec": {
+            "response_model": rate(fastapi_encode, invoices, args.batch),
+            "model_response": rate(lambda b: ModelResponse(b, List[Invoice]).body, invoices, args.batch),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
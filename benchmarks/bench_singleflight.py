@@ -0,0 +1,135 @@
+"""
+Backend queries under a thundering herd, with and without single flight.
+
+Each burst sends --callers identical reads at once (the same invoice, or the
+same summary) through DatabaseClient against benchmarks/fake_postgrest.py
+with --db-latency-ms per query, from threads (sync path) and from one event
+loop (async path). Reports backend queries, backend QPS, caller latency and
+the coalescing counters for each combination.
+
+    python -m benchmarks.bench_singleflight --callers 50 --bursts 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api_server.database import DatabaseClient
+from api_server.metrics import metrics
+from api_server.storage import SupabaseBackend
+from benchmarks import fake_postgrest
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+
+def make_db(url, single_flight):
+    from supabase import create_client
+
+    os.environ["DB_SINGLE_FLIGHT"] = "1" if single_flight else "0"
+    return DatabaseClient(backend=SupabaseBackend(create_client(url, "fake-key")))
+
+
+def herd_sync(call, callers, bursts):
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(callers)
+
+    def one(_):
+        barrier.wait()
+        start = time.perf_counter()
+        call()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        for _ in range(bursts):
+            list(pool.map(one, range(callers)))
+    return latencies
+
+
+def herd_async(call, callers, bursts):
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+
+    async def run():
+        for _ in range(bursts):
+            await asyncio.gather(*(one() for _ in range(callers)))
+
+    asyncio.run(run())
+    return latencies
+
+
+def run_case(server, url, query, path, single_flight, callers, bursts, invoice_id):
+    db = make_db(url, single_flight)
+    if query == "invoice":
+        sync_call = lambda: db.get_invoice_by_id(invoice_id)  # noqa: E731
+        async_call = lambda: db.aget_invoice_by_id(invoice_id)  # noqa: E731
+    else:
+        sync_call = lambda: db.get_invoices_summary(customer_name="acme")  # noqa: E731
+        async_call = lambda: db.aget_invoices_summary(customer_name="acme")  # noqa: E731
+    # Warm the connection pool and the customer index lookup path
+    sync_call()
+    before_counts = dict(server.counts)
+    before_metrics = metrics.snapshot()["counters"]
+    start = time.perf_counter()
+    latencies = herd_sync(sync_call, callers, bursts) if path == "sync" else herd_async(async_call, callers, bursts)
+    elapsed = time.perf_counter() - start
+    backend = sum(server.counts.values()) - sum(before_counts.values())
+    after_metrics = metrics.snapshot()["counters"]
+    coalesced = sum(v - before_metrics.get(k, 0) for k, v in after_metrics.items() if k.endswith(".coalesced"))
+    return {
+        "query": query,
+        "path": path,
+        "single_flight": single_flight,
+        "requests": len(latencies),
+        "backend_queries": backend,
+        "backend_qps": round(backend / elapsed, 1),
+        "coalesced": coalesced,
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    tables = fake_postgrest.seed_tables(args.invoices)
+    invoice_id = tables["invoices"][0]["invoice_id"]
+    server = fake_postgrest.make_server(tables=tables, latency_ms=args.db_latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    results = []
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for query in ("invoice", "summary"):
+            for path in ("sync", "async"):
+                for single_flight in (False, True):
+                    results.append(run_case(server, url, query, path, single_flight,
+                                            args.callers, args.bursts, invoice_id))
+    finally:
+        sys.stdout = sys.__stdout__
+    print(json.dumps({"invoices": args.invoices, "callers": args.callers, "bursts": args.bursts,
+                      "db_latency_ms": args.db_latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Runs the same DatabaseClient workload against each storage backend.
+
+SQLite is always benchmarked (seeded with --rows synthetic invoices). Pass
+--postgres-dsn to include a Postgres database (it is seeded too), and
+--supabase to include the configured Supabase project as-is (read-only ops).
+
+    python -m benchmarks.bench_storage_backends --rows 20000 --iterations 200
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from api_server.database import DatabaseClient
+from api_server.models import InvoiceStatus
+from api_server.storage import SupabaseBackend
+from api_server.storage.sql_backend import SQLBackend
+from benchmarks.fixtures import chunked, synthetic_invoices
+
+
+def seed(backend, rows):
+    start = time.perf_counter()
+    for batch in chunked(synthetic_invoices(rows), 1000):
+        backend.insert_invoices(batch)
+    return time.perf_counter() - start
+
+
+def sample_keys(db):
+    rows = db.backend.select_invoices(limit=500)
+    rng = random.Random(1)
+    return {
+        "invoice_ids": [r["invoice_id"] for r in rows],
+        "users": sorted({r["created_by_user_id"] for r in rows if r.get("created_by_user_id")}),
+        "customers": [r["customer_name"].split()[0] for r in rows],
+        "rng": rng,
+    }
+
+
+def workload(db, keys, writes):
+    rng = keys["rng"]
+    ops = {
+        "get_invoice_by_id": lambda: db.get_invoice_by_id(rng.choice(keys["invoice_ids"])),
+        "search_by_status": lambda: db.search_invoices(status=InvoiceStatus.SENT, limit=50),
+        "search_by_customer": lambda: db.search_invoices(customer_name=rng.choice(keys["customers"]), limit=50),
+        "summary_by_user": lambda: db.get_invoices_summary(created_by_user_id=rng.choice(keys["users"])),
+    }
+    if writes:
+        ops["update_invoice_status"] = lambda: db.update_invoice_status(
+            rng.choice(keys["invoice_ids"]), rng.choice([InvoiceStatus.SENT, InvoiceStatus.PAID])
+        )
+    return ops
+
+
+def run(db, iterations, writes):
+    keys = sample_keys(db)
+    results = {}
+    for name, op in workload(db, keys, writes).items():
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            op()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[name] = {
+            "ops_per_sec": round(iterations / (sum(samples) / 1000), 1),
+            "p50_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--postgres-dsn", default=os.getenv("BENCH_POSTGRES_DSN"))
+    parser.add_argument("--supabase", action="store_true")
+    args = parser.parse_args()
+
+    report = {"rows": args.rows, "iterations": args.iterations, "backends": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [("sqlite", SQLBackend(f"sqlite:///{os.path.join(tmp, 'bench.db')}"), True)]
+        if args.postgres_dsn:
+            backends.append(("postgres", SQLBackend(args.postgres_dsn), True))
+        if args.supabase:
+            backends.append(("supabase", SupabaseBackend(), False))
+
+        for name, backend, seedable in backends:
+            entry = {}
+            if seedable:
+                entry["seed_seconds"] = round(seed(backend, args.rows), 2)
+            entry["ops"] = run(DatabaseClient(backend=backend), args.iterations, writes=seedable)
+            report["backends"][name] = entry
+            backend.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Gemini reply parse failures with and without structured output.
+
+Runs --messages intent + format round trips against benchmarks/mock_gemini.py
+(same seed for every mode) in three modes:
+
+- before:      free text, code-fence stripping + json.loads, no retry
+               (the handler logic before structured output)
+- text+retry:  free text, validated into the pydantic schemas, one retry
+- structured:  responseSchema requests, validated, one retry
+
+and reports parse failures, replies that still failed after the retry (what
+the user sees as "couldn't understand"), and Gemini calls per message.
+
+    python -m benchmarks.bench_structured_output --messages 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+import orjson
+
+from benchmarks.mock_gemini import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slack_bot"))
+
+import llm  # noqa: E402
+from constants import FORMAT_PROMPT, SYSTEM_PROMPT  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+API_RESULT = {"total_outstanding": 48210.5, "overdue_count": 12, "due_this_month": [], "total_invoices": 90}
+
+
+def legacy_intent(message):
+    """The handler's old free-text intent call (it returned the error text when Gemini failed)"""
+    try:
+        reply = llm.call_gemini("intent", SYSTEM_PROMPT, "User: " + message, cache=True)
+        action = orjson.loads(llm.extract_json_from_code_block(reply))
+    except Exception:
+        return None
+    return action if isinstance(action, dict) and "action" in action and "params" in action else None
+
+
+def legacy_format(message):
+    reply = llm.call_gemini("format", FORMAT_PROMPT, f"User's original query: {message}\n\nAPI Response: {orjson.dumps(API_RESULT).decode()}")
+    try:
+        return orjson.loads(llm.extract_json_from_code_block(reply))
+    except Exception:
+        return None
+
+
+def run_mode(mode, messages, seed, text_fault_rate, json_fault_rate):
+    server = make_server(seed=seed, text_fault_rate=text_fault_rate, json_fault_rate=json_fault_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEMINI_API_URL"] = f"http://127.0.0.1:{server.server_port}/v1beta/models/mock:generateContent"
+    os.environ["GEMINI_STRUCTURED_OUTPUT"] = "1" if mode == "structured" else "0"
+    before = metrics.snapshot()["counters"]
+    intent_failed = format_failed = 0
+    for i in range(messages):
+        message = f"how much is overdue? #{i}"
+        if mode == "before":
+            intent_failed += legacy_intent(message) is None
+            format_failed += legacy_format(message) is None
+        else:
+            intent_failed += llm.parse_intent(message) is None
+            blocks = llm.format_api_response(API_RESULT, message)
+            format_failed += "couldn't format" in json.dumps(blocks)
+    server.shutdown()
+    after = metrics.snapshot()["counters"]
+    delta = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+    calls = delta.get("gemini.intent.calls", 0) + delta.get("gemini.format.calls", 0)
+    return {
+        "mode": mode,
+        "intent_parse_failures": delta.get("gemini.intent.parse_failures", intent_failed if mode == "before" else 0),
+        "format_parse_failures": delta.get("gemini.format.parse_failures", format_failed if mode == "before" else 0),
+        "user_visible_intent_failure_rate": round(intent_failed / messages, 4),
+        "user_visible_format_failure_rate": round(format_failed / messages, 4),
+        "gemini_calls_per_message": round(calls / messages, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--text-fault-rate", type=float, default=0.12)
+    parser.add_argument("--json-fault-rate", type=float, default=0.03)
+    args = parser.parse_args()
+
+    # Keep the per-call log lines out of the report
+    sys.stdout = open(os.devnull, "w")
+    try:
+        results = [
+            run_mode(mode, args.messages, args.seed, args.text_fault_rate, args.json_fault_rate)
+            for mode in ("before", "text+retry", "structured")
+        ]
+    finally:
+        sys.stdout = sys.__stdout__
+    print(json.dumps({"messages": args.messages, "text_fault_rate": args.text_fault_rate,
+                      "json_fault_rate": args.json_fault_rate, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
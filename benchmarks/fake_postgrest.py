@@ -0,0 +1,301 @@
+"""
+In-memory stand-in for Supabase's PostgREST API, seeded with synthetic data.
+
+Serves the subset of PostgREST the API server and the bot use under
+/rest/v1: selects with column projection, eq/neq/lt/lte/gt/gte/like/ilike/
+in/is filters, order and limit; inserts and upserts (on_conflict, which may
+name several columns); filtered PATCH updates and DELETEs; and the
+search_customers() RPC, scored with the same trigram index the SQLite
+backend uses. Point a Supabase client at it with
+SUPABASE_URL=http://127.0.0.1:<port> and any key.
+
+Seeded sessions carry HS256 access tokens signed with JWT_SECRET (set
+SUPABASE_JWT_SECRET to it on the API server), and
+/auth/v1/token?grant_type=refresh_token issues fresh ones.
+
+Rows live in plain lists per table, so lookups are scans: fine for load
+tests of the layers above, not a model of Postgres performance. Use
+--latency-ms to add a fixed round trip on top.
+
+    python -m benchmarks.fake_postgrest --port 54321 --invoices 20000
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from api_server.customer_index import CustomerIndex
+from benchmarks.fixtures import synthetic_invoices
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+PRIMARY_KEYS = {"invoices": "id", "slack_sessions": "slack_user_id", "digest_subscriptions": "slack_user_id",
+                "digest_runs": "frequency,run_date", "fx_rates": "currency", "users": "slack_user_id"}
+JWT_SECRET = "fake-postgrest-jwt-secret-for-load-tests"
+TOKEN_TTL_SECONDS = 3600
+FX_RATES = [{"currency": "USD", "rate": "1"}, {"currency": "EUR", "rate": "0.92"},
+            {"currency": "GBP", "rate": "0.79"}, {"currency": "INR", "rate": "83.2"}]
+
+
+def access_token(subject, expires_at):
+    import jwt
+    return jwt.encode({"sub": subject, "aud": "authenticated", "role": "authenticated", "exp": expires_at},
+                      JWT_SECRET, algorithm="HS256")
+
+
+def session_row(slack_user_id, expires_at):
+    subject = f"00000000-0000-4000-8000-{int(slack_user_id[1:]):012d}"
+    return {"slack_user_id": slack_user_id, "supabase_user_id": subject,
+            "access_token": access_token(subject, expires_at),
+            "refresh_token": f"refresh-{slack_user_id}", "expires_at": expires_at, "refresh_claimed_until": 0}
+
+
+def seed_tables(invoices=20000, users=50, customers=500, seed=42):
+    """Tables for a load test: invoices, fx rates and a live session per user"""
+    expires = int(time.time()) + TOKEN_TTL_SECONDS
+    user_ids = [f"U{i:08d}" for i in range(users)]
+    return {
+        "invoices": list(synthetic_invoices(invoices, customers=customers, users=users, seed=seed, with_ids=True)),
+        "fx_rates": [dict(r) for r in FX_RATES],
+        "slack_sessions": [session_row(u, expires) for u in user_ids],
+        "digest_subscriptions": [],
+        "digest_runs": [],
+        "users": [],
+    }
+
+
+def _parse_list(text):
+    # in.(a,b,"c, d")
+    return [item.strip('"') for item in re.findall(r'"[^"]*"|[^,]+', text.strip("()"))]
+
+
+def _coerce(value, like):
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, int):
+        return int(value)
+    if isinstance(like, float):
+        return float(value)
+    return value
+
+
+def _like(pattern, case_insensitive):
+    regex = "".join(".*" if ch in "*%" else "." if ch == "_" else re.escape(ch) for ch in pattern)
+    return re.compile(f"^{regex}$", (re.IGNORECASE if case_insensitive else 0) | re.DOTALL)
+
+
+def make_filter(column, expression):
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+    if op == "in":
+        values = set(_parse_list(raw))
+        test = lambda v: v is not None and str(v) in values  # noqa: E731
+    elif op == "is":
+        target = {"null": None, "true": True, "false": False}[raw]
+        test = lambda v: v is target  # noqa: E731
+    elif op in ("like", "ilike"):
+        pattern = _like(raw, op == "ilike")
+        test = lambda v: v is not None and bool(pattern.match(str(v)))  # noqa: E731
+    else:
+        compare = {
+            "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+        }[op]
+        test = lambda v: v is not None and compare(v, _coerce(raw, v))  # noqa: E731
+    if negate:
+        return lambda row: not test(row.get(column))
+    return lambda row: test(row.get(column))
+
+
+class Store:
+    def __init__(self, tables):
+        self.tables = tables
+        self.next_ids = {name: max((r.get("id", 0) for r in rows), default=0) + 1 for name, rows in tables.items()}
+        self.customers = CustomerIndex(r["customer_name"] for r in tables.get("invoices", []))
+        self.lock = threading.Lock()
+
+    def select(self, table, params):
+        filters = [make_filter(k, v) for k, v in params if k not in RESERVED_PARAMS]
+        options = dict(params)
+        with self.lock:
+            rows = [r for r in self.tables.get(table, []) if all(f(r) for f in filters)]
+        for clause in reversed((options.get("order") or "").split(",")):
+            if clause:
+                column, *modifiers = clause.split(".")
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse="desc" in modifiers)
+        offset = int(options.get("offset", 0))
+        if "limit" in options:
+            rows = rows[offset:offset + int(options["limit"])]
+        elif offset:
+            rows = rows[offset:]
+        columns = options.get("select", "*")
+        if columns != "*":
+            names = [c.strip() for c in columns.split(",")]
+            rows = [{c: r.get(c) for c in names} for r in rows]
+        return rows
+
+    def insert(self, table, rows, on_conflict=None, merge=False, ignore=False):
+        key = on_conflict or PRIMARY_KEYS.get(table)
+        stored = []
+        with self.lock:
+            target = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                existing = None
+                # on_conflict may name several columns (a composite key)
+                columns = key.split(",") if key else []
+                if (merge or ignore) and columns and all(c in row for c in columns):
+                    existing = next((r for r in target if all(r.get(c) == row[c] for c in columns)), None)
+                if existing is not None and ignore:
+                    continue
+                if existing is not None:
+                    existing.update(row)
+                    stored.append(dict(existing))
+                    continue
+                if table == "invoices":
+                    row.setdefault("id", self.next_ids.get(table, 1))
+                    row.setdefault("last_updated", datetime.now(timezone.utc).isoformat())
+                    self.next_ids[table] = row["id"] + 1
+                    self.customers.add(row["customer_name"])
+                target.append(row)
+                stored.append(dict(row))
+        return stored
+
+    def update(self, table, values, params):
+        filters = [make_filter(k, v) for k, v in params if k not in RESERVED_PARAMS]
+        with self.lock:
+            changed = []
+            for row in self.tables.get(table, []):
+                if all(f(row) for f in filters):
+                    row.update(values)
+                    changed.append(dict(row))
+        return changed
+
+    def delete(self, table, params):
+        filters = [make_filter(k, v) for k, v in params if k not in RESERVED_PARAMS]
+        with self.lock:
+            rows = self.tables.get(table, [])
+            removed = [r for r in rows if all(f(r) for f in filters)]
+            self.tables[table] = [r for r in rows if not all(f(r) for f in filters)]
+        return removed
+
+    def search_customers(self, query, limit):
+        return [{"customer_name": name, "score": score} for name, score in self.customers.search(query, limit)]
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under herd load tests
+    request_queue_size = 1024
+
+
+def make_server(port=0, tables=None, latency_ms=0.0):
+    store = Store(tables if tables is not None else seed_tables())
+    counts = {}
+    counts_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if isinstance(payload, list):
+                self.send_header("Content-Range", f"0-{max(len(payload) - 1, 0)}/*")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _refresh(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            token = json.loads(self.rfile.read(length) or b"{}").get("refresh_token", "")
+            with counts_lock:
+                counts["POST auth/token"] = counts.get("POST auth/token", 0) + 1
+            if not token.startswith("refresh-U"):
+                self._send(400, {"error": "invalid_grant", "error_description": "Invalid Refresh Token"})
+                return
+            row = session_row(token[len("refresh-"):], int(time.time()) + TOKEN_TTL_SECONDS)
+            self._send(200, {"access_token": row["access_token"], "refresh_token": row["refresh_token"],
+                             "expires_in": TOKEN_TTL_SECONDS, "expires_at": row["expires_at"], "token_type": "bearer"})
+
+        def _route(self, method):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            url = urlsplit(self.path)
+            if method == "POST" and url.path == "/auth/v1/token" and "grant_type=refresh_token" in url.query:
+                self._refresh()
+                return None, None, None
+            if not url.path.startswith("/rest/v1/"):
+                self._send(404, {"message": f"Unknown path {url.path}"})
+                return None, None, None
+            name = unquote(url.path[len("/rest/v1/"):])
+            with counts_lock:
+                counts[f"{method} {name}"] = counts.get(f"{method} {name}", 0) + 1
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+            return name, parse_qsl(url.query, keep_blank_values=True), body
+
+        def do_GET(self):
+            table, params, _ = self._route("GET")
+            if table is not None:
+                self._send(200, store.select(table, params))
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_POST(self):
+            name, params, body = self._route("POST")
+            if name is None:
+                return
+            if name == "rpc/search_customers":
+                self._send(200, store.search_customers(body["query"], int(body.get("max_results", 20))))
+                return
+            if name.startswith("rpc/"):
+                self._send(404, {"message": f"Unknown function {name[4:]}"})
+                return
+            rows = body if isinstance(body, list) else [body]
+            prefer = self.headers.get("Prefer") or ""
+            self._send(201, store.insert(name, rows, dict(params).get("on_conflict"),
+                                         "merge-duplicates" in prefer, "ignore-duplicates" in prefer))
+
+        def do_PATCH(self):
+            table, params, body = self._route("PATCH")
+            if table is not None:
+                self._send(200, store.update(table, body or {}, params))
+
+        def do_DELETE(self):
+            table, params, _ = self._route("DELETE")
+            if table is not None:
+                self._send(200, store.delete(table, params))
+
+    server = Server(("127.0.0.1", port), Handler)
+    server.store = store
+    server.counts = counts
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server = make_server(args.port, seed_tables(args.invoices, args.users), args.latency_ms)
+    print(f"Fake PostgREST with {args.invoices} invoices on http://127.0.0.1:{args.port}/rest/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
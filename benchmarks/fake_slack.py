@@ -0,0 +1,137 @@
+"""
+Fake Slack Web API plus an event injector for driving the bot without Slack.
+
+The server answers the Web API methods the bot calls (auth.test,
+chat.postMessage, chat.update, users.info, conversations.open, views.open;
+anything else gets {"ok": true}) and records every call. Point the bot at it
+with SLACK_API_URL=http://127.0.0.1:<port>/api/.
+
+`EventInjector` pushes message events through the Bolt app exactly as Socket
+Mode delivers them, so the middleware and listener chain run unchanged. A
+message counts as handled when the bot's chat.update for it reaches the fake
+server, i.e. when the user would see the reply.
+"""
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER_ID = "UBOTUSER1"
+
+
+class CallLog:
+    def __init__(self):
+        self.counts = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, payload):
+        with self._lock:
+            self.counts[method] = self.counts.get(method, 0) + 1
+            if method == "chat.update":
+                waiter = self._waiters.pop(payload.get("channel"), None)
+                if waiter is not None:
+                    waiter.set()
+
+    def expect_update(self, channel):
+        event = threading.Event()
+        with self._lock:
+            self._waiters[channel] = event
+        return event
+
+
+def make_server(port=0, latency_ms=0.0):
+    log = CallLog()
+    ts_counter = itertools.count(1)
+
+    def reply(method, payload):
+        if method == "auth.test":
+            return {"ok": True, "url": "https://fake.slack.com/", "team": "Fake", "user": "invoice-bot",
+                    "team_id": "TFAKE0001", "user_id": BOT_USER_ID, "bot_id": "BFAKE0001"}
+        if method in ("chat.postMessage", "chat.update"):
+            ts = payload.get("ts") or f"{int(time.time())}.{next(ts_counter):06d}"
+            return {"ok": True, "channel": payload.get("channel"), "ts": ts, "message": {"text": payload.get("text")}}
+        if method == "users.info":
+            user = payload.get("user", "")
+            return {"ok": True, "user": {"id": user, "profile": {"email": f"{user.lower()}@example.com"}}}
+        if method == "conversations.open":
+            return {"ok": True, "channel": {"id": "D" + str(payload.get("users", ""))[1:]}}
+        if method == "views.open":
+            return {"ok": True, "view": {"id": "VFAKE0001"}}
+        return {"ok": True}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _handle(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            url = urlsplit(self.path)
+            method = url.path.rsplit("/", 1)[-1]
+            payload = dict(parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                raw = self.rfile.read(length)
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    payload.update(json.loads(raw))
+                else:
+                    payload.update(parse_qsl(raw.decode()))
+            log.record(method, payload)
+            data = json.dumps(reply(method, payload)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = _handle
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.log = log
+    return server
+
+
+class EventInjector:
+    """Delivers synthetic message events to a Bolt `app`"""
+
+    def __init__(self, app, server, timeout=30.0):
+        self.app = app
+        self.server = server
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    def message_event(self, user, text):
+        n = next(self._ids)
+        channel = f"DLOAD{n:07d}"
+        return {
+            "token": "fake", "team_id": "TFAKE0001", "api_app_id": "AFAKE0001", "type": "event_callback",
+            "event_id": f"EvLOAD{n:09d}", "event_time": int(time.time()),
+            "event": {"type": "message", "channel_type": "im", "user": user, "text": text,
+                      "client_msg_id": f"00000000-0000-4000-8000-{n:012d}", "channel": channel, "ts": f"{time.time():.6f}", "event_ts": f"{time.time():.6f}"},
+        }
+
+    def send(self, user, text, redeliveries=0):
+        """Seconds until the bot's reply was posted, or None on timeout
+
+        `redeliveries` sends the same event again that many times, as Slack's
+        retries do, with x-slack-retry-num set.
+        """
+        from slack_bolt.request import BoltRequest
+
+        payload = self.message_event(user, text)
+        done = self.server.log.expect_update(payload["event"]["channel"])
+        start = time.perf_counter()
+        self.app.dispatch(BoltRequest(body=json.dumps(payload), mode="socket_mode"))
+        for retry_num in range(1, redeliveries + 1):
+            headers = {"x-slack-retry-num": str(retry_num), "x-slack-retry-reason": "http_timeout"}
+            self.app.dispatch(BoltRequest(body=json.dumps(payload), headers=headers, mode="socket_mode"))
+        if not done.wait(self.timeout):
+            return None
+        return time.perf_counter() - start
@@ -0,0 +1,65 @@
+"""
+Synthetic invoice rows shaped like the Supabase `invoices` table.
+"""
+
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+STATUSES = ["Draft", "Sent", "Paid", "Overdue", "Cancelled"]
+TYPES = ["RECEIVABLE", "PAYABLE"]
+CURRENCIES = ["USD", "USD", "USD", "EUR", "INR", "GBP"]
+SYLLABLES = ["ac", "ne", "zor", "vex", "li", "tam", "qui", "ro", "bel", "dan", "ka", "mi", "sto", "ren", "pha", "gu"]
+CUSTOMER_SUFFIXES = ["Corp.", "Inc", "Ltd", "GmbH", "LLC", "Industries", "Holdings"]
+
+
+def customer_names(count: int, seed: int = 7) -> List[str]:
+    """Distinct, realistic-looking company names; the first is always "ACME Corp." """
+    rng = random.Random(seed)
+    names = {"ACME Corp."}
+    while len(names) < count:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        names.add(f"{word} {rng.choice(CUSTOMER_SUFFIXES)}")
+    return ["ACME Corp."] + sorted(names - {"ACME Corp."})[:count - 1]
+
+
+def synthetic_invoices(count: int, customers: int = 500, users: int = 50,
+                       seed: int = 42, with_ids: bool = False) -> Iterator[Dict]:
+    """Yield `count` invoice rows; ids are only included when `with_ids` is set"""
+    rng = random.Random(seed)
+    names = customer_names(customers)
+    today = date.today()
+    now = datetime.now(timezone.utc)
+    for i in range(count):
+        issue = today - timedelta(days=rng.randint(0, 365))
+        quantity = rng.randint(1, 10)
+        unit_price = round(rng.uniform(10, 500), 2)
+        row = {
+            "invoice_id": f"INV-{issue.year}-{i + 1:07d}",
+            "customer_name": rng.choice(names),
+            "amount": round(quantity * unit_price, 2),
+            "currency": rng.choice(CURRENCIES),
+            "status": rng.choice(STATUSES),
+            "company_id": None,
+            "type": rng.choice(TYPES),
+            "issue_date": issue.isoformat(),
+            "due_date": (issue + timedelta(days=rng.choice([15, 30, 45, 60]))).isoformat(),
+            "line_items": [{"description": "Consulting", "quantity": quantity, "unit_price": unit_price}],
+            "notes": None,
+            "created_by_user_id": f"U{rng.randint(0, users - 1):08d}",
+            "last_updated": (now - timedelta(seconds=rng.randint(0, 86400 * 30))).isoformat(),
+        }
+        if with_ids:
+            row["id"] = i + 1
+        yield row
+
+
+def chunked(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,306 @@
+"""
+End-to-end load test of the API server and the Slack bot on local stand-ins.
+
+Starts, in one process:
+
+- benchmarks/fake_postgrest.py seeded with --invoices synthetic invoices
+  (the API server and the bot's Supabase client both talk to it),
+- benchmarks/mock_gemini.py with --gemini-latency-ms per call,
+- benchmarks/fake_slack.py as the Slack Web API,
+- the real FastAPI app under uvicorn, and the real Bolt app from slack_app.
+
+Then runs two phases at --concurrency:
+
+- api:   --api-requests requests spread over the read routes the bot uses,
+         timed per route at the HTTP client.
+- slack: --messages message events injected through Bolt, timed from
+         dispatch to the bot's final chat.update, with a breakdown into the
+         stages of message_gemini (session check, intent, API call,
+         formatting, Slack calls). --redeliver-rate of the messages are
+         delivered again, as Slack retries would be, to check they are
+         dropped rather than answered twice.
+
+Prints one JSON document (or writes it to --output) with throughput and
+p50/p95/p99/max per route and per stage, so runs can be diffed. Any other
+settings (INVOICE_ROLLUPS, GEMINI_STRUCTURED_OUTPUT, ...) are taken from the
+environment as usual.
+
+    python -m benchmarks.loadtest --invoices 20000 --concurrency 8 --output run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import requests
+
+from benchmarks import fake_postgrest, fake_slack, mock_gemini
+
+SLACK_BOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slack_bot")
+MESSAGES = [
+    "how much is overdue?",
+    "show me all draft invoices",
+    "what's the total outstanding for ACME?",
+    "status of INV-2026-0000001",
+    "status of INV-2026-0000001 and INV-2026-0000002",
+    "mark INV-2026-0000001 as paid",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+class StageTimer:
+    """Collects durations per stage name from any thread"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def report(self):
+        return {stage: percentiles(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def start_api_server(port):
+    import uvicorn
+
+    config = uvicorn.Config("api_server.main:app", host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("API server did not start")
+        time.sleep(0.05)
+    return server
+
+
+def wait_for_replica(timeout=300):
+    """With INVOICE_REPLICA=1, block until the API server's replica has loaded"""
+    from api_server.dependencies import get_storage_backend
+    from api_server.storage.replica import ReplicaBackend
+
+    backend = get_storage_backend()
+    if not isinstance(backend, ReplicaBackend):
+        return None
+    start = time.perf_counter()
+    while not backend.is_fresh:
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError("Invoice replica did not load")
+        time.sleep(0.05)
+    return round(time.perf_counter() - start, 3)
+
+
+def api_requests(users, invoice_ids, rng):
+    """(route, method, path, kwargs) for one request, drawn at random"""
+    user = rng.choice(users)
+    choices = [
+        ("summary", "GET", "/api/invoices/summary", {"params": {"created_by_user_id": user}}),
+        ("summary_overdue", "GET", "/api/invoices/summary", {"params": {"status": "Overdue"}}),
+        ("search_status", "GET", "/api/invoices/search", {"params": {"status": "Draft", "limit": 10}}),
+        ("search_customer", "GET", "/api/invoices/search", {"params": {"customer_name": "acme", "limit": 10}}),
+        ("get_invoice", "GET", f"/api/invoices/{rng.choice(invoice_ids)}", {}),
+        ("batch_get", "POST", "/api/invoices/batch-get", {"json": {"invoice_ids": rng.sample(invoice_ids, 5)}}),
+        ("customers", "GET", "/api/invoices/customers", {"params": {"q": "acme"}}),
+        ("analytics", "GET", "/api/invoices/analytics", {"params": {"created_by_user_id": user}}),
+        ("session", "GET", f"/api/session/{user}", {}),
+    ]
+    return rng.choice(choices)
+
+
+def run_api_phase(base_url, total, concurrency, users, invoice_ids, seed):
+    timer = StageTimer()
+    statuses = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        rng = random.Random(seed * 1_000_003 + i)
+        route, method, path, kwargs = api_requests(users, invoice_ids, rng)
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = local.session.request(method, base_url + path, timeout=60, **kwargs).status_code
+        except requests.RequestException as e:
+            status = e.__class__.__name__
+        timer.add(route, time.perf_counter() - start)
+        with lock:
+            key = f"{route} {status}"
+            statuses[key] = statuses.get(key, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "routes": timer.report(),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def run_slack_phase(slack_server, total, concurrency, users, seed, redeliver_rate=0.0):
+    sys.path.insert(0, SLACK_BOT_DIR)
+    import slack_app
+    from metrics import metrics
+    from slack_sdk import WebClient
+
+    timer = StageTimer()
+    # Stage timings wrap the names message_gemini looks up at call time
+    slack_app.is_user_authenticated = timer.wrap("session_check", slack_app.is_user_authenticated)
+    slack_app.parse_intent = timer.wrap("intent", slack_app.parse_intent)
+    slack_app.run_action = timer.wrap("api_call", slack_app.run_action)
+    slack_app.format_api_response = timer.wrap("format", slack_app.format_api_response)
+    original_post, original_update = WebClient.chat_postMessage, WebClient.chat_update
+    WebClient.chat_postMessage = timer.wrap("slack_post", original_post)
+    WebClient.chat_update = timer.wrap("slack_update", original_update)
+
+    injector = fake_slack.EventInjector(slack_app.app, slack_server)
+    end_to_end, timeouts = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal timeouts
+        rng = random.Random(seed * 7_000_003 + i)
+        redeliveries = 1 if rng.random() < redeliver_rate else 0
+        elapsed = injector.send(rng.choice(users), rng.choice(MESSAGES), redeliveries=redeliveries)
+        with lock:
+            if elapsed is None:
+                timeouts += 1
+            else:
+                end_to_end.append(elapsed)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+    finally:
+        WebClient.chat_postMessage, WebClient.chat_update = original_post, original_update
+    return {
+        "messages": total,
+        "seconds": round(elapsed, 3),
+        "throughput_mps": round(len(end_to_end) / elapsed, 2),
+        "timeouts": timeouts,
+        "end_to_end": percentiles(end_to_end),
+        "stages": timer.report(),
+        "slack_calls": dict(slack_server.log.counts),
+        "events": {k: v for k, v in metrics.snapshot()["counters"].items() if k.startswith("slack.events.")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--api-requests", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--db-latency-ms", type=float, default=2)
+    parser.add_argument("--gemini-latency-ms", type=float, default=400)
+    parser.add_argument("--slack-latency-ms", type=float, default=30)
+    parser.add_argument("--redeliver-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--phases", default="api,slack")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    tables = fake_postgrest.seed_tables(args.invoices, args.users)
+    users = [row["slack_user_id"] for row in tables["slack_sessions"]]
+    invoice_ids = [row["invoice_id"] for row in tables["invoices"]]
+    postgrest = start(fake_postgrest.make_server(tables=tables, latency_ms=args.db_latency_ms))
+    gemini = start(mock_gemini.make_server(latency_ms=args.gemini_latency_ms, seed=args.seed))
+    slack = start(fake_slack.make_server(latency_ms=args.slack_latency_ms))
+    api_port = free_port()
+    supabase_url = f"http://127.0.0.1:{postgrest.server_port}"
+    os.environ.update({
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": "fake-anon-key",
+        "SUPABASE_SERVICE_ROLE_KEY": "fake-service-key",
+        "SUPABASE_JWT_SECRET": fake_postgrest.JWT_SECRET,
+        "ALLOWED_SLACK_USERS": ",".join(users),
+        "OVERDUE_CHECK_INTERVAL_SECONDS": "0",
+        "API_SERVER_URL": f"http://127.0.0.1:{api_port}",
+        "GEMINI_API_URL": f"http://127.0.0.1:{gemini.server_port}/v1beta/models/mock:generateContent",
+        "SLACK_API_URL": f"http://127.0.0.1:{slack.server_port}/api/",
+        "SLACK_BOT_TOKEN": "xoxb-fake",
+    })
+    api_server = start_api_server(api_port)
+    replica_load_seconds = wait_for_replica()
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    if replica_load_seconds is not None:
+        report["replica_load_seconds"] = replica_load_seconds
+    phases = args.phases.split(",")
+    # Keep the bot's and the API's per-request log lines out of the report
+    sys.stdout = open(os.devnull, "w")
+    try:
+        if "api" in phases:
+            report["api"] = run_api_phase(os.environ["API_SERVER_URL"], args.api_requests, args.concurrency,
+                                          users, invoice_ids, args.seed)
+        if "slack" in phases:
+            report["slack"] = run_slack_phase(slack, args.messages, args.concurrency, users, args.seed,
+                                              args.redeliver_rate)
+    finally:
+        sys.stdout = sys.__stdout__
+        api_server.should_exit = True
+    report["backend_calls"] = {
+        "postgrest": dict(sorted(postgrest.counts.items())),
+        "gemini": dict(gemini.counts),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
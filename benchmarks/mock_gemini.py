@@ -0,0 +1,212 @@
+"""
+Local stand-in for Gemini's generateContent API, with replayable replies.
+
+Point the bot at it with
+GEMINI_API_URL=http://127.0.0.1:8089/v1beta/models/mock:generateContent.
+
+Replies are either synthetic or replayed:
+
+- Synthetic replies are drawn from a seeded RNG, one stream per call kind
+  (intent / format), so the same seed yields the same sequence of replies.
+  Free-text requests get a mix of clean JSON, fenced JSON and the usual
+  ways free text breaks a JSON parser: prose around a fence, a prose
+  preamble, truncation, Python-style quoting. Requests carrying a
+  responseSchema get syntactically valid JSON, as Gemini's constrained
+  decoding guarantees, but occasionally of the wrong shape.
+- `--replay FILE` serves the `text` of each JSONL line in order, per kind,
+  instead, e.g. a file of captured real replies. `--record FILE` appends
+  every reply served, so any run can be replayed exactly.
+
+cachedContents requests are rejected the way Gemini rejects prompts below
+the caching minimum.
+
+Transport faults are injected from a separate seeded RNG, so they don't shift
+the reply stream: `--error-rate` answers that share of requests with a 503,
+and `--slow-rate` / `--slow-ms` add a slow tail on top of `--latency-ms`.
+`server.faults` holds the live settings, so a benchmark can start and end an
+outage mid-run; setting `slow_next` makes exactly that many upcoming requests
+slow, for tests that need one particular request to lag.
+
+    python -m benchmarks.mock_gemini --port 8089 --seed 1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import cycle
+
+INTENTS = [
+    {"action": "get_summary", "params": {}},
+    {"action": "get_summary", "params": {"status": ["Overdue"]}},
+    {"action": "search_invoices", "params": {"status": ["Draft"]}},
+    {"action": "search_invoices", "params": {"customer_name": "ACME"}},
+    {"action": "get_invoice", "params": {"invoice_id": "INV-2026-0000001"}},
+    {"action": "get_invoices", "params": {"invoice_ids": ["INV-2026-0000001", "INV-2026-0000002"]}},
+    {"action": "update_invoice_status", "params": {"invoice_id": "INV-2026-0000001", "status": ["Paid"]}},
+]
+FORMATS = [
+    {"plain_text": "You have 12 overdue invoices totalling 48,210.50 USD.", "list": [], "error": False},
+    {"plain_text": "Here are the matching invoices.", "list": ["INV-2026-0000001 · ACME Corp. · 1,200.00 USD · Sent"], "error": False},
+    {"plain_text": "Invoice INV-2026-0000001 is now Paid.", "list": [], "error": False},
+]
+# Wrong-shaped but well-formed JSON, for schema-constrained requests
+SCHEMA_VIOLATIONS = {
+    "intent": [{"action": "get_status", "params": {}}, {"params": {"status": "Paid"}}],
+    "format": [{"text": "Here you go."}, {"plain_text": "Done.", "list": "INV-1"}],
+}
+
+
+def free_text(payload, rng, fault_rate):
+    """`payload` as a free-text model might write it"""
+    body = json.dumps(payload)
+    if rng.random() >= fault_rate:
+        return rng.choice([body, f"```json\n{body}\n```", f"```\n{json.dumps(payload, indent=2)}\n```"])
+    fault = rng.choice(["fence_with_prose", "preamble", "truncated", "python_quotes"])
+    if fault == "fence_with_prose":
+        return f"```json\n{body}\n```\nLet me know if you need anything else."
+    if fault == "preamble":
+        return f"Sure! Here is the JSON:\n{body}"
+    if fault == "truncated":
+        return body[:int(len(body) * 0.7)]
+    return str(payload)
+
+
+class ReplySource:
+    def __init__(self, seed=1, text_fault_rate=0.12, json_fault_rate=0.03, replay=None, record=None):
+        self.text_fault_rate = text_fault_rate
+        self.json_fault_rate = json_fault_rate
+        self._rngs = {}
+        self._seed = seed
+        self._replay = None
+        if replay:
+            by_kind = defaultdict(list)
+            with open(replay) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        by_kind[entry["kind"]].append(entry["text"])
+            self._replay = {kind: cycle(texts) for kind, texts in by_kind.items()}
+        self._record = open(record, "a") if record else None
+        self._lock = threading.Lock()
+
+    def _rng(self, kind):
+        if kind not in self._rngs:
+            self._rngs[kind] = random.Random(f"{self._seed}-{kind}")
+        return self._rngs[kind]
+
+    def next(self, kind, structured):
+        with self._lock:
+            if self._replay is not None:
+                text = next(self._replay[kind])
+            else:
+                rng = self._rng(kind)
+                payload = rng.choice(INTENTS if kind == "intent" else FORMATS)
+                if not structured:
+                    text = free_text(payload, rng, self.text_fault_rate)
+                elif rng.random() < self.json_fault_rate:
+                    text = json.dumps(rng.choice(SCHEMA_VIOLATIONS[kind]))
+                else:
+                    text = json.dumps(payload)
+            if self._record:
+                self._record.write(json.dumps({"kind": kind, "structured": structured, "text": text}) + "\n")
+                self._record.flush()
+            return text
+
+
+def request_kind(body):
+    schema = (body.get("generationConfig") or {}).get("responseSchema") or {}
+    if "action" in schema.get("properties", {}):
+        return "intent"
+    if schema:
+        return "format"
+    system = " ".join(p.get("text", "") for p in (body.get("systemInstruction") or {}).get("parts", []))
+    prompt = " ".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    return "format" if "formats invoice data" in system or "API Response:" in prompt else "intent"
+
+
+def make_server(port=0, latency_ms=0.0, error_rate=0.0, slow_rate=0.0, slow_ms=0.0, fault_seed=1, **source_options):
+    source = ReplySource(**source_options)
+    counts = defaultdict(int)
+    faults = {"latency_ms": latency_ms, "error_rate": error_rate, "slow_rate": slow_rate, "slow_ms": slow_ms, "slow_next": 0}
+    fault_rng = random.Random(f"{fault_seed}-faults")
+    fault_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.split("?")[0].endswith("/cachedContents"):
+                counts["cache_rejected"] += 1
+                self._send(400, {"error": {"code": 400, "message": "Cached content is too small.", "status": "INVALID_ARGUMENT"}})
+                return
+            with fault_lock:
+                fail = fault_rng.random() < faults["error_rate"]
+                slow = fault_rng.random() < faults["slow_rate"]
+                if faults["slow_next"] > 0:
+                    faults["slow_next"] -= 1
+                    slow = True
+            delay = faults["latency_ms"] + (faults["slow_ms"] if slow else 0)
+            counts["slow"] += slow
+            if delay:
+                time.sleep(delay / 1000)
+            if fail:
+                counts["errors"] += 1
+                self._send(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+                return
+            kind = request_kind(body)
+            structured = "responseSchema" in (body.get("generationConfig") or {})
+            counts[f"{kind}_{'json' if structured else 'text'}"] += 1
+            text = source.next(kind, structured)
+            prompt_chars = len(json.dumps(body.get("contents", []))) + len(json.dumps(body.get("systemInstruction", "")))
+            self._send(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_chars // 4,
+                    "candidatesTokenCount": len(text) // 4,
+                    "totalTokenCount": (prompt_chars + len(text)) // 4,
+                },
+            })
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.counts = counts
+    server.faults = faults
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--text-fault-rate", type=float, default=0.12)
+    parser.add_argument("--json-fault-rate", type=float, default=0.03)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--slow-rate", type=float, default=0)
+    parser.add_argument("--slow-ms", type=float, default=0)
+    parser.add_argument("--replay")
+    parser.add_argument("--record")
+    args = parser.parse_args()
+    server = make_server(
+        args.port, args.latency_ms, args.error_rate, args.slow_rate, args.slow_ms, seed=args.seed, text_fault_rate=args.text_fault_rate,
+        json_fault_rate=args.json_fault_rate, replay=args.replay, record=args.record
+    )
+    print(f"Mock Gemini on http://127.0.0.1:{args.port}/v1beta/models/mock:generateContent")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+-- Invoices table and the indexes behind DatabaseClient's filters.
+-- Every statement is idempotent, so this is safe to run against the existing
+-- Supabase project as well as a fresh Postgres database.
+
+CREATE TABLE IF NOT EXISTS invoices (
+    id BIGSERIAL PRIMARY KEY,
+    invoice_id TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'USD',
+    status TEXT NOT NULL DEFAULT 'Draft',
+    company_id TEXT,
+    type TEXT NOT NULL DEFAULT 'RECEIVABLE',
+    issue_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    line_items JSONB NOT NULL DEFAULT '[]'::jsonb,
+    notes TEXT,
+    created_by_user_id TEXT,
+    last_updated TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS invoices_invoice_id_idx ON invoices (invoice_id);
+CREATE INDEX IF NOT EXISTS invoices_status_idx ON invoices (status);
+CREATE INDEX IF NOT EXISTS invoices_due_date_idx ON invoices (due_date);
+CREATE INDEX IF NOT EXISTS invoices_customer_name_idx ON invoices (customer_name);
+CREATE INDEX IF NOT EXISTS invoices_created_by_user_id_idx ON invoices (created_by_user_id);
+CREATE INDEX IF NOT EXISTS invoices_last_updated_idx ON invoices (last_updated DESC);
@@ -0,0 +1,52 @@
+-- Trigram search over customer names.
+--
+-- invoices_customer_name_trgm_idx lets `customer_name ILIKE '%...%'` use an
+-- index instead of a sequential scan. Fuzzy lookups go through the much
+-- smaller invoice_customers table (one row per distinct name, maintained by
+-- trigger); callers then filter invoices with `customer_name IN (...)`,
+-- which hits the btree index from 001.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS invoices_customer_name_trgm_idx
+    ON invoices USING gin (customer_name gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS invoice_customers (
+    customer_name TEXT PRIMARY KEY
+);
+
+INSERT INTO invoice_customers (customer_name)
+    SELECT DISTINCT customer_name FROM invoices
+    ON CONFLICT DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS invoice_customers_trgm_idx
+    ON invoice_customers USING gin (customer_name gin_trgm_ops);
+
+CREATE OR REPLACE FUNCTION track_invoice_customer() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO invoice_customers (customer_name) VALUES (NEW.customer_name)
+        ON CONFLICT DO NOTHING;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS invoices_track_customer ON invoices;
+CREATE TRIGGER invoices_track_customer
+    AFTER INSERT OR UPDATE OF customer_name ON invoices
+    FOR EACH ROW EXECUTE FUNCTION track_invoice_customer();
+
+-- Exposed to PostgREST as rpc/search_customers
+CREATE OR REPLACE FUNCTION search_customers(query TEXT, max_results INT DEFAULT 20)
+RETURNS TABLE (customer_name TEXT, score REAL)
+LANGUAGE sql STABLE
+SET pg_trgm.word_similarity_threshold = 0.5
+AS $$
+    SELECT c.customer_name,
+           CASE WHEN c.customer_name ILIKE '%' || query || '%' THEN 1.0
+                ELSE word_similarity(query, c.customer_name) END::REAL AS score
+    FROM invoice_customers c
+    WHERE c.customer_name ILIKE '%' || query || '%' OR query <% c.customer_name
+    ORDER BY score DESC, c.customer_name
+    LIMIT max_results;
+$$;
@@ -0,0 +1,9 @@
+-- Exchange rates used to report invoice totals in a single currency.
+-- `rate` is units of the base currency (FX_BASE_CURRENCY, USD by default)
+-- per one unit of `currency`; the base currency itself needs no row.
+
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency TEXT PRIMARY KEY,
+    rate NUMERIC(18, 8) NOT NULL CHECK (rate > 0),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,4 @@
+-- Partial index for the overdue scheduler's bulk update:
+-- UPDATE invoices SET status = 'Overdue' WHERE status = 'Sent' AND due_date < today
+
+CREATE INDEX IF NOT EXISTS invoices_sent_due_date_idx ON invoices (due_date) WHERE status = 'Sent';
@@ -0,0 +1,9 @@
+-- Users who opted in to scheduled invoice digests (managed with /digest).
+
+CREATE TABLE IF NOT EXISTS digest_subscriptions (
+    slack_user_id TEXT PRIMARY KEY,
+    frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly')),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS digest_subscriptions_frequency_idx ON digest_subscriptions (frequency, slack_user_id);
@@ -0,0 +1,15 @@
+-- Bump last_updated on every UPDATE, whoever makes it, so the API server's
+-- invoice replica (INVOICE_REPLICA=1) picks the change up from its
+-- `last_updated >= watermark` poll.
+
+CREATE OR REPLACE FUNCTION invoices_touch_last_updated() RETURNS trigger AS $$
+BEGIN
+    NEW.last_updated := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS invoices_touch_last_updated ON invoices;
+CREATE TRIGGER invoices_touch_last_updated
+    BEFORE UPDATE ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoices_touch_last_updated();
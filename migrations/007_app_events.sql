@@ -0,0 +1,19 @@
+-- Feedback, status-change audit entries and query telemetry, written in
+-- batches by the API server's and the bot's event recorders (events.py).
+-- event_id is generated by the recorder, so a batch replayed from the local
+-- spool after a failed flush is inserted at most once.
+
+CREATE TABLE IF NOT EXISTS app_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    occurred_at TIMESTAMPTZ NOT NULL,
+    slack_user_id TEXT,
+    subject TEXT,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    source TEXT NOT NULL DEFAULT 'api',
+    recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS app_events_kind_occurred_at_idx ON app_events (kind, occurred_at DESC);
+CREATE INDEX IF NOT EXISTS app_events_subject_idx ON app_events (subject) WHERE subject IS NOT NULL;
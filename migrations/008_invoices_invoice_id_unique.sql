@@ -0,0 +1,11 @@
+-- invoice_id is the key every reader addresses an invoice by (lookups,
+-- status updates, the summary rollups, re-imports of an export), so make it
+-- unique. Inserts use ON CONFLICT (invoice_id) DO NOTHING and report the
+-- rows they skipped.
+--
+-- Creating the index fails if duplicates already exist. List them with
+--   SELECT invoice_id, count(*) FROM invoices GROUP BY invoice_id HAVING count(*) > 1;
+-- and resolve them before applying this migration.
+
+CREATE UNIQUE INDEX IF NOT EXISTS invoices_invoice_id_key ON invoices (invoice_id);
+DROP INDEX IF EXISTS invoices_invoice_id_idx;
@@ -0,0 +1,14 @@
+-- One row per scheduled digest run (slack_bot/digest.py). A bot process
+-- claims a run by inserting its row with ON CONFLICT DO NOTHING before it
+-- sends anything, so with several bot replicas each run goes out once, and a
+-- bot that was down at the scheduled hour finds the missing row and catches up.
+
+CREATE TABLE IF NOT EXISTS digest_runs (
+    frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly')),
+    run_date DATE NOT NULL,
+    claimed_by TEXT NOT NULL,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    sent INTEGER,
+    PRIMARY KEY (frequency, run_date)
+);
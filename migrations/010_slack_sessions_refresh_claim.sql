@@ -0,0 +1,9 @@
+-- Lets one process at a time refresh a Slack session's tokens
+-- (api_server/sessions.py). Supabase Auth rotates refresh tokens, so two
+-- processes refreshing the same session at once leave one of them holding a
+-- revoked token and log the user out. A process claims the row by setting
+-- refresh_claimed_until (epoch seconds) with an update conditioned on the
+-- current refresh_token and an expired claim, and only the winner refreshes.
+-- slack_sessions itself is created by the Supabase project setup.
+
+ALTER TABLE IF EXISTS slack_sessions ADD COLUMN IF NOT EXISTS refresh_claimed_until BIGINT NOT NULL DEFAULT 0;
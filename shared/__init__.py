@@ -0,0 +1,3 @@
+"""
+Code shared by the API server and the Slack bot
+"""
@@ -0,0 +1,258 @@
+"""
+Buffered, batched recording of app_events rows, shared by the API server
+(api_server/events.py) and the bot (slack_bot/events.py).
+
+Each process builds an EventRecorder with its own writer (the storage
+backend, or Supabase for the bot), metrics registry and `source`.
+`record()` only appends to an in-memory buffer, so handlers never wait on
+the database. A flusher thread drains the buffer into app_events
+(migrations/007_app_events.sql) in batched inserts, every
+EVENTS_FLUSH_SECONDS or as soon as EVENTS_BATCH_SIZE events are waiting.
+
+When a flush fails the batch, and anything buffered behind it, is appended
+to an NDJSON spool file instead, and writes back off (doubling up to
+EVENTS_RETRY_MAX_SECONDS). Spooled events are replayed after the next
+successful write; each carries an event_id and inserts skip ids already
+stored, so a partly written batch can simply be replayed. Stopping the
+recorder flushes (or spools) whatever is left. The spool file is named
+after `source`, so the API server and the bot never share one even when
+they read the same .env.
+
+Backpressure: the buffer holds at most EVENTS_BUFFER_SIZE events. Sheddable
+kinds (query telemetry by default) are given up once it is 80% full,
+keeping the rest for audit and feedback events, which are only refused when
+it is full. Shed events are counted under events.dropped.<kind>. The spool
+stops growing at EVENTS_SPOOL_MAX_MB.
+
+Settings:
+    EVENTS_BUFFER_SIZE        events held in memory (default 10000)
+    EVENTS_BATCH_SIZE         events per insert (default 500)
+    EVENTS_FLUSH_SECONDS      longest an event waits in the buffer (default 2)
+    EVENTS_RETRY_MAX_SECONDS  longest backoff after a failed write (default 60)
+    EVENTS_SPOOL_DIR          spool directory, holding <source>-events.ndjson (default ./spool)
+    EVENTS_SPOOL_MAX_MB       spool size past which batches are dropped (default 100)
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Collection, Deque, Dict, Iterator, List, Optional, Sequence
+
+import orjson
+
+# Kinds written by the API server and the bot
+AUDIT = "audit"
+FEEDBACK = "feedback"
+QUERY = "query"
+
+# Telemetry is given up first when the buffer fills
+SHEDDABLE_KINDS = frozenset({QUERY})
+SHED_FRACTION = 0.8
+
+Event = Dict[str, Any]
+Writer = Callable[[Sequence[Event]], int]
+
+
+class EventRecorder:
+    def __init__(self,
+                 writer: Writer,
+                 metrics: Any,
+                 source: str,
+                 sheddable: Collection[str] = SHEDDABLE_KINDS,
+                 capacity: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 flush_seconds: Optional[float] = None,
+                 spool_path: Optional[str] = None,
+                 spool_max_mb: Optional[float] = None,
+                 retry_max_seconds: Optional[float] = None):
+        self.writer = writer
+        self.metrics = metrics
+        self.source = source
+        self.sheddable = frozenset(sheddable)
+        self.capacity = int(capacity if capacity is not None else os.getenv("EVENTS_BUFFER_SIZE", 10000))
+        self.batch_size = int(batch_size if batch_size is not None else os.getenv("EVENTS_BATCH_SIZE", 500))
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None else os.getenv("EVENTS_FLUSH_SECONDS", 2))
+        self.spool_path = spool_path or os.path.join(os.getenv("EVENTS_SPOOL_DIR", "spool"), f"{source}-events.ndjson")
+        self.spool_max_bytes = float(
+            spool_max_mb if spool_max_mb is not None else os.getenv("EVENTS_SPOOL_MAX_MB", 100)
+        ) * 2**20
+        self.retry_max_seconds = float(
+            retry_max_seconds if retry_max_seconds is not None else os.getenv("EVENTS_RETRY_MAX_SECONDS", 60)
+        )
+        self._shed_at = int(self.capacity * SHED_FRACTION)
+        self._buffer: Deque[Event] = deque()
+        self._lock = threading.Lock()
+        # Only the flusher thread (or stop(), after joining it) writes and touches the spool
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._retry_at = 0.0
+        self._backoff = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def record(self,
+               kind: str,
+               payload: Optional[Dict[str, Any]] = None,
+               slack_user_id: Optional[str] = None,
+               subject: Optional[str] = None) -> bool:
+        """Buffer one event; False if it was shed because the buffer is full"""
+        event = {
+            "event_id": uuid.uuid4().hex,
+            "kind": kind,
+            "occurred_at": datetime.now(timezone.utc).isoformat(),
+            "slack_user_id": slack_user_id,
+            "subject": subject,
+            "payload": payload or {},
+            "source": self.source,
+        }
+        limit = self._shed_at if kind in self.sheddable else self.capacity
+        with self._lock:
+            size = len(self._buffer)
+            if size < limit:
+                self._buffer.append(event)
+                size += 1
+            else:
+                size = -1
+        if size < 0:
+            self.metrics.incr(f"events.dropped.{kind}")
+            return False
+        if size >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _take(self, n: int) -> List[Event]:
+        with self._lock:
+            return [self._buffer.popleft() for _ in range(min(n, len(self._buffer)))]
+
+    # --- Writing ---
+
+    def _write(self, batch: Sequence[Event]) -> bool:
+        start = time.perf_counter()
+        try:
+            self.writer(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} events: {e}")
+            self.metrics.incr("events.write_errors")
+            self._backoff = min(max(self._backoff * 2, 1.0), self.retry_max_seconds)
+            self._retry_at = time.monotonic() + self._backoff
+            return False
+        finally:
+            self.metrics.observe("events.write_seconds", time.perf_counter() - start)
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.metrics.incr("events.written", len(batch))
+        return True
+
+    def flush(self) -> int:
+        """Write what is buffered, then replay the spool; returns events written"""
+        with self._flush_lock:
+            written = 0
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    break
+                # While backing off, go straight to the spool rather than wait on a dead database
+                if time.monotonic() >= self._retry_at and self._write(batch):
+                    written += len(batch)
+                else:
+                    self._spool(batch)
+            if time.monotonic() >= self._retry_at:
+                written += self._replay()
+            self.metrics.gauge("events.buffered", len(self._buffer))
+            return written
+
+    # --- Spool ---
+
+    def _spool(self, batch: Sequence[Event]) -> None:
+        try:
+            if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) >= self.spool_max_bytes:
+                print(f"Event spool {self.spool_path} is full; dropping {len(batch)} events")
+                self.metrics.incr("events.dropped.spool_full", len(batch))
+                return
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, "ab") as f:
+                f.write(b"".join(orjson.dumps(event) + b"\n" for event in batch))
+                f.flush()
+                os.fsync(f.fileno())
+            self.metrics.incr("events.spooled", len(batch))
+        except OSError as e:
+            print(f"Error spooling {len(batch)} events: {e}")
+            self.metrics.incr("events.dropped.spool_error", len(batch))
+
+    def _spooled_batches(self, path: str) -> Iterator[List[Event]]:
+        batch: List[Event] = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    batch.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    # A line cut short by a crash mid-append
+                    self.metrics.incr("events.spool_corrupt")
+                    continue
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _replay(self) -> int:
+        # Replay from a renamed copy so failures meanwhile start a fresh spool
+        replaying = self.spool_path + ".replay"
+        written = 0
+        try:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spool_path):
+                    return 0
+                os.replace(self.spool_path, replaying)
+            for batch in self._spooled_batches(replaying):
+                if not self._write(batch):
+                    # Already-written events are skipped by event_id next time
+                    return written
+                written += len(batch)
+            os.remove(replaying)
+        except OSError as e:
+            print(f"Error replaying event spool: {e}")
+            return written
+        self.metrics.incr("events.replayed", written)
+        return written + self._replay()
+
+    # --- Flusher thread ---
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing events: {e}")
+                self.metrics.incr("events.flush_errors")
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="event-recorder", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stop the flusher and write (or spool) everything still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        # A failed final write shouldn't wait out the backoff
+        self._retry_at = 0.0
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing events on shutdown: {e}")
@@ -0,0 +1,112 @@
+"""
+HTTP calls from the bot to the Invoice API server.
+
+Responses are decoded with orjson straight from the body bytes, and a shared
+requests.Session keeps connections to the API server alive between calls.
+GET responses carrying an ETag are remembered, and repeat requests are sent
+with If-None-Match so a 304 reuses the cached body.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import orjson
+import requests
+
+session = requests.Session()
+
+
+class ConditionalCache:
+    """Bounded LRU of (etag, decoded body) keyed by request URL and params"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, body):
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+conditional_cache = ConditionalCache()
+
+
+def decode(response):
+    return orjson.loads(response.content)
+
+
+def api_request(method, path, error_msg, params=None, json=None):
+    """Call the API server; HTTP errors come back as {"error": ...}"""
+    if params:
+        params = {k: v for k, v in params.items() if v is not None}
+    # Read per call: slack_app only loads .env after importing this module
+    base_url = os.environ.get("API_SERVER_URL", "http://localhost:8000")
+    headers = {}
+    cache_key = cached = None
+    if method == "GET":
+        # Lists (repeated params such as status) become tuples so the key is hashable
+        cache_key = (path, tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in (params or {}).items())))
+        cached = conditional_cache.get(cache_key)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+    r = session.request(method, f"{base_url}{path}", params=params, json=json, headers=headers)
+    if r.status_code == 304 and cached:
+        conditional_cache.hits += 1
+        return cached[1]
+    try:
+        r.raise_for_status()
+        body = decode(r)
+        if cache_key and r.headers.get("ETag"):
+            conditional_cache.put(cache_key, r.headers["ETag"], body)
+        return body
+    except requests.HTTPError:
+        try:
+            body = decode(r)
+            return {"error": body.get("error") or body.get("detail") or error_msg}
+        except Exception:
+            return {"error": error_msg}
+
+
+def run_action(action, user):
+    """Execute an action parsed from Gemini's intent response"""
+    params = action['params']
+    if action['action'] == 'get_invoice':
+        invoice_id = params.get('invoice_id')
+        return api_request(
+            "GET", f"/api/invoices/{invoice_id}", "Invoice not found.",
+            params={"user_id": params.get('user_id', user)}
+        )
+    if action['action'] == 'get_invoices':
+        return api_request(
+            "POST", "/api/invoices/batch-get", "Could not get invoices.",
+            json={"invoice_ids": params.get('invoice_ids') or [], "user_id": params.get('user_id', user)}
+        )
+    if action['action'] == 'update_invoice_status':
+        invoice_id = params.get('invoice_id')
+        status = params.get('status') or []
+        if isinstance(status, str):
+            status = [status]
+        if len(status) != 1:
+            return {"error": "Pick exactly one status to set."}
+        return api_request(
+            "PUT", f"/api/invoices/{invoice_id}/status", "Failed to update invoice status.",
+            params={"user_id": params.get('user_id', user)},
+            json={"status": status[0]}
+        )
+    if action['action'] == 'get_summary':
+        return api_request("GET", "/api/invoices/summary", "Could not get summary.", params=params)
+    if action['action'] == 'search_invoices':
+        return api_request("GET", "/api/invoices/search", "Could not search invoices.", params=params)
+    return {"error": "Unknown action."}
@@ -0,0 +1,50 @@
+"""
+Shrink API results before they are embedded in the formatting prompt.
+
+The formatter only needs what it can show in a Slack reply. Full line_items,
+database ids and timestamps are dropped, empty fields are removed, long notes
+are cut, and lists are capped with a count of what was left out.
+"""
+
+from tokens import truncate_to_tokens
+
+# Matches the search endpoint's largest page, so listed invoices are never hidden
+MAX_LIST_ITEMS = 50
+NOTE_TOKENS = 30
+DROPPED_FIELDS = ("id", "company_id", "last_updated", "created_by_user_id")
+
+
+def compact_invoice(invoice):
+    compacted = {}
+    for key, value in invoice.items():
+        if key in DROPPED_FIELDS or value in (None, "", []):
+            continue
+        if key == "line_items":
+            compacted["line_item_count"] = len(value) if isinstance(value, list) else 1
+        elif key == "notes" and isinstance(value, str):
+            compacted["notes"] = truncate_to_tokens(value, NOTE_TOKENS)
+        else:
+            compacted[key] = value
+    return compacted
+
+
+def compact_list(items, max_items=MAX_LIST_ITEMS):
+    shown = [compact_value(item) for item in items[:max_items]]
+    if len(items) > max_items:
+        shown.append({"more": len(items) - max_items})
+    return shown
+
+
+def compact_value(value):
+    if isinstance(value, dict):
+        if "invoice_id" in value:
+            return compact_invoice(value)
+        return {k: compact_value(v) for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return compact_list(value)
+    return value
+
+
+def compact_result(api_result):
+    """A smaller copy of an API result with everything the formatter uses"""
+    return compact_value(api_result)
@@ -9,23 +9,34 @@ SYSTEM_PROMPT = (
     "1. get_invoice: Get details for a specific invoice.\n"
     "   Params: invoice_id (str), user_id (str, optional)\n"
     "2. update_invoice_status: Update the status of an invoice.\n"
-    "   Params: invoice_id (str), status (str: Draft/Sent/Paid/Overdue/Cancelled), user_id (str, optional)\n"
+    "   Params: invoice_id (str), status (list with exactly one of Draft/Sent/Paid/Overdue/Cancelled), user_id (str, optional)\n"
     "3. get_summary: Get a summary of invoices (for aggregate numbers only, not lists).\n"
-    "   Params: status (str, optional), due_date_before (str, optional), customer_name (str, optional), created_by_user_id (str, optional), invoice_type (str, optional)\n"
+    "   Params: status (list of str, optional: matches any of them), due_date_after (str YYYY-MM-DD, optional), due_date_before (str YYYY-MM-DD, optional), min_amount (number, optional), max_amount (number, optional), customer_name (str, optional), created_by_user_id (str, optional), invoice_type (str: RECEIVABLE/PAYABLE, optional)\n"
     "4. search_invoices: Search for and list invoices matching criteria (for when the user asks for a list of invoices, e.g., 'all invoices with status Draft').\n"
-    "   Params: status (str, optional), due_date_before (str, optional), customer_name (str, optional), created_by_user_id (str, optional), invoice_type (str, optional)\n"
+    "   Params: the get_summary params, plus sort (str, optional: -last_updated (default), due_date, -due_date, amount, -amount, issue_date, -issue_date)\n"
+    "   Date and amount bounds are inclusive. 'Unpaid' invoices are status [\"Sent\", \"Overdue\"].\n"
+    "5. get_invoices: Get details for several specific invoices at once (use this instead of get_invoice whenever more than one invoice id is mentioned).\n"
+    "   Params: invoice_ids (list of str), user_id (str, optional)\n"
+    "If the prompt includes the conversation so far in this thread, use its last invoice ids and filters to resolve follow-ups such as 'mark it paid' or 'only the overdue ones'.\n"
+    "If the message is not an invoice request, respond with {\"action\": \"none\", \"params\": {}}.\n"
     "Respond in this format:\n"
     '{"action": "search_invoices", "params": { ... }}\n'
     "\n"
     "Examples:\n"
     "User: Give all invoices with status Draft\n"
-    '{"action": "search_invoices", "params": {"status": "Draft"}}\n'
+    '{"action": "search_invoices", "params": {"status": ["Draft"]}}\n'
+    "User: Largest unpaid invoices due before 2024-07-01\n"
+    '{"action": "search_invoices", "params": {"status": ["Sent", "Overdue"], "due_date_before": "2024-07-01", "sort": "-amount"}}\n'
     "User: What is the total outstanding for paid invoices?\n"
-    '{"action": "get_summary", "params": {"status": "Paid"}}\n'
+    '{"action": "get_summary", "params": {"status": ["Paid"]}}\n'
     "User: status of invoice inv-2024-001\n"
     '{"action": "get_invoice", "params": {"invoice_id": "inv-2024-001"}}\n'
     "User: is inv-2024-001 paid?\n"
     '{"action": "get_invoice", "params": {"invoice_id": "inv-2024-001"}}\n'
+    "User: status of INV-2024-001, INV-2024-007 and INV-2024-019\n"
+    '{"action": "get_invoices", "params": {"invoice_ids": ["INV-2024-001", "INV-2024-007", "INV-2024-019"]}}\n'
+    "User (follow-up, last invoice ids: INV-2024-001): mark it paid\n"
+    '{"action": "update_invoice_status", "params": {"invoice_id": "INV-2024-001", "status": ["Paid"]}}\n'
 )
 
 FORMAT_PROMPT = (
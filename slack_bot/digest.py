@@ -0,0 +1,295 @@
+"""
+Scheduled invoice digests sent as DMs to users who opted in.
+
+A run fetches every recipient's InvoiceSummary with one API call (the server
+computes them in a single pass), renders blocks locally with
+formatters.summary_blocks (no Gemini calls), and posts them through a pool of
+workers sharing one token-bucket rate limit. A 429 from Slack pauses every
+worker for the Retry-After period before the message is retried.
+
+Opt-in is stored per user in the digest_subscriptions table
+(migrations/005_digest_subscriptions.sql) and managed with `/digest`.
+
+Every run is recorded in digest_runs (migrations/009_digest_runs.sql) and
+claimed there before the first DM, so with several bot processes each run
+goes out once. At start-up and after every wake-up the scheduler runs any
+scheduled slot from the last DIGEST_CATCH_UP_HOURS that has no row yet, so a
+bot that was down or restarting at the digest hour sends it late rather than
+not at all. A run that fails (its subscribers or summaries could not be
+fetched, or it raised) gives its claim back and is retried after
+RETRY_SECONDS.
+
+Settings:
+    DIGEST_HOUR_UTC           hour of day digests go out (default 9)
+    DIGEST_WEEKDAY            day weekly digests go out, 0 = Monday (default 0)
+    DIGEST_CATCH_UP_HOURS     how late a missed run is still sent (default 12)
+    DIGEST_RATE_PER_SECOND    DM rate across all workers (default 20)
+    DIGEST_WORKERS            concurrent chat.postMessage calls (default 8)
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from slack_sdk.errors import SlackApiError
+
+from api_client import api_request
+from formatters import summary_blocks
+from metrics import metrics
+from supabase_helpers import get_supabase
+
+FREQUENCIES = ("daily", "weekly")
+SUBSCRIPTIONS_TABLE = "digest_subscriptions"
+RUNS_TABLE = "digest_runs"
+MAX_ATTEMPTS = 3
+# Wait before trying again after a run failed or couldn't be claimed
+RETRY_SECONDS = 300
+# Recorded with each claim, to tell which process sent a run
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- Opt-in / opt-out ---
+
+def set_digest_frequency(slack_user_id, frequency):
+    """Subscribe a user to daily/weekly digests, or unsubscribe with None"""
+    table = get_supabase().table(SUBSCRIPTIONS_TABLE)
+    if frequency is None:
+        table.delete().eq("slack_user_id", slack_user_id).execute()
+        return
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown digest frequency: {frequency}")
+    table.upsert({
+        "slack_user_id": slack_user_id,
+        "frequency": frequency,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }).execute()
+
+
+def get_subscribers(frequency, page_size=1000):
+    """Slack user ids subscribed at `frequency`, read in pages"""
+    table = get_supabase().table(SUBSCRIPTIONS_TABLE)
+    users, offset = [], 0
+    while True:
+        rows = (
+            table.select("slack_user_id")
+            .eq("frequency", frequency)
+            .order("slack_user_id")
+            .range(offset, offset + page_size - 1)
+            .execute()
+            .data
+        )
+        users.extend(row["slack_user_id"] for row in rows)
+        if len(rows) < page_size:
+            return users
+        offset += page_size
+
+
+# --- Run records ---
+
+def claim_run(frequency, run_date):
+    """Record that this process sends `frequency` digests for `run_date`;
+    False if that run was already claimed (here or by another process)"""
+    rows = get_supabase().table(RUNS_TABLE).upsert(
+        {
+            "frequency": frequency,
+            "run_date": run_date.isoformat(),
+            "claimed_by": WORKER_ID,
+            "claimed_at": datetime.now(timezone.utc).isoformat()
+        },
+        on_conflict="frequency,run_date",
+        ignore_duplicates=True
+    ).execute().data
+    return bool(rows)
+
+
+def finish_run(frequency, run_date, sent):
+    get_supabase().table(RUNS_TABLE).update({
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "sent": sent
+    }).eq("frequency", frequency).eq("run_date", run_date.isoformat()).execute()
+
+
+def release_run(frequency, run_date):
+    """Give a claim back so the run is tried again"""
+    get_supabase().table(RUNS_TABLE).delete().eq("frequency", frequency).eq("run_date", run_date.isoformat()).execute()
+
+
+# --- Fan-out ---
+
+class RateLimiter:
+    """Token bucket shared by all fan-out workers"""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (Slack's Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._updated = self._paused_until
+
+
+def post_dm(client, limiter, user_id, blocks, text):
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        try:
+            client.chat_postMessage(channel=user_id, blocks=blocks, text=text)
+            metrics.incr("digest.sent")
+            return True
+        except SlackApiError as e:
+            if e.response.status_code == 429 and attempt < MAX_ATTEMPTS - 1:
+                metrics.incr("digest.rate_limited")
+                limiter.pause(float(e.response.headers.get("Retry-After", 1)))
+                continue
+            print(f"Error sending digest to {user_id}: {e}")
+            break
+        except Exception as e:
+            print(f"Error sending digest to {user_id}: {e}")
+            break
+    metrics.incr("digest.failed")
+    return False
+
+
+def fan_out(client, messages, rate_per_second=None, workers=None):
+    """Post (user_id, blocks, text) messages; returns how many were sent"""
+    rate = float(rate_per_second or os.getenv("DIGEST_RATE_PER_SECOND", 20))
+    workers = int(workers or os.getenv("DIGEST_WORKERS", 8))
+    limiter = RateLimiter(rate)
+    with metrics.timer("digest.fanout_seconds"):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest") as pool:
+            results = list(pool.map(lambda m: post_dm(client, limiter, *m), messages))
+    return sum(results)
+
+
+# --- Digest run ---
+
+def build_messages(summaries, heading):
+    """Render each user's summary locally; users without invoices are skipped"""
+    messages = []
+    with metrics.timer("digest.render_seconds"):
+        for user_id, summary in summaries.items():
+            if not summary.get("total_invoices"):
+                metrics.incr("digest.skipped")
+                continue
+            blocks = summary_blocks(summary, heading)
+            messages.append((user_id, blocks, heading))
+    return messages
+
+
+def run_digest(client, frequency, recipients=None):
+    """Send one round of digests; returns how many DMs went out, or None if
+    the summaries couldn't be fetched (nothing was sent)"""
+    with metrics.timer("digest.run_seconds"):
+        if recipients is None:
+            recipients = get_subscribers(frequency)
+        if not recipients:
+            return 0
+        with metrics.timer("digest.summaries_seconds"):
+            result = api_request(
+                "POST", "/api/invoices/summaries", "Could not get summaries.",
+                json={"user_ids": recipients}
+            )
+        if "error" in result:
+            print(f"Digest run failed: {result['error']}")
+            metrics.incr("digest.errors")
+            return None
+        heading = "Your daily invoice digest" if frequency == "daily" else "Your weekly invoice digest"
+        sent = fan_out(client, build_messages(result["summaries"], heading))
+    print(f"Digest ({frequency}): sent {sent} of {len(recipients)}; {metrics.snapshot()['timings']}")
+    return sent
+
+
+class DigestScheduler:
+    """Runs daily digests every day and weekly digests on DIGEST_WEEKDAY"""
+
+    def __init__(self, client):
+        self.client = client
+        self.hour = int(os.getenv("DIGEST_HOUR_UTC", 9))
+        self.weekday = int(os.getenv("DIGEST_WEEKDAY", 0))
+        self.catch_up = timedelta(hours=float(os.getenv("DIGEST_CATCH_UP_HOURS", 12)))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_run(self, now):
+        run = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+
+    def due_runs(self, now):
+        """(frequency, run date) of each scheduled slot in the catch-up window up to `now`"""
+        last = self.next_run(now) - timedelta(days=1)
+        if now - last > self.catch_up:
+            return []
+        runs = [("daily", last.date())]
+        if last.weekday() == self.weekday:
+            runs.append(("weekly", last.date()))
+        return runs
+
+    def run_due(self, now):
+        """Send every due run no process has claimed yet; False if one failed"""
+        ok = True
+        for frequency, run_date in self.due_runs(now):
+            if not claim_run(frequency, run_date):
+                continue
+            try:
+                sent = run_digest(self.client, frequency)
+            except Exception as e:
+                print(f"Digest run ({frequency}, {run_date}) failed: {e}")
+                metrics.incr("digest.errors")
+                sent = None
+            if sent is None:
+                release_run(frequency, run_date)
+                ok = False
+                continue
+            try:
+                finish_run(frequency, run_date, sent)
+            except Exception as e:
+                # The DMs are out; keep the claim so the run isn't sent twice
+                print(f"Could not record digest run ({frequency}, {run_date}): {e}")
+                metrics.incr("digest.errors")
+        return ok
+
+    def _loop(self):
+        wait = 0
+        while not self._stop.wait(wait):
+            try:
+                ok = self.run_due(datetime.now(timezone.utc))
+            except Exception as e:
+                print(f"Digest run failed: {e}")
+                metrics.incr("digest.errors")
+                ok = False
+            now = datetime.now(timezone.utc)
+            wait = (self.next_run(now) - now).total_seconds()
+            if not ok:
+                wait = min(wait, RETRY_SECONDS)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="digest-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,85 @@
+"""
+Drop Slack events the bot has already seen.
+
+Slack redelivers an event when it doesn't get an ack in time (and after
+Socket Mode reconnects), and a channel message that mentions the bot
+arrives twice, as `message` and as `app_mention`, with different
+event_ids. Each copy would run the whole Gemini + API pipeline and post
+another answer.
+
+An event is a duplicate if its event_id, or the client_msg_id of the user
+message it carries, was seen within SLACK_EVENT_DEDUPE_TTL_SECONDS (default
+600, longer than Slack's retry schedule). Seen keys are kept in a bounded
+TTL set of at most SLACK_EVENT_DEDUPE_MAX_KEYS (default 20000). Retries are
+recognised from the x-slack-retry-num header, which Bolt also sets in Socket
+Mode, and counted. A retry of an event this process never saw, e.g. after
+a restart, is still processed.
+
+Metrics: slack.events.received, slack.events.retries and
+slack.events.duplicates_dropped (plus .retry for dropped retries).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+class TTLSet:
+    def __init__(self, ttl_seconds, max_keys):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, *keys):
+        """Add `keys`; True if none of them was already present"""
+        now = time.monotonic()
+        with self._lock:
+            # Oldest first, so expired keys are all at the front
+            while self._keys and next(iter(self._keys.values())) < now - self.ttl_seconds:
+                self._keys.popitem(last=False)
+            if any(k in self._keys for k in keys):
+                return False
+            for key in keys:
+                self._keys[key] = now
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class EventDeduper:
+    def __init__(self, ttl_seconds=None, max_keys=None):
+        self.seen = TTLSet(
+            float(ttl_seconds or os.getenv("SLACK_EVENT_DEDUPE_TTL_SECONDS", 600)),
+            int(max_keys or os.getenv("SLACK_EVENT_DEDUPE_MAX_KEYS", 20000)),
+        )
+
+    def first_delivery(self, body, headers=None):
+        """False if this event_callback body is a copy of one already handled"""
+        if body.get("type") != "event_callback":
+            return True
+        metrics.incr("slack.events.received")
+        retry_num = int(((headers or {}).get("x-slack-retry-num") or ["0"])[0] or 0)
+        if retry_num:
+            metrics.incr("slack.events.retries")
+        keys = []
+        if body.get("event_id"):
+            keys.append("event:" + body["event_id"])
+        client_msg_id = (body.get("event") or {}).get("client_msg_id")
+        if client_msg_id:
+            keys.append("msg:" + client_msg_id)
+        if not keys or self.seen.add(*keys):
+            return True
+        metrics.incr("slack.events.duplicates_dropped")
+        if retry_num:
+            metrics.incr("slack.events.duplicates_dropped.retry")
+        return False
+
+
+event_deduper = EventDeduper()
@@ -0,0 +1,30 @@
+"""
+Feedback from the helpful / not-helpful buttons, recorded into app_events.
+
+`event_recorder` is shared/event_recorder.py bound to the bot's metrics and
+to Supabase, with events tagged source "bot" and spooled to
+<EVENTS_SPOOL_DIR>/bot-events.ndjson. See that module for buffering,
+spooling, backpressure and settings.
+"""
+
+import os
+import sys
+
+from metrics import metrics
+from supabase_helpers import get_supabase
+
+# The bot runs from slack_bot/; the recorder lives in the repo's shared package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from shared.event_recorder import FEEDBACK, EventRecorder  # noqa: E402
+
+EVENTS_TABLE = "app_events"
+
+
+def write_events(rows):
+    get_supabase().table(EVENTS_TABLE).upsert(rows, on_conflict="event_id", ignore_duplicates=True).execute()
+
+
+event_recorder = EventRecorder(write_events, metrics, "bot")
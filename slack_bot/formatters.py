@@ -0,0 +1,109 @@
+"""
+Slack block rendering done locally, without an LLM round trip.
+
+`render_blocks` is the layout every bot reply uses (summary text, optional
+bullet list, feedback buttons); the Gemini formatter fills it from the model's
+JSON, and the digest, and `result_blocks` when Gemini is unavailable, fill it
+straight from API data.
+"""
+
+
+def _rich_text(text):
+    return {
+        "type": "rich_text",
+        "elements": [{"type": "rich_text_section", "elements": [{"type": "text", "text": text}]}]
+    }
+
+
+def render_blocks(plain_text, items=None, title="Details:", feedback=True):
+    blocks = [{"type": "divider"}]
+    if plain_text:
+        blocks.append(_rich_text(plain_text))
+    if items:
+        blocks.append({
+            "type": "rich_text",
+            "elements": [
+                {"type": "rich_text_section", "elements": [{"type": "text", "text": title}]},
+                {"type": "rich_text_list", "style": "bullet", "indent": 0, "border": 0, "elements": [
+                    {"type": "rich_text_section", "elements": [{"type": "text", "text": item}]} for item in items
+                ]}
+            ]
+        })
+    if feedback:
+        blocks.append({
+            "type": "actions",
+            "elements": [
+                {"type": "button", "text": {"type": "plain_text", "text": "helpful", "emoji": True}, "value": "click_me_123", "action_id": "helpful"},
+                {"type": "button", "text": {"type": "plain_text", "text": "not-helpful", "emoji": True}, "value": "click_me_123", "action_id": "not-helpful"}
+            ]
+        })
+    blocks.append({"type": "divider"})
+    return blocks
+
+
+def error_blocks(text):
+    return render_blocks(text, feedback=False)
+
+
+def format_money(amount, currency=None):
+    return f"{amount:,.2f} {currency}" if currency else f"{amount:,.2f}"
+
+
+def summary_text(summary, heading="Invoice summary"):
+    """One-paragraph digest of an InvoiceSummary dict"""
+    currency = summary.get("reporting_currency")
+    totals = summary.get("totals_by_currency") or {}
+    if currency or len(totals) <= 1:
+        outstanding = format_money(summary.get("total_outstanding", 0), currency or next(iter(totals), None))
+        paid = format_money(summary.get("paid_this_month", 0), currency or next(iter(totals), None))
+    else:
+        # No common currency: list each one rather than a meaningless mixed sum
+        outstanding = ", ".join(format_money(t["outstanding"], c) for c, t in sorted(totals.items()))
+        paid = ", ".join(format_money(t["paid_this_month"], c) for c, t in sorted(totals.items()) if t["paid_this_month"])
+    parts = [f"{heading}: {summary.get('total_invoices', 0)} invoices, {outstanding} outstanding."]
+    if summary.get("overdue_count"):
+        parts.append(f"{summary['overdue_count']} overdue.")
+    if summary.get("draft_count"):
+        parts.append(f"{summary['draft_count']} drafts not yet sent.")
+    if summary.get("paid_this_month"):
+        parts.append(f"{paid} paid this month.")
+    return " ".join(parts)
+
+
+def summary_blocks(summary, heading="Invoice summary", max_items=10):
+    due = [d for d in summary.get("due_this_month") or [] if d.get("status") not in ("Paid", "Cancelled")]
+    items = [
+        f"{d['invoice_id']} · {d['customer_name']} · {format_money(d['amount'], d.get('currency'))} · due {d['due_date']} ({d['status']})"
+        for d in due[:max_items]
+    ]
+    if len(due) > max_items:
+        items.append(f"…and {len(due) - max_items} more")
+    return render_blocks(summary_text(summary, heading), items, title="Due this month:", feedback=False)
+
+
+def invoice_line(invoice):
+    return (
+        f"{invoice['invoice_id']} · {invoice.get('customer_name', '')} · "
+        f"{format_money(invoice.get('amount', 0), invoice.get('currency'))} · {invoice.get('status', '')}"
+    )
+
+
+def result_blocks(api_result, max_items=10):
+    """Plain rendering of an API result, used when Gemini can't format it"""
+    if isinstance(api_result, list):
+        items = [invoice_line(i) for i in api_result[:max_items]]
+        if len(api_result) > max_items:
+            items.append(f"…and {len(api_result) - max_items} more")
+        return render_blocks(f"Found {len(api_result)} invoices." if api_result else "No matching invoices.", items)
+    if not isinstance(api_result, dict):
+        return render_blocks(str(api_result))
+    if "total_invoices" in api_result:
+        return summary_blocks(api_result)
+    if "invoices" in api_result:
+        text = f"Found {len(api_result['invoices'])} invoices."
+        if api_result.get("missing"):
+            text += " Not found: " + ", ".join(api_result["missing"]) + "."
+        return render_blocks(text, [invoice_line(i) for i in api_result["invoices"][:max_items]])
+    if "invoice_id" in api_result and "status" in api_result:
+        return render_blocks(f"Invoice {invoice_line(api_result)}, due {api_result.get('due_date', 'n/a')}.")
+    return render_blocks(api_result.get("message") or "Done.")
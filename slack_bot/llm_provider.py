@@ -0,0 +1,214 @@
+"""
+Resilient transport for Gemini generateContent calls.
+
+- Deadline: every call gives up after GEMINI_DEADLINE_SECONDS (default 10)
+  instead of blocking on a slow or hung connection.
+- Hedging: if the first request hasn't answered by the recent p95 latency,
+  an identical second request is sent and whichever answers first wins.
+  Only the slowest ~5% of calls pay for a duplicate. GEMINI_HEDGE=0 turns it
+  off.
+- Circuit breaker: GEMINI_BREAKER_FAILURES failures (timeouts, 429s, 5xx,
+  connection errors) within GEMINI_BREAKER_WINDOW_SECONDS open the breaker
+  for GEMINI_BREAKER_OPEN_SECONDS. While open, calls fail immediately so the
+  bot can answer from its local fallbacks; afterwards a single trial call
+  decides whether it closes again.
+
+Breaker state, hedges and hedge wins are reported in metrics under llm.*.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import orjson
+import requests
+
+from metrics import metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+BREAKER_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ProviderError(Exception):
+    """Gemini could not produce a reply; callers should fall back"""
+
+
+class CircuitOpenError(ProviderError):
+    pass
+
+
+class DeadlineExceeded(ProviderError):
+    pass
+
+
+class ProviderHTTPError(ProviderError):
+    def __init__(self, status_code, text):
+        super().__init__(f"Gemini API error: {status_code} {text[:200]}")
+        self.status_code = status_code
+        self.text = text
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, window_seconds=30.0, open_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._failures = deque()
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.gauge("llm.breaker_state", BREAKER_STATES[state])
+        if state == OPEN:
+            metrics.incr("llm.breaker_opened")
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                # One trial call at a time decides whether to close again
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._trial_in_flight = False
+            self._failures.clear()
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN:
+                self._opened_at = now
+                self._set_state(OPEN)
+                return
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window_seconds:
+                self._failures.popleft()
+            if self.state == CLOSED and len(self._failures) >= self.failure_threshold:
+                self._opened_at = now
+                self._failures.clear()
+                self._set_state(OPEN)
+
+
+class LatencyTracker:
+    """Rolling p95 of successful call latencies"""
+
+    def __init__(self, size=200, min_samples=20, default_seconds=2.0):
+        self.min_samples = min_samples
+        self.default_seconds = default_seconds
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_seconds
+            ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class GeminiProvider:
+    def __init__(self, session=None, deadline_seconds=None, hedge=None, breaker=None, workers=16):
+        self.session = session or requests.Session()
+        self.deadline_seconds = float(deadline_seconds or os.environ.get("GEMINI_DEADLINE_SECONDS", 10))
+        if hedge is None:
+            hedge = os.environ.get("GEMINI_HEDGE", "1").lower() not in ("0", "false", "no")
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.environ.get("GEMINI_BREAKER_FAILURES", 5)),
+            window_seconds=float(os.environ.get("GEMINI_BREAKER_WINDOW_SECONDS", 30)),
+            open_seconds=float(os.environ.get("GEMINI_BREAKER_OPEN_SECONDS", 30)),
+        )
+        self.latencies = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        self._hedge_stats = {"hedges": 0, "wins": 0}
+        self._stats_lock = threading.Lock()
+
+    def _post(self, url, params, body, timeout):
+        start = time.perf_counter()
+        response = self.session.post(url, params=params, json=body, timeout=max(timeout, 0.01))
+        return response, time.perf_counter() - start
+
+    def _record_hedge(self, won):
+        with self._stats_lock:
+            self._hedge_stats["wins"] += won
+            metrics.gauge("llm.hedge_win_rate", round(self._hedge_stats["wins"] / self._hedge_stats["hedges"], 4))
+        if won:
+            metrics.incr("llm.hedge_wins")
+
+    def generate(self, url, params, body):
+        """POST `body` and return the decoded reply, or raise ProviderError"""
+        if not self.breaker.allow():
+            metrics.incr("llm.short_circuited")
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        start = time.monotonic()
+        deadline = start + self.deadline_seconds
+        hedge_at = start + min(self.latencies.p95(), self.deadline_seconds / 2)
+        futures = {self._pool.submit(self._post, url, params, body, self.deadline_seconds): 0}
+        pending = set(futures)
+        last_error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            waiting_to_hedge = self.hedge and len(futures) == 1
+            timeout = min(deadline, hedge_at) - now if waiting_to_hedge else deadline - now
+            done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            if not done and waiting_to_hedge and time.monotonic() >= hedge_at:
+                metrics.incr("llm.hedges")
+                with self._stats_lock:
+                    self._hedge_stats["hedges"] += 1
+                hedge = self._pool.submit(self._post, url, params, body, deadline - time.monotonic())
+                futures[hedge] = 1
+                pending.add(hedge)
+            for future in done:
+                try:
+                    response, elapsed = future.result()
+                except Exception as e:
+                    last_error = ProviderError(f"Gemini request failed: {e}")
+                    continue
+                if response.status_code == 429 or response.status_code >= 500:
+                    last_error = ProviderHTTPError(response.status_code, response.text)
+                    continue
+                if len(futures) > 1:
+                    self._record_hedge(won=futures[future] == 1)
+                if response.status_code != 200:
+                    # A client error is our request's fault, not an outage
+                    self.breaker.record_success()
+                    raise ProviderHTTPError(response.status_code, response.text)
+                try:
+                    payload = orjson.loads(response.content)
+                except orjson.JSONDecodeError as e:
+                    # A truncated or proxy-mangled body: an outage symptom, so it trips the breaker
+                    metrics.incr("llm.invalid_replies")
+                    last_error = ProviderError(f"Gemini returned invalid JSON: {e}")
+                    continue
+                self.latencies.add(elapsed)
+                self.breaker.record_success()
+                return payload
+        if len(futures) > 1 and last_error is None:
+            self._record_hedge(won=False)
+        self.breaker.record_failure()
+        metrics.incr("llm.failures")
+        if last_error is not None and not pending:
+            raise last_error
+        metrics.incr("llm.deadline_exceeded")
+        raise DeadlineExceeded(f"No reply from Gemini within {self.deadline_seconds:.1f}s")
@@ -0,0 +1,65 @@
+"""
+Keyword intent recognizer used while Gemini is unavailable.
+
+Covers the common requests: looking up invoices by id, marking an invoice
+with a status, summaries ("how much is overdue?") and searches by status or
+customer ("show draft invoices for ACME"). Follow-ups like "mark it paid" use
+the invoice ids from the thread context. Anything else returns None, and the
+bot says it couldn't understand, as it would for a non-invoice message.
+"""
+
+import re
+
+from schemas import STATUSES
+
+INVOICE_ID = re.compile(r"\binv-[a-z0-9]+(?:-[a-z0-9]+)*\b", re.IGNORECASE)
+CONTEXT_IDS = re.compile(r"^Last invoice ids: (.+)$", re.MULTILINE)
+STATUS_WORDS = {
+    "draft": ["Draft"], "drafts": ["Draft"],
+    "sent": ["Sent"], "unpaid": ["Sent", "Overdue"],
+    "paid": ["Paid"],
+    "overdue": ["Overdue"], "late": ["Overdue"], "past due": ["Overdue"],
+    "cancel": ["Cancelled"], "cancelled": ["Cancelled"], "canceled": ["Cancelled"], "void": ["Cancelled"],
+}
+STATUS_PATTERN = re.compile(r"\b(" + "|".join(sorted(STATUS_WORDS, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+UPDATE_PATTERN = re.compile(r"\b(mark|set|change|update|move|cancel|void)\b", re.IGNORECASE)
+SUMMARY_PATTERN = re.compile(r"\b(summary|summarize|total|totals|how much|outstanding|owed|owe)\b", re.IGNORECASE)
+SEARCH_PATTERN = re.compile(r"\b(list|show|find|search|which|all|invoices)\b", re.IGNORECASE)
+CUSTOMER_PATTERN = re.compile(r"\b(?:for|from|to|by|customer)\s+([A-Z0-9][\w&.'-]*(?:\s+[A-Z0-9][\w&.'-]*)*)")
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|that|this|them|those|these)\b", re.IGNORECASE)
+
+
+def _statuses(text):
+    """Every status the text mentions, in order ("draft or unpaid" -> Draft, Sent, Overdue)"""
+    found = [s for word in STATUS_PATTERN.findall(text) for s in STATUS_WORDS[word.lower()]]
+    return list(dict.fromkeys(found))
+
+
+def _context_ids(context):
+    match = CONTEXT_IDS.search(context or "")
+    return [i.strip() for i in match.group(1).split(",") if i.strip()] if match else []
+
+
+def recognize(prompt, context=None):
+    """An action dict like parse_intent's, or None"""
+    ids = list(dict.fromkeys(m.upper() for m in INVOICE_ID.findall(prompt)))
+    if not ids and FOLLOW_UP_PATTERN.search(prompt):
+        ids = _context_ids(context)
+    status = _statuses(prompt)
+    if UPDATE_PATTERN.search(prompt) and len(status) == 1 and len(ids) == 1:
+        return {"action": "update_invoice_status", "params": {"invoice_id": ids[0], "status": status}}
+    if len(ids) == 1:
+        return {"action": "get_invoice", "params": {"invoice_id": ids[0]}}
+    if ids:
+        return {"action": "get_invoices", "params": {"invoice_ids": ids}}
+    params = {}
+    if status:
+        params["status"] = status
+    customer = CUSTOMER_PATTERN.search(prompt)
+    if customer and customer.group(1) not in STATUSES:
+        params["customer_name"] = customer.group(1)
+    if SUMMARY_PATTERN.search(prompt):
+        return {"action": "get_summary", "params": params}
+    if params or SEARCH_PATTERN.search(prompt):
+        return {"action": "search_invoices", "params": params}
+    return None
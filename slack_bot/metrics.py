@@ -0,0 +1,54 @@
+"""
+In-process counters and timings for the bot's background jobs.
+
+Counters only go up; gauges hold the last value set; timings keep count,
+total, max and last duration in seconds. `metrics.snapshot()` returns a
+plain dict for logging.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["last"] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {name: dict(t) for name, t in self._timings.items()},
+            }
+
+
+metrics = Metrics()
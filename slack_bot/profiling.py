@@ -0,0 +1,159 @@
+"""
+Sampling profiler for slow Slack event handlers.
+
+Handlers wrapped with `@profiled` are watched while they run. One that is
+still running after SLACK_PROFILE_SLOW_MS, or any handler for a user listed
+in SLACK_PROFILE_USERS, has its thread's stack sampled every
+PROFILE_INTERVAL_MS by a single sampler thread. Each listener runs on its
+own pool thread, so a profile only contains that event's work (the Gemini
+call, the API request, formatting and Slack calls).
+
+Profiles are collapsed stacks ("caller;callee count" per line, for
+flamegraph.pl or speedscope) named bot-<time>-<id>-<ms>ms-<handler>.folded
+in PROFILE_DIR, keeping the newest PROFILE_KEEP. Point PROFILE_DIR at the
+API server's directory to list and download them from /api/profiles (with
+the server's PROFILE_ADMIN_TOKEN).
+
+With neither setting the decorator is a plain call.
+
+Settings:
+    SLACK_PROFILE_SLOW_MS  profile handlers running longer than this (default 0, off)
+    SLACK_PROFILE_USERS    comma-separated Slack user ids to always profile
+    PROFILE_INTERVAL_MS    sampling interval (default 5)
+    PROFILE_DIR            where profiles are written (default ./profiles)
+    PROFILE_KEEP           profiles kept (default 50)
+"""
+
+import glob
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+from metrics import metrics
+
+
+def thread_stack(thread_id):
+    frame = sys._current_frames().get(thread_id)
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class Capture:
+    def __init__(self, label, forced):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.forced = forced
+        self.thread_id = threading.get_ident()
+        self.started = time.monotonic()
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class Profiler:
+    def __init__(self, directory=None, interval_ms=None, slow_ms=None, keep=None, users=None):
+        self.directory = directory or os.getenv("PROFILE_DIR", "profiles")
+        self.interval = float(interval_ms or os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.getenv("SLACK_PROFILE_SLOW_MS", 0))
+        self.keep = int(keep or os.getenv("PROFILE_KEEP", 50))
+        if users is None:
+            users = [u.strip() for u in os.getenv("SLACK_PROFILE_USERS", "").split(",") if u.strip()]
+        self.users = frozenset(users)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0 or bool(self.users)
+
+    def begin(self, label, user=None):
+        forced = user in self.users
+        if not forced and self.slow_ms <= 0:
+            return None
+        capture = Capture(label, forced)
+        with self._lock:
+            self._active[capture.id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return capture
+
+    def end(self, capture):
+        with self._lock:
+            self._active.pop(capture.id, None)
+        if not capture.samples:
+            return None
+        elapsed_ms = int((time.monotonic() - capture.started) * 1000)
+        try:
+            return self._write(capture, elapsed_ms)
+        except OSError as e:
+            print(f"Error writing profile {capture.id}: {e}")
+            return None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+            now = time.monotonic()
+            for capture in active:
+                if capture.forced or (now - capture.started) * 1000 >= self.slow_ms:
+                    stack = thread_stack(capture.thread_id)
+                    with self._lock:
+                        if capture.id in self._active and stack:
+                            capture.stacks[stack] += 1
+                            capture.samples += 1
+            time.sleep(self.interval)
+
+    def _write(self, capture, elapsed_ms):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")[:-3]
+        name = f"bot-{stamp}-{capture.id}-{elapsed_ms}ms-{capture.label}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            for stack, count in capture.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        metrics.incr("profiles.written")
+        for old in sorted(glob.glob(os.path.join(self.directory, "bot-*.folded")), reverse=True)[self.keep:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+        print(f"Profiled {capture.label} ({elapsed_ms} ms): {path}")
+        return path
+
+
+profiler = Profiler()
+
+
+def profiled(fn):
+    """Profile a Bolt listener when it is slow or its user is flagged"""
+    if not profiler.enabled:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        payload = kwargs.get("message") or kwargs.get("event") or {}
+        capture = profiler.begin(fn.__name__, payload.get("user"))
+        if capture is None:
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.end(capture)
+    return wrapper
@@ -0,0 +1,99 @@
+"""
+Shapes of Gemini's replies, as pydantic models and as Gemini responseSchemas.
+
+In structured-output mode the schemas are sent with the request so Gemini
+returns bare JSON of that shape; either way the reply is validated into the
+models before it is used.
+"""
+
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+ACTIONS = ["get_invoice", "get_invoices", "update_invoice_status", "get_summary", "search_invoices", "none"]
+STATUSES = ["Draft", "Sent", "Paid", "Overdue", "Cancelled"]
+INVOICE_TYPES = ["RECEIVABLE", "PAYABLE"]
+# Sort keys /api/invoices/search accepts; "-" means descending
+SORT_KEYS = ["-last_updated", "due_date", "-due_date", "amount", "-amount", "issue_date", "-issue_date"]
+
+
+class IntentParams(BaseModel):
+    invoice_id: Optional[str] = None
+    invoice_ids: Optional[List[str]] = None
+    # Any of several for summaries and searches ("unpaid" is Sent + Overdue); exactly one for an update
+    status: Optional[List[Literal["Draft", "Sent", "Paid", "Overdue", "Cancelled"]]] = None
+    due_date_after: Optional[str] = None
+    due_date_before: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    sort: Optional[Literal["-last_updated", "due_date", "-due_date", "amount", "-amount", "issue_date", "-issue_date"]] = None
+    customer_name: Optional[str] = None
+    created_by_user_id: Optional[str] = None
+    invoice_type: Optional[Literal["RECEIVABLE", "PAYABLE"]] = None
+    user_id: Optional[str] = None
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def _status_list(cls, value):
+        # Free-text replies may still give a single status
+        return [value] if isinstance(value, str) else value
+
+
+class IntentAction(BaseModel):
+    action: Literal["get_invoice", "get_invoices", "update_invoice_status", "get_summary", "search_invoices", "none"]
+    params: IntentParams = Field(default_factory=IntentParams)
+
+    def to_action(self):
+        """The {"action", "params"} dict run_action expects, without unset params"""
+        return {"action": self.action, "params": self.params.model_dump(exclude_none=True)}
+
+
+class FormattedReply(BaseModel):
+    plain_text: str
+    list: List[str] = Field(default_factory=list)
+    error: bool = False
+
+
+def _string(description=None, enum=None):
+    schema = {"type": "STRING"}
+    if description:
+        schema["description"] = description
+    if enum:
+        schema["enum"] = enum
+    return schema
+
+
+INTENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "action": _string("Use none when the message is not an invoice request", ACTIONS),
+        "params": {
+            "type": "OBJECT",
+            "properties": {
+                "invoice_id": _string(),
+                "invoice_ids": {"type": "ARRAY", "items": _string()},
+                "status": {"type": "ARRAY", "items": _string(enum=STATUSES)},
+                "due_date_after": _string("YYYY-MM-DD, inclusive"),
+                "due_date_before": _string("YYYY-MM-DD, inclusive"),
+                "min_amount": {"type": "NUMBER"},
+                "max_amount": {"type": "NUMBER"},
+                "sort": _string("search_invoices only", SORT_KEYS),
+                "customer_name": _string(),
+                "created_by_user_id": _string(),
+                "invoice_type": _string(enum=INVOICE_TYPES),
+                "user_id": _string(),
+            },
+        },
+    },
+    "required": ["action", "params"],
+}
+
+FORMAT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "plain_text": _string(),
+        "list": {"type": "ARRAY", "items": _string()},
+        "error": {"type": "BOOLEAN"},
+    },
+    "required": ["plain_text", "list", "error"],
+}
@@ -1,21 +1,45 @@
 import os
 from slack_bolt import App
 from supabase_helpers import is_user_authenticated, store_user_in_supabase, get_slack_user_email
-from llm import ask_gemini, extract_json_from_code_block, format_api_response
+from llm import parse_intent, format_api_response
+from api_client import run_action
 from upload_modal import open_invoice_upload_modal
+from digest import FREQUENCIES, DigestScheduler, set_digest_frequency
+from thread_context import thread_contexts
+from event_dedupe import event_deduper
+from events import FEEDBACK, event_recorder
+from profiling import profiled
 from constants import LOADING_BLOCKS, NOT_HELPFUL_MODAL
-import requests
-import json
 import os
+import json
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk import WebClient
+from slack_bolt.response import BoltResponse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# SLACK_API_URL points the bot at another Web API, e.g. benchmarks/fake_slack.py.
+# Events are acked as soon as the middleware has run and the handlers do
+# their Gemini/API work afterwards on the listener pool, so Slack never
+# waits on them; keep process_before_response off or retries come back.
+app = App(
+    client=WebClient(
+        token=os.environ.get("SLACK_BOT_TOKEN"),
+        base_url=os.environ.get("SLACK_API_URL", WebClient.BASE_URL)
+    ),
+    process_before_response=False,
+    listener_executor=ThreadPoolExecutor(max_workers=int(os.environ.get("SLACK_LISTENER_WORKERS", 10)))
+)
 
-API_SERVER_URL = os.environ.get("API_SERVER_URL", "http://localhost:8000")
 
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+@app.middleware
+def drop_duplicate_events(body, request, next):
+    # Ack redeliveries and message/app_mention twins without running handlers again
+    if not event_deduper.first_delivery(body, request.headers):
+        return BoltResponse(status=200, body="")
+    return next()
 
 # --- In-memory store for user channel/thread mapping ---
 user_context_map = {}
@@ -35,6 +59,7 @@ def get_login_url(user_id):
     )
 
 @app.message("")
+@profiled
 def message_gemini(message, say, client):
     user = message['user']
    # In your message handler:
@@ -58,89 +83,21 @@ def message_gemini(message, say, client):
     text = message.get('text', '')
     thread_ts = message.get('thread_ts') or message.get('ts')
     channel = message['channel']
-    context = None
+    context = thread_contexts.prompt_context(channel, thread_ts)
     loading = client.chat_postMessage(
         channel=channel,
         blocks=LOADING_BLOCKS,
         thread_ts=thread_ts
     )
     loading_ts = loading['ts']
-    gemini_response = ask_gemini(text, context)
-    print("Gemini response:", gemini_response)
-    action = None
-    try:
-        cleaned = extract_json_from_code_block(gemini_response)
-        action = json.loads(cleaned)
-    except Exception:
-        action = None
-    if isinstance(action, dict) and 'action' in action and 'params' in action:
-        api_result = None
+    action = parse_intent(text, context)
+    print("Gemini action:", action)
+    if action:
         try:
-            if action['action'] == 'get_invoice':
-                invoice_id = action['params'].get('invoice_id')
-                user_id = action['params'].get('user_id', user)
-                api_url = f"{API_SERVER_URL}/api/invoices/{invoice_id}?user_id={user_id}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Invoice not found."
-                    except Exception:
-                        error_msg = "Invoice not found."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'update_invoice_status':
-                invoice_id = action['params'].get('invoice_id')
-                status = action['params'].get('status')
-                user_id = action['params'].get('user_id', user)
-                api_url = f"{API_SERVER_URL}/api/invoices/{invoice_id}/status?user_id={user_id}"
-                try:
-                    r = requests.put(api_url, json={"status": status})
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Failed to update invoice status."
-                    except Exception:
-                        error_msg = "Failed to update invoice status."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'get_summary':
-                params = action['params']
-                query = "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
-                api_url = f"{API_SERVER_URL}/api/invoices/summary"
-                if query:
-                    api_url += f"?{query}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Could not get summary."
-                    except Exception:
-                        error_msg = "Could not get summary."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'search_invoices':
-                params = action['params']
-                query = "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
-                api_url = f"{API_SERVER_URL}/api/invoices/search"
-                if query:
-                    api_url += f"?{query}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Could not search invoices."
-                    except Exception:
-                        error_msg = "Could not search invoices."
-                    api_result = {"error": error_msg}
-            else:
-                api_result = {"error": "Unknown action."}
+            api_result = run_action(action, user)
         except Exception as e:
             api_result = {"error": f"API call failed: {str(e)}"}
+        thread_contexts.record(channel, thread_ts, text, action, api_result)
         if api_result and "error" in api_result:
             client.chat_update(
                 channel=channel,
@@ -156,6 +113,7 @@ def message_gemini(message, say, client):
                 blocks=formatted_response
             )
     else:
+        thread_contexts.record(channel, thread_ts, text)
         client.chat_update(
             channel=channel,
             ts=loading_ts,
@@ -164,6 +122,7 @@ def message_gemini(message, say, client):
         )
 
 @app.event("app_mention")
+@profiled
 def handle_app_mention(event, say, client):
     user = event['user']
     if not is_user_authenticated(user):
@@ -193,82 +152,14 @@ def handle_app_mention(event, say, client):
         thread_ts=thread_ts
     )
     loading_ts = loading['ts']
-    gemini_response = ask_gemini(text)
-    print("Gemini response:", gemini_response)
-    action = None
-    try:
-        cleaned = extract_json_from_code_block(gemini_response)
-        action = json.loads(cleaned)
-    except Exception:
-        action = None
-    if isinstance(action, dict) and 'action' in action and 'params' in action:
-        api_result = None
+    action = parse_intent(text, thread_contexts.prompt_context(channel, thread_ts))
+    print("Gemini action:", action)
+    if action:
         try:
-            if action['action'] == 'get_invoice':
-                invoice_id = action['params'].get('invoice_id')
-                user_id = action['params'].get('user_id', user)
-                api_url = f"{API_SERVER_URL}/api/invoices/{invoice_id}?user_id={user_id}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Invoice not found."
-                    except Exception:
-                        error_msg = "Invoice not found."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'update_invoice_status':
-                invoice_id = action['params'].get('invoice_id')
-                status = action['params'].get('status')
-                user_id = action['params'].get('user_id', user)
-                api_url = f"{API_SERVER_URL}/api/invoices/{invoice_id}/status?user_id={user_id}"
-                try:
-                    r = requests.put(api_url, json={"status": status})
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Failed to update invoice status."
-                    except Exception:
-                        error_msg = "Failed to update invoice status."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'get_summary':
-                params = action['params']
-                query = "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
-                api_url = f"{API_SERVER_URL}/api/invoices/summary"
-                if query:
-                    api_url += f"?{query}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Could not get summary."
-                    except Exception:
-                        error_msg = "Could not get summary."
-                    api_result = {"error": error_msg}
-            elif action['action'] == 'search_invoices':
-                params = action['params']
-                query = "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
-                api_url = f"{API_SERVER_URL}/api/invoices/search"
-                if query:
-                    api_url += f"?{query}"
-                try:
-                    r = requests.get(api_url)
-                    r.raise_for_status()
-                    api_result = r.json()
-                except requests.HTTPError:
-                    try:
-                        error_msg = r.json().get("error") or r.json().get("detail") or "Could not search invoices."
-                    except Exception:
-                        error_msg = "Could not search invoices."
-                    api_result = {"error": error_msg}
-            else:
-                api_result = {"error": "Unknown action."}
+            api_result = run_action(action, user)
         except Exception as e:
             api_result = {"error": f"API call failed: {str(e)}"}
+        thread_contexts.record(channel, thread_ts, text, action, api_result)
         if api_result and "error" in api_result:
             client.chat_update(
                 channel=channel,
@@ -284,6 +175,7 @@ def handle_app_mention(event, say, client):
                 blocks=formatted_response
             )
     else:
+        thread_contexts.record(channel, thread_ts, text)
         client.chat_update(
             channel=channel,
             ts=loading_ts,
@@ -291,27 +183,49 @@ def handle_app_mention(event, say, client):
             blocks=None
         )
 
+def feedback_context(body):
+    """Where the rated answer was posted, for the feedback event"""
+    message = body.get("message") or {}
+    return {
+        "channel": (body.get("channel") or {}).get("id"),
+        "message_ts": message.get("ts"),
+        "thread_ts": message.get("thread_ts") or message.get("ts"),
+    }
+
 @app.action("helpful")
 def action_helpful(body, ack, say):
     ack()
     user_id = body['user']['id']
-    thread_ts = None
-    if 'message' in body and 'thread_ts' in body['message']:
-        thread_ts = body['message']['thread_ts']
-    elif 'message' in body and 'ts' in body['message']:
-        thread_ts = body['message']['ts']
-    say(f"<@{user_id}> Thank you for your feedback!", thread_ts=thread_ts)
+    context = feedback_context(body)
+    event_recorder.record(FEEDBACK, {"helpful": True, **context}, slack_user_id=user_id, subject=context["message_ts"])
+    say(f"<@{user_id}> Thank you for your feedback!", thread_ts=context["thread_ts"])
 
 @app.action("not-helpful")
 def action_not_helpful(body, ack, client, say):
     ack()
+    context = feedback_context(body)
+    event_recorder.record(FEEDBACK, {"helpful": False, **context}, slack_user_id=body['user']['id'],
+                          subject=context["message_ts"])
     trigger_id = body.get("trigger_id")
     if trigger_id:
         client.views_open(
             trigger_id=trigger_id,
-            view=NOT_HELPFUL_MODAL
+            # Carried to the submission so the reasons can be tied to the answer
+            view={**NOT_HELPFUL_MODAL, "private_metadata": json.dumps(context)}
         )
 
+@app.view("not_helpful_modal")
+def handle_not_helpful_submission(ack, body):
+    ack()
+    context = json.loads(body["view"].get("private_metadata") or "{}")
+    reasons = []
+    for block in body["view"]["state"]["values"].values():
+        for element in block.values():
+            reasons.extend(option["value"] for option in element.get("selected_options") or [])
+    # The rating itself was recorded by the click; this adds why
+    event_recorder.record(FEEDBACK, {"reasons": reasons, **context},
+                          slack_user_id=body["user"]["id"], subject=context.get("message_ts"))
+
 @app.action("login")
 def handle_login(ack, body, client, say):
     ack()
@@ -368,6 +282,24 @@ def handle_quid_command(ack, body, client, say):
         user_context_map[user_id]["thread_ts"] = thread_ts
     open_invoice_upload_modal(trigger_id, client)
 
+@app.command("/digest")
+def handle_digest_command(ack, body, respond):
+    ack()
+    user_id = body["user_id"]
+    choice = (body.get("text") or "").strip().lower()
+    if choice not in FREQUENCIES + ("off",):
+        respond("Usage: /digest daily | weekly | off")
+        return
+    try:
+        set_digest_frequency(user_id, None if choice == "off" else choice)
+    except Exception as e:
+        respond(f"Sorry, I couldn't update your digest settings: {e}")
+        return
+    if choice == "off":
+        respond("You won't receive invoice digests anymore.")
+    else:
+        respond(f"You'll receive a {choice} invoice digest by DM.")
+
 @app.view("upload_invoice_modal")
 def handle_invoice_upload_submission(ack, body, client):
     ack()
@@ -398,4 +330,9 @@ def handle_file_shared(event, client):
     print(uploaded_files)
 
 if __name__ == "__main__":
-    SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start() 
\ No newline at end of file
+    DigestScheduler(app.client).start()
+    event_recorder.start()
+    try:
+        SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
+    finally:
+        event_recorder.stop() 
\ No newline at end of file
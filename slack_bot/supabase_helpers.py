@@ -1,10 +1,13 @@
 import os
 import requests
-from supabase import create_client, Client
+from functools import lru_cache
 
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+@lru_cache(maxsize=None)
+def get_supabase():
+    # Created on first use so importing the bot never connects to Supabase.
+    # Env is read here too, after slack_app has run load_dotenv().
+    from supabase import create_client
+    return create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
 
 API_SERVER_URL = os.environ.get("API_SERVER_URL", "http://localhost:8000")
 
@@ -21,7 +24,7 @@ def is_user_authenticated(slack_user_id):
 
 def store_user_in_supabase(slack_user_id, email):
     if not is_user_authenticated(slack_user_id):
-        supabase.table("users").insert({"slack_user_id": slack_user_id, "email": email}).execute()
+        get_supabase().table("users").insert({"slack_user_id": slack_user_id, "email": email}).execute()
 
 def get_slack_user_email(client, user_id):
     user_info = client.users_info(user=user_id)
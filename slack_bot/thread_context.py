@@ -0,0 +1,157 @@
+"""
+Per-thread conversation context for follow-up questions.
+
+Each Slack thread, keyed by (channel, thread_ts), remembers the invoice ids
+and filters of its last resolved request plus a few recent turns, so "and
+mark it paid" can be resolved without retyping the id. What goes into the
+prompt is capped at a token budget, newest turns first.
+
+The store is an LRU with a TTL and a cap on the approximate bytes held, so
+memory stays bounded however many threads the bot sees.
+
+Settings:
+    THREAD_CONTEXT_MAX_THREADS    threads remembered (default 1000)
+    THREAD_CONTEXT_TTL_SECONDS    idle time before a thread is forgotten (default 3600)
+    THREAD_CONTEXT_MAX_BYTES      approximate memory cap (default 5 MB)
+    THREAD_CONTEXT_TOKEN_BUDGET   prompt tokens spent on context (default 300)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import orjson
+
+from tokens import estimate_tokens, truncate_to_tokens
+
+MAX_TURNS = 6
+MAX_INVOICE_IDS = 20
+TURN_TOKENS = 60
+FILTER_KEYS = (
+    "status", "customer_name", "due_date_after", "due_date_before", "min_amount", "max_amount",
+    "created_by_user_id", "invoice_type",
+)
+
+
+def invoice_ids_from(action, api_result):
+    """Invoice ids a request was about: the ones asked for, else the ones returned"""
+    params = action.get("params") or {}
+    ids = []
+    if params.get("invoice_id"):
+        ids.append(params["invoice_id"])
+    ids.extend(params.get("invoice_ids") or [])
+    if not ids and isinstance(api_result, dict):
+        if api_result.get("invoice_id"):
+            ids.append(api_result["invoice_id"])
+        ids.extend(i["invoice_id"] for i in api_result.get("invoices") or [] if isinstance(i, dict) and "invoice_id" in i)
+    if not ids and isinstance(api_result, list):
+        ids.extend(i["invoice_id"] for i in api_result if isinstance(i, dict) and "invoice_id" in i)
+    return list(dict.fromkeys(ids))[:MAX_INVOICE_IDS]
+
+
+class ThreadContext:
+    __slots__ = ("invoice_ids", "filters", "turns", "touched_at", "size")
+
+    def __init__(self):
+        self.invoice_ids = []
+        self.filters = {}
+        self.turns = deque(maxlen=MAX_TURNS)
+        self.touched_at = time.monotonic()
+        self.size = 0
+
+    def record(self, user_text, action=None, api_result=None):
+        if action:
+            ids = invoice_ids_from(action, api_result)
+            if ids:
+                self.invoice_ids = ids
+            filters = {k: v for k, v in (action.get("params") or {}).items() if k in FILTER_KEYS and v}
+            if filters or action.get("action") in ("get_summary", "search_invoices"):
+                self.filters = filters
+            reply = orjson.dumps(action).decode()
+        else:
+            reply = "(not understood)"
+        self.turns.append((
+            truncate_to_tokens(user_text, TURN_TOKENS),
+            truncate_to_tokens(reply, TURN_TOKENS)
+        ))
+        self.touched_at = time.monotonic()
+        self.size = (
+            sum(len(u) + len(r) for u, r in self.turns)
+            + sum(len(i) for i in self.invoice_ids)
+            + len(orjson.dumps(self.filters))
+            + 200  # object and container overhead
+        )
+
+    def render(self, budget_tokens):
+        """Context block for the prompt, trimmed to `budget_tokens`"""
+        header = ["Conversation so far in this thread (use it to resolve follow-ups like 'it' or 'those'):"]
+        if self.invoice_ids:
+            header.append("Last invoice ids: " + ", ".join(self.invoice_ids))
+        if self.filters:
+            header.append("Last filters: " + orjson.dumps(self.filters).decode())
+        used = sum(estimate_tokens(line) for line in header)
+        turns = []
+        for user_text, reply in reversed(self.turns):
+            lines = [f"User: {user_text}", f"Assistant: {reply}"]
+            cost = sum(estimate_tokens(line) for line in lines)
+            if used + cost > budget_tokens:
+                break
+            turns[:0] = lines
+            used += cost
+        if len(header) == 1 and not turns:
+            return ""
+        return "\n".join(header + turns)
+
+
+class ThreadContextStore:
+    def __init__(self, max_threads=None, ttl_seconds=None, max_bytes=None, budget_tokens=None):
+        self.max_threads = int(max_threads or os.getenv("THREAD_CONTEXT_MAX_THREADS", 1000))
+        self.ttl_seconds = float(ttl_seconds or os.getenv("THREAD_CONTEXT_TTL_SECONDS", 3600))
+        self.max_bytes = int(max_bytes or os.getenv("THREAD_CONTEXT_MAX_BYTES", 5 * 1024 * 1024))
+        self.budget_tokens = int(budget_tokens or os.getenv("THREAD_CONTEXT_TOKEN_BUDGET", 300))
+        self._threads = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._threads)
+
+    @property
+    def bytes_used(self):
+        return self._bytes
+
+    def _get(self, key):
+        ctx = self._threads.get(key)
+        if ctx is None:
+            return None
+        if time.monotonic() - ctx.touched_at > self.ttl_seconds:
+            self._bytes -= ctx.size
+            del self._threads[key]
+            return None
+        self._threads.move_to_end(key)
+        return ctx
+
+    def prompt_context(self, channel, thread_ts):
+        """Context to pass to parse_intent, or None for a new thread"""
+        with self._lock:
+            ctx = self._get((channel, thread_ts))
+            if ctx is None:
+                return None
+            return ctx.render(self.budget_tokens) or None
+
+    def record(self, channel, thread_ts, user_text, action=None, api_result=None):
+        key = (channel, thread_ts)
+        with self._lock:
+            ctx = self._get(key)
+            if ctx is None:
+                ctx = self._threads[key] = ThreadContext()
+            self._bytes -= ctx.size
+            ctx.record(user_text, action, api_result)
+            self._bytes += ctx.size
+            while self._threads and (len(self._threads) > self.max_threads or self._bytes > self.max_bytes):
+                _, evicted = self._threads.popitem(last=False)
+                self._bytes -= evicted.size
+
+
+thread_contexts = ThreadContextStore()
@@ -0,0 +1,23 @@
+"""
+Cheap prompt-size estimates.
+
+Gemini bills and limits by tokens, but calling its countTokens endpoint per
+message would cost a round trip. For English and JSON text a token is about
+four characters, which is close enough to keep prompts under a budget.
+"""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` to roughly `max_tokens`, marking the cut with an ellipsis"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 1, 0)] + "…"
@@ -0,0 +1,149 @@
+"""
+GeminiProvider against benchmarks/mock_gemini.py: breaker, hedging, deadline.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "slack_bot"))
+
+from benchmarks.mock_gemini import make_server  # noqa: E402
+from llm_provider import (  # noqa: E402
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, DeadlineExceeded, GeminiProvider, ProviderHTTPError,
+)
+from metrics import metrics  # noqa: E402
+
+BODY = {"contents": [{"role": "user", "parts": [{"text": "how much is overdue?"}]}]}
+
+
+@pytest.fixture
+def server():
+    server = make_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def generate_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/mock:generateContent"
+
+
+def counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+def test_breaker_opens_short_circuits_and_closes_after_trial(server):
+    breaker = CircuitBreaker(failure_threshold=3, window_seconds=10, open_seconds=0.3)
+    provider = GeminiProvider(deadline_seconds=2, hedge=False, breaker=breaker)
+    url = generate_url(server)
+    server.faults["error_rate"] = 1.0
+
+    for _ in range(3):
+        with pytest.raises(ProviderHTTPError) as e:
+            provider.generate(url, {}, BODY)
+        assert e.value.status_code == 503
+    assert breaker.state == OPEN
+
+    # Open: fails fast without reaching the server
+    with pytest.raises(CircuitOpenError):
+        provider.generate(url, {}, BODY)
+    assert server.counts["errors"] == 3
+
+    # A failed half-open trial opens the breaker again
+    time.sleep(0.35)
+    with pytest.raises(ProviderHTTPError):
+        provider.generate(url, {}, BODY)
+    assert breaker.state == OPEN
+    assert server.counts["errors"] == 4
+
+    # Once the errors stop, the next trial closes it
+    server.faults["error_rate"] = 0.0
+    time.sleep(0.35)
+    assert "candidates" in provider.generate(url, {}, BODY)
+    assert breaker.state == CLOSED
+    assert server.counts["errors"] == 4
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, window_seconds=10, open_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_hedge_fires_after_p95_and_first_reply_wins(server):
+    provider = GeminiProvider(deadline_seconds=5, hedge=True)
+    for _ in range(provider.latencies.min_samples):
+        provider.latencies.add(0.05)
+    server.faults["slow_ms"] = 2000
+    server.faults["slow_next"] = 1
+    hedges, wins = counter("llm.hedges"), counter("llm.hedge_wins")
+
+    start = time.monotonic()
+    reply = provider.generate(generate_url(server), {}, BODY)
+    elapsed = time.monotonic() - start
+
+    assert "candidates" in reply
+    # The hedge went out at the 50ms p95 and answered long before the slow original
+    assert 0.05 <= elapsed < 1.0
+    assert server.counts["slow"] == 1
+    assert counter("llm.hedges") == hedges + 1
+    assert counter("llm.hedge_wins") == wins + 1
+    assert provider._hedge_stats == {"hedges": 1, "wins": 1}
+
+
+def test_no_hedge_when_reply_beats_p95(server):
+    provider = GeminiProvider(deadline_seconds=5, hedge=True)
+    for _ in range(provider.latencies.min_samples):
+        provider.latencies.add(0.5)
+
+    provider.generate(generate_url(server), {}, BODY)
+
+    assert provider._hedge_stats == {"hedges": 0, "wins": 0}
+
+
+def test_deadline_raises_deadline_exceeded(server):
+    breaker = CircuitBreaker(failure_threshold=5, window_seconds=10, open_seconds=30)
+    provider = GeminiProvider(deadline_seconds=0.2, hedge=False, breaker=breaker)
+    server.faults["latency_ms"] = 1000
+    exceeded = counter("llm.deadline_exceeded")
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        provider.generate(generate_url(server), {}, BODY)
+
+    assert time.monotonic() - start < 0.6
+    assert counter("llm.deadline_exceeded") == exceeded + 1
+    # A timeout counts towards the breaker
+    assert len(breaker._failures) == 1
+
+
+def test_client_errors_do_not_trip_breaker(server):
+    breaker = CircuitBreaker(failure_threshold=2, window_seconds=10, open_seconds=30)
+    provider = GeminiProvider(deadline_seconds=2, hedge=False, breaker=breaker)
+    # The mock rejects every cachedContents create with a 400
+    url = generate_url(server).split("/models/", 1)[0] + "/cachedContents"
+
+    for _ in range(5):
+        with pytest.raises(ProviderHTTPError) as e:
+            provider.generate(url, {}, BODY)
+        assert e.value.status_code == 400
+
+    assert breaker.state == CLOSED
+    assert server.counts["cache_rejected"] == 5
+    assert "candidates" in provider.generate(generate_url(server), {}, BODY)